@@ -0,0 +1,385 @@
+"""Load-test and latency benchmark for the traffic, incident and UI services.
+
+Seeds a throwaway pair of databases, then drives a weighted mix of
+realistic requests from concurrent clients and reports requests/sec and
+p50/p95/p99 latency per scenario. Run from the repository root:
+
+    # services in-process over ASGI, no sockets
+    python -m benchmarks.loadtest --target inprocess --zones 10000 --incidents 100000
+
+    # services under uvicorn via python -m <service> (plus UI page renders against them)
+    python -m benchmarks.loadtest --target uvicorn --workers 2 --output results.json
+
+    # fail if any scenario's p95 got more than 20% slower than a saved run
+    python -m benchmarks.loadtest --baseline results.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+BENCH_USER = "loadtest"
+BENCH_PASSWORD = "loadtest-password"
+SEED_CHUNK = 10000
+INCIDENT_TYPES = ("crash", "jam", "roadwork", "breakdown", "flooding")
+
+DEFAULT_MIX = {
+    "login": 1,
+    "zone_list": 10,
+    "zone_get": 5,
+    "zone_update": 5,
+    "incident_report": 4,
+    "incident_list": 10,
+    "dashboard": 2,
+    "ui_zones": 2,
+    "ui_incidents": 2,
+    "ui_dashboard": 2,
+}
+UI_SCENARIOS = {"ui_zones", "ui_incidents", "ui_dashboard"}
+
+# --- Seeding ---
+def seed(zones: int, incidents: int):
+    """Writes the bench user, ``zones`` zones and ``incidents`` incidents with executemany inserts."""
+    from sqlalchemy import insert
+    from incident_service.database import incident_engine
+    from incident_service.main import create_schema as create_incident_schema
+    from incident_service.models import Incident
+    from traffic_service import models, passwords
+    from traffic_service.database import engine
+    from traffic_service.main import create_schema as create_traffic_schema
+
+    create_traffic_schema()
+    create_incident_schema()
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User).values(
+            username=BENCH_USER, hashed_password=passwords.hash_password_sync(BENCH_PASSWORD), is_active=True
+        ))
+        for start in range(0, zones, SEED_CHUNK):
+            conn.execute(insert(models.TrafficZone), [
+                {"name": f"zone-{i}", "vehicle_count": rng.randint(0, 150)}
+                for i in range(start, min(start + SEED_CHUNK, zones))
+            ])
+    now = datetime.utcnow()
+    with incident_engine.begin() as conn:
+        for start in range(0, incidents, SEED_CHUNK):
+            conn.execute(insert(Incident), [
+                {
+                    "type": rng.choice(INCIDENT_TYPES),
+                    "location": f"zone-{rng.randrange(max(zones, 1))}",
+                    "timestamp": now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+                }
+                for _ in range(start, min(start + SEED_CHUNK, incidents))
+            ])
+
+# --- Scenarios ---
+SCENARIOS = {}
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+class Context:
+    def __init__(self, traffic, incident, ui_factory, token: str, zones: int, seed: int):
+        self.traffic = traffic
+        self.incident = incident
+        self.ui_factory = ui_factory
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.token = token
+        self.zones = max(zones, 1)
+        self.rng = random.Random(seed)
+        self._ui_clients = threading.local()
+
+    def ui(self):
+        # Flask test clients are not thread-safe, so each worker thread gets its own
+        client = getattr(self._ui_clients, "client", None)
+        if client is None:
+            client = self.ui_factory()
+            with client.session_transaction() as session:
+                session["access_token"] = self.token
+            self._ui_clients.client = client
+        return client
+
+@scenario("login")
+async def login(ctx: Context):
+    response = await ctx.traffic.post("/token", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    return response.status_code
+
+@scenario("zone_list")
+async def zone_list(ctx: Context):
+    response = await ctx.traffic.get("/zones/", params={"skip": ctx.rng.randrange(0, ctx.zones, 100), "limit": 100}, headers=ctx.headers)
+    return response.status_code
+
+@scenario("zone_get")
+async def zone_get(ctx: Context):
+    response = await ctx.traffic.get(f"/zones/{ctx.rng.randint(1, ctx.zones)}", headers=ctx.headers)
+    return response.status_code
+
+@scenario("zone_update")
+async def zone_update(ctx: Context):
+    response = await ctx.traffic.put(
+        f"/zones/{ctx.rng.randint(1, ctx.zones)}", json={"vehicle_count": ctx.rng.randint(0, 150)}, headers=ctx.headers
+    )
+    return response.status_code
+
+@scenario("incident_report")
+async def incident_report(ctx: Context):
+    incident = {"type": ctx.rng.choice(INCIDENT_TYPES), "location": f"zone-{ctx.rng.randrange(ctx.zones)}"}
+    response = await ctx.incident.post("/report", json=incident)
+    return response.status_code
+
+@scenario("incident_list")
+async def incident_list(ctx: Context):
+    params = {"limit": 50}
+    if ctx.rng.random() < 0.3:
+        params["type"] = ctx.rng.choice(INCIDENT_TYPES)
+    response = await ctx.incident.get("/incidents/", params=params)
+    return response.status_code
+
+@scenario("dashboard")
+async def dashboard(ctx: Context):
+    response = await ctx.traffic.get("/dashboard", params={"skip": ctx.rng.randrange(0, ctx.zones, 100), "limit": 100}, headers=ctx.headers)
+    return response.status_code
+
+@scenario("ui_zones")
+async def ui_zones(ctx: Context):
+    return await asyncio.to_thread(lambda: ctx.ui().get("/zones").status_code)
+
+@scenario("ui_incidents")
+async def ui_incidents(ctx: Context):
+    return await asyncio.to_thread(lambda: ctx.ui().get("/incidents").status_code)
+
+@scenario("ui_dashboard")
+async def ui_dashboard(ctx: Context):
+    return await asyncio.to_thread(lambda: ctx.ui().get("/dashboard").status_code)
+
+# --- Driver ---
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(name: str, latencies: list, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "scenario": name,
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+async def drive(ctx: Context, mix: dict, concurrency: int, duration: float, warmup: float) -> list:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker(seed: int):
+        rng = random.Random(seed)
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            name = rng.choices(names, weights)[0]
+            try:
+                status = await SCENARIOS[name](ctx)
+                failed = status >= 400
+            except Exception:
+                failed = True
+            finished = time.perf_counter()
+            if now >= measure_from:
+                latencies[name].append(finished - now)
+                errors[name] += failed
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+    results = [summarize(name, latencies[name], errors[name], elapsed) for name in names]
+    everything = [value for values in latencies.values() for value in values]
+    results.append(summarize("total", everything, sum(errors.values()), elapsed))
+    return results
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def launch_service(package: str, port: int, workers: int) -> subprocess.Popen:
+    """Starts ``python -m <package>``, the multi-worker entrypoint with shared state."""
+    command = [sys.executable, "-m", package, "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(command, cwd=PROJECT_ROOT, env=os.environ.copy())
+
+async def wait_until_up(client, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            await client.get("/openapi.json")
+            return
+        except Exception:
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"{client.base_url} did not start within {timeout}s")
+            await asyncio.sleep(0.2)
+
+async def run(args) -> dict:
+    import httpx
+
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+
+    async with AsyncExitStack() as lifespans:
+        processes = []
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        if args.target == "inprocess":
+            from incident_service.main import app as incident_app
+            from traffic_service.main import app as traffic_app
+
+            # ASGITransport doesn't send lifespan events, so run the apps' startup
+            # (schema, caches, background tasks) and shutdown around the test
+            for app in (traffic_app, incident_app):
+                await lifespans.enter_async_context(app.router.lifespan_context(app))
+            traffic = httpx.AsyncClient(transport=httpx.ASGITransport(app=traffic_app), base_url="http://traffic")
+            incident = httpx.AsyncClient(transport=httpx.ASGITransport(app=incident_app), base_url="http://incident")
+            # The UI talks to its backends over HTTP, which this target doesn't serve
+            mix = {name: weight for name, weight in mix.items() if name not in UI_SCENARIOS}
+            ui_factory = None
+        else:
+            traffic_url, incident_url = args.traffic_url, args.incident_url
+            if traffic_url is None:
+                traffic_port = free_port()
+                processes.append(launch_service("traffic_service", traffic_port, args.workers))
+                traffic_url = f"http://127.0.0.1:{traffic_port}"
+            if incident_url is None:
+                incident_port = free_port()
+                processes.append(launch_service("incident_service", incident_port, args.workers))
+                incident_url = f"http://127.0.0.1:{incident_port}"
+            traffic = httpx.AsyncClient(base_url=traffic_url, limits=limits, timeout=30)
+            incident = httpx.AsyncClient(base_url=incident_url, limits=limits, timeout=30)
+            os.environ["TRAFFIC_SERVICE_URL"] = traffic_url
+            os.environ["INCIDENT_SERVICE_URL"] = incident_url
+            sys.path.insert(0, str(PROJECT_ROOT / "traffic_ui"))
+            import app as ui
+
+            ui_factory = ui.app.test_client
+
+        try:
+            await wait_until_up(traffic)
+            await wait_until_up(incident)
+            response = await traffic.post("/token", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+            response.raise_for_status()
+            ctx = Context(traffic, incident, ui_factory, response.json()["access_token"], args.zones, args.seed)
+            results = await drive(ctx, mix, args.concurrency, args.duration, args.warmup)
+        finally:
+            await traffic.aclose()
+            await incident.aclose()
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "target": args.target,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "zones": args.zones,
+            "incidents": args.incidents,
+            "mix": mix,
+        },
+        "results": results,
+    }
+
+def find_regressions(report: dict, baseline: dict, max_regression: float) -> list:
+    previous = {result["scenario"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get(result["scenario"])
+        if before and before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{result['scenario']}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+    return regressions
+
+def print_table(report: dict):
+    print(f"{'scenario':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for result in report["results"]:
+        print(f"{result['scenario']:<16}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10}"
+              f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers per service")
+    parser.add_argument("--traffic-url", help="benchmark a running traffic service instead of launching one")
+    parser.add_argument("--incident-url", help="benchmark a running incident service instead of launching one")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before measuring")
+    parser.add_argument("--zones", type=int, default=10000)
+    parser.add_argument("--incidents", type=int, default=100000)
+    parser.add_argument("--mix", action="append", metavar="SCENARIO=WEIGHT", help=f"override weights; scenarios: {', '.join(DEFAULT_MIX)}")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", help="where to put the seeded databases (default: a temp dir)")
+    parser.add_argument("--no-seed", action="store_true", help="reuse databases already in --data-dir")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(args.data_dir or tmp).resolve()
+        data_dir.mkdir(parents=True, exist_ok=True)
+        # Must be set before any service module is imported or launched
+        os.environ["TRAFFIC_DB_PATH"] = str(data_dir / "traffic.db")
+        os.environ["INCIDENT_DB_PATH"] = str(data_dir / "incidents.db")
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+        sys.path.insert(0, str(PROJECT_ROOT))
+        if not args.no_seed:
+            started = time.perf_counter()
+            seed(args.zones, args.incidents)
+            print(f"seeded {args.zones} zones and {args.incidents} incidents in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        report = asyncio.run(run(args))
+
+    print_table(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        regressions = find_regressions(report, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
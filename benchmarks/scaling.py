@@ -0,0 +1,165 @@
+"""Throughput scaling benchmark: requests/sec against the number of workers.
+
+Seeds throwaway databases once, then for each worker count starts both
+services with ``python -m <service> --workers N`` and drives them from
+several load-generator processes, so the client is not the bottleneck.
+Reports total requests/sec, speedup over one worker and scaling
+efficiency (speedup / workers; 1.0 is perfectly linear). Run from the
+repository root:
+
+    python -m benchmarks.scaling --workers 1,2,4,8 --clients 8 --output scaling.json
+
+Load generators share the machine with the services, so leave cores for
+them (or point several copies of benchmarks.loadtest at the services from
+another host) when measuring the top of the range.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.loadtest import (
+    BENCH_PASSWORD, BENCH_USER, PROJECT_ROOT, Context, drive, free_port, launch_service, seed, wait_until_up,
+)
+
+# Cacheable and uncached reads plus a few writes, which also exercise the
+# cross-worker cache invalidation
+DEFAULT_MIX = {"zone_get": 5, "zone_list": 5, "zone_update": 1, "incident_list": 5, "incident_report": 1}
+
+def default_worker_counts() -> str:
+    counts, n = [], 1
+    while n <= (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return ",".join(map(str, counts))
+
+# --- Load generator processes ---
+def generate_load(traffic_url: str, incident_url: str, token: str, zones: int, mix: dict,
+                  concurrency: int, duration: float, warmup: float, seed: int) -> dict:
+    """One client process's ``total`` result (runs in a multiprocessing worker)."""
+    import httpx
+
+    async def run():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=traffic_url, limits=limits, timeout=30) as traffic, \
+                httpx.AsyncClient(base_url=incident_url, limits=limits, timeout=30) as incident:
+            ctx = Context(traffic, incident, None, token, zones, seed)
+            results = await drive(ctx, mix, concurrency, duration, warmup)
+        return results[-1]
+
+    return asyncio.run(run())
+
+async def login(traffic_url: str) -> str:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=traffic_url, timeout=30) as client:
+        await wait_until_up(client)
+        response = await client.post("/token", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+async def wait_for_incidents(incident_url: str):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=incident_url, timeout=30) as client:
+        await wait_until_up(client)
+
+def measure(workers: int, args, mix: dict) -> dict:
+    traffic_port, incident_port = free_port(), free_port()
+    processes = [
+        launch_service("traffic_service", traffic_port, workers),
+        launch_service("incident_service", incident_port, workers),
+    ]
+    traffic_url, incident_url = f"http://127.0.0.1:{traffic_port}", f"http://127.0.0.1:{incident_port}"
+    try:
+        token = asyncio.run(login(traffic_url))
+        asyncio.run(wait_for_incidents(incident_url))
+        jobs = [
+            (traffic_url, incident_url, token, args.zones, mix, args.concurrency, args.duration, args.warmup, args.seed + i)
+            for i in range(args.clients)
+        ]
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            totals = pool.starmap(generate_load, jobs)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+    return {
+        "workers": workers,
+        "requests": sum(total["requests"] for total in totals),
+        "errors": sum(total["errors"] for total in totals),
+        "rps": round(sum(total["rps"] for total in totals), 1),
+        # Per-client percentiles can't be merged exactly; report the worst client
+        "p50_ms": max(total["p50_ms"] for total in totals),
+        "p95_ms": max(total["p95_ms"] for total in totals),
+    }
+
+def add_scaling(results: list):
+    base = next((result for result in results if result["workers"] == 1), results[0])
+    per_worker = base["rps"] / base["workers"] if base["rps"] else 0.0
+    for result in results:
+        speedup = result["rps"] / per_worker if per_worker else 0.0
+        result["speedup"] = round(speedup, 2)
+        result["efficiency"] = round(speedup / result["workers"], 2)
+
+def print_table(results: list):
+    print(f"{'workers':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'speedup':>9}{'effic.':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        print(f"{result['workers']:>8}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10}"
+              f"{result['speedup']:>9}{result['efficiency']:>8}{result['p50_ms']:>10}{result['p95_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=default_worker_counts(), help="comma-separated worker counts per service")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent requests per client process")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--zones", type=int, default=10000)
+    parser.add_argument("--incidents", type=int, default=100000)
+    parser.add_argument("--mix", action="append", metavar="SCENARIO=WEIGHT", help=f"override weights (default {DEFAULT_MIX})")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        name, _, weight = item.partition("=")
+        mix[name] = float(weight)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    worker_counts = [int(count) for count in args.workers.split(",")]
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["TRAFFIC_DB_PATH"] = str(Path(data_dir) / "traffic.db")
+        os.environ["INCIDENT_DB_PATH"] = str(Path(data_dir) / "incidents.db")
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+        sys.path.insert(0, str(PROJECT_ROOT))
+        started = time.perf_counter()
+        seed(args.zones, args.incidents)
+        print(f"seeded {args.zones} zones and {args.incidents} incidents in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        results = []
+        for workers in worker_counts:
+            results.append(measure(workers, args, mix))
+            print(f"{workers} workers: {results[-1]['rps']} req/s", file=sys.stderr)
+
+    add_scaling(results)
+    print_table(results)
+    if args.output:
+        report = {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "cpus": os.cpu_count(),
+            "config": {"clients": args.clients, "concurrency": args.concurrency, "duration": args.duration, "mix": mix},
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
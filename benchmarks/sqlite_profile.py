@@ -0,0 +1,128 @@
+"""Concurrent read/write throughput of the default vs the tuned SQLite profile.
+
+Writer threads mix zone count updates with incident reports while reader
+threads list zones and page through incidents, each against a fresh pair
+of databases in a temporary directory. Run from the repository root:
+
+    python -m benchmarks.sqlite_profile --seconds 10 --writers 4 --readers 8
+"""
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+from common.database import create_sqlite_engine, sqlite_url
+from incident_service.models import Incident
+from incident_service.pagination import incidents_page_query
+from traffic_service import models
+
+def default_engines(directory: Path):
+    # What the services used before: stock create_engine, rollback journal
+    return (
+        create_engine(sqlite_url(directory / "traffic.db"), connect_args={"check_same_thread": False}),
+        create_engine(sqlite_url(directory / "incidents.db"), connect_args={"check_same_thread": False}),
+    )
+
+def tuned_engines(directory: Path):
+    return create_sqlite_engine(directory / "traffic.db"), create_sqlite_engine(directory / "incidents.db")
+
+PROFILES = {"default": default_engines, "tuned": tuned_engines}
+
+def seed(traffic_engine, incident_engine, zones: int, incidents: int):
+    models.Base.metadata.create_all(traffic_engine)
+    Incident.metadata.create_all(incident_engine)
+    with traffic_engine.begin() as conn:
+        conn.execute(insert(models.TrafficZone), [{"name": f"zone-{i}", "vehicle_count": 0} for i in range(zones)])
+    with incident_engine.begin() as conn:
+        conn.execute(insert(Incident), [
+            {"type": "crash", "location": f"zone-{i % zones}", "timestamp": datetime.utcnow()} for i in range(incidents)
+        ])
+
+def run_profile(name: str, seconds: float, writers: int, readers: int, zones: int, incidents: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        traffic_engine, incident_engine = PROFILES[name](Path(tmp))
+        seed(traffic_engine, incident_engine, zones, incidents)
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def record(key):
+            with lock:
+                counts[key] += 1
+
+        def writer():
+            rng = random.Random()
+            while time.perf_counter() < deadline:
+                try:
+                    if rng.random() < 0.5:
+                        with traffic_engine.begin() as conn:
+                            conn.execute(
+                                update(models.TrafficZone)
+                                .where(models.TrafficZone.id == rng.randint(1, zones))
+                                .values(vehicle_count=rng.randint(0, 200))
+                            )
+                    else:
+                        with incident_engine.begin() as conn:
+                            conn.execute(insert(Incident).values(type="jam", location=f"zone-{rng.randrange(zones)}"))
+                    record("writes")
+                except OperationalError:
+                    record("errors")
+
+        def reader():
+            while time.perf_counter() < deadline:
+                try:
+                    with traffic_engine.connect() as conn:
+                        conn.execute(select(models.TrafficZone).limit(100)).all()
+                    with incident_engine.connect() as conn:
+                        conn.execute(incidents_page_query(limit=50)).all()
+                    record("reads")
+                except OperationalError:
+                    record("errors")
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        traffic_engine.dispose()
+        incident_engine.dispose()
+    return {
+        "profile": name,
+        "seconds": round(elapsed, 3),
+        "reads_per_sec": round(counts["reads"] / elapsed, 1),
+        "writes_per_sec": round(counts["writes"] / elapsed, 1),
+        "errors": counts["errors"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--zones", type=int, default=1000)
+    parser.add_argument("--incidents", type=int, default=50000)
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        run_profile(name, args.seconds, args.writers, args.readers, args.zones, args.incidents)
+        for name in args.profile or ["default", "tuned"]
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"{result['profile']:>8}: {result['reads_per_sec']:>9} reads/s  "
+              f"{result['writes_per_sec']:>9} writes/s  {result['errors']} errors")
+
+if __name__ == "__main__":
+    main()
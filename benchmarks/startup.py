@@ -0,0 +1,168 @@
+"""Cold-start benchmark: how long each service takes to import and to get through its lifespan startup.
+
+Every run is a fresh interpreter under ``python -X importtime`` with empty
+throwaway databases, so it measures what a new worker pays: importing
+``<service>.main`` and then running the app's startup (schema creation,
+cache warm-up). Reports median and best times per service and where the
+import time goes, summed per top-level package. Run from the repository
+root:
+
+    python -m benchmarks.startup --runs 7
+
+    # fail if a service's median import takes longer than its budget, or if
+    # it imports a library that is meant to load only on first use
+    python -m benchmarks.startup --budget traffic_service=1200 --budget incident_service=1100 --ready-budget-ms 2000
+
+Times depend on the machine and on a warm OS file cache (the first run
+after installing packages is slower), so compare budgets on the same host.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.loadtest import PROJECT_ROOT
+
+SERVICES = ("traffic_service", "incident_service")
+# Median import time (ms) each service has to stay under
+DEFAULT_BUDGET_MS = {"traffic_service": 1500, "incident_service": 1500}
+# Loaded on first use (see common/lazy.py); importing one at startup is a regression
+DEFERRED_MODULES = ("numpy", "pyarrow", "passlib", "bcrypt", "jose.jwt")
+
+IMPORTED_MARKER = "-- imported --"
+PROBE = """
+import json, sys, time
+from types import ModuleType
+started = time.perf_counter()
+import {service}.main as main
+imported = time.perf_counter()
+print({marker!r}, file=sys.stderr, flush=True)
+# Lazily imported modules sit in sys.modules unexecuted until first use
+loaded = [name for name in {deferred!r} if type(sys.modules.get(name)) is ModuleType]
+ready = None
+if {lifespan!r}:
+    import asyncio
+
+    async def start():
+        async with main.app.router.lifespan_context(main.app):
+            return time.perf_counter()
+
+    ready = (asyncio.run(start()) - started) * 1000
+print(json.dumps({{"import_ms": (imported - started) * 1000, "ready_ms": ready, "deferred_loaded": loaded}}))
+"""
+
+def parse_importtime(stderr: str) -> Counter:
+    """Self time in microseconds per top-level package from ``-X importtime`` output, up to the end of the import."""
+    by_package = Counter()
+    for line in stderr.splitlines():
+        if line == IMPORTED_MARKER:
+            break
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.split(":", 1)[1].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us)
+    return by_package
+
+def run_once(service: str, lifespan: bool) -> dict:
+    probe = PROBE.format(service=service, marker=IMPORTED_MARKER, deferred=DEFERRED_MODULES, lifespan=lifespan)
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {
+            **os.environ,
+            "TRAFFIC_DB_PATH": str(Path(data_dir) / "traffic.db"),
+            "INCIDENT_DB_PATH": str(Path(data_dir) / "incidents.db"),
+        }
+        env.pop("SHARED_STATE_DIR", None)
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", probe],
+            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{service} failed to start:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["packages"] = parse_importtime(proc.stderr)
+    return result
+
+def measure(service: str, runs: int, lifespan: bool, top: int) -> dict:
+    results = [run_once(service, lifespan) for _ in range(runs)]
+    import_ms = [result["import_ms"] for result in results]
+    packages = sum((result["packages"] for result in results), Counter())
+    report = {
+        "service": service,
+        "runs": runs,
+        "import_ms": round(statistics.median(import_ms), 1),
+        "import_min_ms": round(min(import_ms), 1),
+        "ready_ms": None,
+        "ready_min_ms": None,
+        "deferred_loaded": sorted({name for result in results for name in result["deferred_loaded"]}),
+        "top_packages_ms": {name: round(us / runs / 1000, 1) for name, us in packages.most_common(top)},
+    }
+    if lifespan:
+        ready_ms = [result["ready_ms"] for result in results]
+        report["ready_ms"] = round(statistics.median(ready_ms), 1)
+        report["ready_min_ms"] = round(min(ready_ms), 1)
+    return report
+
+def check_budgets(reports: list, budgets: dict, ready_budget_ms: float | None) -> list:
+    failures = []
+    for report in reports:
+        service = report["service"]
+        if report["import_ms"] > budgets[service]:
+            failures.append(f"{service}: import took {report['import_ms']} ms, budget {budgets[service]} ms")
+        if ready_budget_ms is not None and report["ready_ms"] is not None and report["ready_ms"] > ready_budget_ms:
+            failures.append(f"{service}: startup took {report['ready_ms']} ms, budget {ready_budget_ms} ms")
+        if report["deferred_loaded"]:
+            failures.append(f"{service}: imported {', '.join(report['deferred_loaded'])} at startup")
+    return failures
+
+def print_table(reports: list):
+    print(f"{'service':<20}{'import ms':>11}{'best':>9}{'ready ms':>11}{'best':>9}")
+    for report in reports:
+        ready = "-" if report["ready_ms"] is None else report["ready_ms"]
+        ready_min = "-" if report["ready_min_ms"] is None else report["ready_min_ms"]
+        print(f"{report['service']:<20}{report['import_ms']:>11}{report['import_min_ms']:>9}{ready:>11}{ready_min:>9}")
+    for report in reports:
+        print(f"\n{report['service']} import time by package (self ms, mean per run):")
+        for name, ms in report["top_packages_ms"].items():
+            print(f"  {name:<28}{ms:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--service", action="append", choices=SERVICES, help="default: both")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per service")
+    parser.add_argument("--budget", action="append", metavar="SERVICE=MS", help="override a median import budget")
+    parser.add_argument("--ready-budget-ms", type=float, help="also fail when import plus startup takes longer")
+    parser.add_argument("--no-lifespan", action="store_true", help="only time the import")
+    parser.add_argument("--top", type=int, default=10, help="packages listed in the breakdown")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGET_MS)
+    for item in args.budget or []:
+        service, _, ms = item.partition("=")
+        if service not in budgets:
+            parser.error(f"unknown service {service!r}")
+        budgets[service] = float(ms)
+
+    reports = [measure(service, args.runs, not args.no_lifespan, args.top) for service in args.service or SERVICES]
+    print_table(reports)
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "started_at": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "budgets_ms": budgets,
+            "results": reports,
+        }, indent=2))
+    failures = check_budgets(reports, budgets, args.ready_budget_ms)
+    for failure in failures:
+        print(f"OVER BUDGET {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
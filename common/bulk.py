@@ -0,0 +1,133 @@
+# common/bulk.py
+import json
+import os
+import zlib
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+GZIP_CONTENT_TYPES = ("application/gzip", "application/x-gzip")
+BULK_BATCH_SIZE = 1000
+# Caps what a gzipped body may expand to, so a small upload can't exhaust memory
+BULK_MAX_DECOMPRESSED_BYTES = int(os.environ.get("BULK_MAX_DECOMPRESSED_BYTES", str(1 << 30)))
+GZIP_OUTPUT_CHUNK = 1 << 20
+BULK_MAX_LINE_BYTES = int(os.environ.get("BULK_MAX_LINE_BYTES", str(16 << 20)))
+
+def is_ndjson(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "")
+    return content_type.split(";")[0].strip() in NDJSON_CONTENT_TYPES
+
+def is_gzip(request: Request) -> bool:
+    """``Content-Encoding: gzip``, or a gzip file upload (``Content-Type: application/gzip``)."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    return request.headers.get("content-encoding", "").strip().lower() == "gzip" or content_type in GZIP_CONTENT_TYPES
+
+async def iter_body(request: Request):
+    """The request body as it streams in, gunzipped on the fly for ``Content-Encoding: gzip``."""
+    if not is_gzip(request):
+        async for chunk in request.stream():
+            yield chunk
+        return
+    decompressor = zlib.decompressobj(wbits=31)
+    total = 0
+    try:
+        async for chunk in request.stream():
+            # At most GZIP_OUTPUT_CHUNK bytes at a time; the rest of the input
+            # waits in unconsumed_tail until the consumer asks for more
+            while True:
+                data = decompressor.decompress(chunk, GZIP_OUTPUT_CHUNK)
+                total += len(data)
+                if total > BULK_MAX_DECOMPRESSED_BYTES:
+                    raise HTTPException(status_code=413, detail="Decompressed request body is too large")
+                if data:
+                    yield data
+                chunk = decompressor.unconsumed_tail
+                if not chunk and len(data) < GZIP_OUTPUT_CHUNK:
+                    break
+        yield decompressor.flush()
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Request body is not valid gzip")
+
+async def iter_raw_records(request: Request):
+    """Yields the decoded records of a JSON array or NDJSON request body.
+
+    NDJSON bodies are decoded line by line as they stream in, so a large
+    upload never has to sit in memory as a single document. Lines that are
+    not valid JSON are yielded as the exception so the caller can report
+    them per item.
+    """
+    if not is_ndjson(request):
+        try:
+            records = json.loads(b"".join([chunk async for chunk in iter_body(request)]))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of records")
+        for record in records:
+            yield record
+        return
+    async for record in iter_ndjson_records(request):
+        yield record
+
+async def iter_ndjson_records(request: Request):
+    """Decodes the body as NDJSON whatever its content type (see ``iter_raw_records``)."""
+    buffer = b""
+    async for chunk in iter_body(request):
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode_line(line)
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"NDJSON line longer than {BULK_MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield _decode_line(buffer)
+
+def _decode_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return exc
+
+async def iter_validated_batches(request: Request, model, batch_size: int = BULK_BATCH_SIZE):
+    """Groups the request's records into batches of (index, model instance) pairs.
+
+    Records that fail validation are collected as per-item errors instead of
+    failing the whole request. Each yielded item is ``(valid, errors)``.
+    """
+    async for batch in validate_batches(iter_raw_records(request), model, batch_size):
+        yield batch
+
+async def validate_batches(records, model, batch_size: int = BULK_BATCH_SIZE):
+    """``iter_validated_batches`` over any async iterable of decoded records."""
+    valid, errors = [], []
+    index = 0
+    async for record in records:
+        if isinstance(record, Exception):
+            errors.append({"index": index, "status": "error", "detail": f"Invalid JSON: {record}"})
+        elif not isinstance(record, dict):
+            errors.append({"index": index, "status": "error", "detail": "Expected a JSON object"})
+        else:
+            try:
+                valid.append((index, model(**record)))
+            except ValidationError as exc:
+                errors.append({"index": index, "status": "error", "detail": exc.errors(include_url=False, include_context=False)})
+        index += 1
+        if len(valid) >= batch_size:
+            yield valid, errors
+            valid, errors = [], []
+    if valid or errors:
+        yield valid, errors
+
+def summarize(items: list) -> dict:
+    items.sort(key=lambda item: item["index"])
+    counts = {"created": 0, "updated": 0, "skipped": 0, "error": 0}
+    for item in items:
+        counts[item["status"]] += 1
+    return {
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "skipped": counts["skipped"],
+        "failed": counts["error"],
+        "items": items,
+    }
@@ -0,0 +1,78 @@
+# common/database.py
+# Engine factory shared by traffic_service and incident_service: absolute,
+# env-configurable database paths, a sized connection pool and SQLite pragmas
+# tuned for many concurrent readers alongside a steady stream of writes.
+import os
+from pathlib import Path
+from sqlalchemy import create_engine, event
+from common.shared_state import file_lock
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# WAL lets readers proceed while a writer commits; synchronous=NORMAL is
+# durable against application crashes under WAL and only fsyncs at checkpoints.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64 MiB
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+def sqlite_path(env_var: str, filename: str) -> Path:
+    """Resolves a database file from ``env_var``, defaulting to ``filename`` in the project root."""
+    return Path(os.environ.get(env_var) or PROJECT_ROOT / filename).expanduser().resolve()
+
+def sqlite_url(path: Path, driver: str = "") -> str:
+    scheme = f"sqlite+{driver}" if driver else "sqlite"
+    return f"{scheme}:///{path}"
+
+def init_schema(path: Path, create):
+    """Runs the schema step ``create`` for the database at ``path`` once per start.
+
+    The multi-worker entrypoint runs it before forking and sets
+    SCHEMA_INITIALIZED=1 so workers skip it; workers started some other way
+    (``uvicorn --workers``, gunicorn) serialize on a lock file instead.
+    """
+    if os.environ.get("SCHEMA_INITIALIZED") == "1":
+        return
+    with file_lock(f"{path}.init.lock"):
+        create()
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+def create_sqlite_engine(path: Path, **kwargs):
+    engine = create_engine(
+        sqlite_url(path),
+        connect_args={"check_same_thread": False, "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        **kwargs,
+    )
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+def create_async_sqlite_engine(path: Path, **kwargs):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(
+        sqlite_url(path, driver="aiosqlite"),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        **kwargs,
+    )
+    event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return engine
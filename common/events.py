@@ -0,0 +1,191 @@
+# common/events.py
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from fastapi import Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from common import shared_state
+
+EVENT_HISTORY = int(os.environ.get("EVENT_HISTORY", "1024"))
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get("EVENT_HEARTBEAT_SECONDS", "15"))
+EVENT_POLL_SECONDS = float(os.environ.get("EVENT_POLL_SECONDS", "0.05"))
+
+RESYNC = "resync"
+
+class EventBroker:
+    """In-process fan-out of committed changes to any number of subscribers.
+
+    Published events go into a bounded ring with increasing sequence numbers
+    and are serialized once. Every subscriber waits on the same
+    ``asyncio.Event``, which is swapped out on each publish, so publishing
+    costs the same whether there are ten subscribers or ten thousand and
+    nobody polls the database. A subscriber that falls further behind than
+    the ring gets a ``resync`` event and should refetch.
+
+    ``publish`` is thread-safe and can be called from threadpool workers.
+
+    With SHARED_STATE_DIR set, events are appended to a log shared by every
+    worker instead, and a thread in each worker that has subscribers tails
+    it into the local ring, so a subscriber sees writes made by any worker.
+    """
+
+    def __init__(self, channel: str, history: int = EVENT_HISTORY):
+        self.channel = channel
+        self._events = deque(maxlen=history)  # (seq, serialized event)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self.subscribers = 0
+        self._log = shared_state.event_log(channel)
+        self._tailer = None
+        self._poke = threading.Event()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq if self._log is None else self._log.last_seq
+
+    def _serialize(self, seq: int, event_type: str, data) -> str:
+        return json.dumps({"seq": seq, "channel": self.channel, "type": event_type, "data": data}, default=str)
+
+    def publish(self, event_type: str, data) -> int:
+        if self._log is not None:
+            seq = self._log.append(lambda seq: self._serialize(seq, event_type, data))
+            self._poke.set()
+            return seq
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._events.append((seq, self._serialize(seq, event_type, data)))
+        self._wake_subscribers()
+        return seq
+
+    def _wake_subscribers(self):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            if _running_loop() is loop:
+                self._notify()
+            else:
+                loop.call_soon_threadsafe(self._notify)
+
+    def _tail(self):
+        """Copies events from the shared log into the local ring (runs in a daemon thread)."""
+        reader = self._log.reader()
+        while True:
+            self._poke.wait(EVENT_POLL_SECONDS)
+            self._poke.clear()
+            if self._log.last_seq == self._seq:
+                continue
+            events = reader.read()
+            if not events:
+                continue
+            with self._lock:
+                for seq, payload in events:
+                    if seq != self._seq + 1:
+                        # Missed part of the log (it rolled over twice); late subscribers resync
+                        self._events.clear()
+                    self._events.append((seq, payload))
+                    self._seq = seq
+            self._wake_subscribers()
+
+    def _start_tailer(self):
+        with self._lock:
+            if self._tailer is None:
+                self._tailer = threading.Thread(target=self._tail, name=f"events-{self.channel}", daemon=True)
+                self._tailer.start()
+
+    def _notify(self):
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def _since(self, cursor: int):
+        """Events after ``cursor``, or None when some of them already left the ring.
+
+        A cursor ahead of every event published (the sequence restarted, or
+        the shared state was reset) also gets None, so the client resyncs
+        instead of waiting for the sequence to catch up.
+        """
+        with self._lock:
+            if cursor >= self._seq:
+                # In shared mode the tailer may still be catching up to the log
+                if cursor == self._seq or (self._log is not None and cursor <= self._log.last_seq):
+                    return []
+                return None
+            if not self._events or self._events[0][0] > cursor + 1:
+                return None
+            start = cursor + 1 - self._events[0][0]
+            return [self._events[i] for i in range(start, len(self._events))]
+
+    async def listen(self, last_seq: int | None = None, heartbeat: float = EVENT_HEARTBEAT_SECONDS):
+        """Yields ``(seq, payload)`` for every event after ``last_seq``.
+
+        Yields ``(seq, None)`` after ``heartbeat`` seconds without events so
+        callers can keep idle connections alive and notice dead ones.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Bind to the serving loop; rebinding only happens when a new loop
+            # replaces the old one (app restart within the same process)
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+        if self._log is not None:
+            self._start_tailer()
+        cursor = self.last_seq if last_seq is None else last_seq
+        self.subscribers += 1
+        try:
+            while True:
+                wakeup = self._wakeup
+                events = self._since(cursor)
+                if events is None:
+                    cursor = self.last_seq
+                    yield cursor, json.dumps({"seq": cursor, "channel": self.channel, "type": RESYNC, "data": None})
+                    continue
+                for seq, payload in events:
+                    cursor = seq
+                    yield seq, payload
+                if not events:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=heartbeat)
+                    except asyncio.TimeoutError:
+                        yield cursor, None
+        finally:
+            self.subscribers -= 1
+
+    def stats(self) -> dict:
+        return {"channel": self.channel, "last_seq": self.last_seq, "buffered": len(self._events), "subscribers": self.subscribers}
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def _last_event_id(value: str | None) -> int | None:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def sse_response(broker: EventBroker, request: Request) -> StreamingResponse:
+    """Streams ``broker`` as Server-Sent Events, resuming after ``Last-Event-ID`` when given."""
+    last_seq = _last_event_id(request.headers.get("last-event-id") or request.query_params.get("last_event_id"))
+
+    async def stream():
+        async for seq, payload in broker.listen(last_seq):
+            if payload is None:
+                yield ": ping\n\n"
+            else:
+                yield f"id: {seq}\ndata: {payload}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+async def websocket_stream(broker: EventBroker, websocket: WebSocket, last_seq: int | None = None):
+    """Forwards ``broker`` events to an accepted WebSocket until the client goes away."""
+    try:
+        async for _, payload in broker.listen(last_seq):
+            await websocket.send_text(payload if payload is not None else '{"type": "ping"}')
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,162 @@
+# common/geo.py
+# Coordinates and spatial lookups shared by both services. Each table with
+# latitude/longitude columns gets a companion SQLite R*Tree that triggers
+# keep in sync with every insert, update and delete, so radius, bounding-box
+# and nearest-neighbour queries touch only the rows near the point.
+import math
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+# Half the circumference: no point on Earth is further away
+MAX_RADIUS_M = math.pi * EARTH_RADIUS_M
+
+def add_missing_columns(engine: Engine, table):
+    """Adds columns declared on ``table`` but missing from the existing database table.
+
+    ``create_all`` never alters tables that already exist; new columns are
+    added in place with ``ALTER TABLE ... ADD COLUMN``, and existing rows get
+    the column's ``server_default`` (so such columns may be NOT NULL).
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=engine.dialect)}'
+                if column.server_default is not None:
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.exec_driver_sql(ddl)
+
+def rtree_name(table_name: str) -> str:
+    return f"{table_name}_rtree"
+
+def create_spatial_index(engine: Engine, table_name: str, lat: str = "latitude", lon: str = "longitude"):
+    """Creates the R*Tree for ``table_name`` and the triggers that maintain it.
+
+    Safe to run on every start; a newly created index is backfilled from
+    the rows that already have coordinates.
+    """
+    rtree = rtree_name(table_name)
+    has_coords = f"new.{lat} IS NOT NULL AND new.{lon} IS NOT NULL"
+    insert_new = f"INSERT OR REPLACE INTO {rtree} VALUES (new.rowid, new.{lat}, new.{lat}, new.{lon}, new.{lon})"
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (rtree,)
+        ).first()
+        if not exists:
+            conn.exec_driver_sql(f"CREATE VIRTUAL TABLE {rtree} USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+            conn.exec_driver_sql(
+                f"INSERT INTO {rtree} SELECT rowid, {lat}, {lat}, {lon}, {lon} FROM {table_name} "
+                f"WHERE {lat} IS NOT NULL AND {lon} IS NOT NULL"
+            )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {table_name} "
+            f"WHEN {has_coords} BEGIN {insert_new}; END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {rtree}_update AFTER UPDATE OF {lat}, {lon} ON {table_name} "
+            f"BEGIN DELETE FROM {rtree} WHERE id = old.rowid; "
+            f"INSERT INTO {rtree} SELECT new.rowid, new.{lat}, new.{lat}, new.{lon}, new.{lon} WHERE {has_coords}; END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {table_name} "
+            f"BEGIN DELETE FROM {rtree} WHERE id = old.rowid; END"
+        )
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def bbox_around(lat: float, lon: float, radius_m: float):
+    """``(min_lat, min_lon, max_lat, max_lon)`` enclosing the circle of ``radius_m``.
+
+    A box crossing the antimeridian wraps around, so ``min_lon`` comes out
+    greater than ``max_lon``.
+    """
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    # A circle around a pole spans every longitude
+    if lat + dlat >= 90 or lat - dlat <= -90:
+        return max(lat - dlat, -90.0), -180.0, min(lat + dlat, 90.0), 180.0
+    # Widest longitude the circle reaches (away from the centre's latitude)
+    dlon = math.degrees(math.asin(min(1.0, math.sin(radius_m / EARTH_RADIUS_M) / math.cos(math.radians(lat)))))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        min_lon += 360
+    if max_lon > 180:
+        max_lon -= 360
+    return max(lat - dlat, -90.0), min_lon, min(lat + dlat, 90.0), max_lon
+
+def _box_select(select: str, table_name: str, bbox, join: str = "") -> tuple:
+    """SQL and parameters running ``select`` over the R*Tree entries inside ``bbox``.
+
+    A box crossing the antimeridian is queried as two longitude ranges.
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    ranges = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+    where = "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?"
+    sql = " UNION ALL ".join(f"{select} FROM {rtree_name(table_name)} AS r {join}{where}" for _ in ranges)
+    params = tuple(value for low, high in ranges for value in (min_lat, max_lat, low, high))
+    return sql, params
+
+def bbox_rows(conn, table_name: str, columns: str, bbox, limit: int | None = None):
+    """Rows of ``table_name`` whose point lies inside ``bbox``, found through its R*Tree.
+
+    ``min_lon`` greater than ``max_lon`` means the box crosses the antimeridian.
+    """
+    sql, params = _box_select(f"SELECT {columns}", table_name, bbox, f"JOIN {table_name} AS t ON t.rowid = r.id ")
+    if limit is not None:
+        sql += " LIMIT ?"
+        params += (limit,)
+    return conn.exec_driver_sql(sql, params).mappings().all()
+
+def _box_count(conn, table_name: str, bbox, limit: int) -> int:
+    """Entries inside ``bbox``, counting no further than ``limit``; reads only the R*Tree."""
+    sql, params = _box_select("SELECT 1", table_name, bbox)
+    return conn.exec_driver_sql(f"SELECT count(*) FROM ({sql} LIMIT ?)", params + (limit,)).scalar()
+
+def _with_distance(rows, lat: float, lon: float) -> list:
+    return [{**row, "distance_m": haversine_m(lat, lon, row["latitude"], row["longitude"])} for row in rows]
+
+def _in_circle(conn, table_name: str, columns: str, lat: float, lon: float, radius_m: float) -> list:
+    """Every row within ``radius_m`` of the point, nearest first."""
+    rows = _with_distance(bbox_rows(conn, table_name, columns, bbox_around(lat, lon, radius_m)), lat, lon)
+    rows = [row for row in rows if row["distance_m"] <= radius_m]
+    rows.sort(key=lambda row: row["distance_m"])
+    return rows
+
+def within_radius(conn, table_name: str, columns: str, lat: float, lon: float, radius_m: float, limit: int) -> list:
+    """Rows within ``radius_m`` of the point, nearest first.
+
+    Runs as a nearest-``limit`` search that never looks past ``radius_m``,
+    so a large radius over a dense area only reads the rows near the point.
+    """
+    rows = nearest(conn, table_name, columns, lat, lon, limit, max_radius_m=radius_m)
+    return [row for row in rows if row["distance_m"] <= radius_m]
+
+def nearest(conn, table_name: str, columns: str, lat: float, lon: float, k: int, start_radius_m: float = 500.0, max_radius_m: float = MAX_RADIUS_M) -> list:
+    """The ``k`` rows closest to the point, only looking as far as ``max_radius_m``.
+
+    Grows a search box until it holds ``k`` candidates. The box's corners
+    reach further than its inscribed circle, so the candidates are only
+    exact if the k-th is inside that circle; otherwise its distance bounds
+    the true k-th neighbour and one radius query of that size is exact.
+    Once the box reaches ``max_radius_m`` it holds every row inside that
+    circle, and rows beyond it may come back too.
+    """
+    radius = min(start_radius_m, max_radius_m)
+    while _box_count(conn, table_name, bbox_around(lat, lon, radius), k) < k and radius < max_radius_m:
+        radius = min(radius * 4, max_radius_m)
+    candidates = sorted(
+        _with_distance(bbox_rows(conn, table_name, columns, bbox_around(lat, lon, radius)), lat, lon),
+        key=lambda row: row["distance_m"],
+    )
+    if len(candidates) < k or candidates[k - 1]["distance_m"] <= radius or radius >= max_radius_m:
+        return candidates[:k]
+    return _in_circle(conn, table_name, columns, lat, lon, candidates[k - 1]["distance_m"])[:k]
@@ -0,0 +1,33 @@
+# common/lazy.py
+# Deferred imports for heavy libraries used throughout a module (NumPy,
+# jose's JWT stack). The module object is bound at import time but only
+# executed on first attribute access, so importing a service doesn't pay
+# for it. That first access isn't thread-safe before Python 3.12, so the
+# lifespans load these modules before serving; code paths that run rarely
+# and in worker threads import inside the function instead.
+import importlib.util
+import sys
+
+def lazy_import(name: str):
+    """``name``'s module, loaded on first attribute access; None when it is not installed.
+
+    Annotations are evaluated at definition time, so modules using this
+    must quote ones that refer to the lazy module (``"np.ndarray"``).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def load(*modules):
+    """Forces lazily imported modules to load, e.g. from a lifespan before requests arrive."""
+    for module in modules:
+        if module is not None:
+            module.__name__  # any attribute lookup executes the module
@@ -0,0 +1,400 @@
+# common/metrics.py
+# In-process instrumentation for the FastAPI services, rendered in the
+# Prometheus text format at /metrics: per-route latency histograms, DB query
+# counts and timings attributed to the request that issued them, timed hot
+# paths (JWT decode, bcrypt, serialization) and scrape-time gauges for
+# caches, brokers and connection pools. An opt-in sampling profiler writes
+# folded stacks of slow requests for flame graphs. Under several workers
+# (SHARED_STATE_DIR set) each one publishes a snapshot to the shared state
+# directory and every scrape sums the histograms of all of them.
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from common import shared_state
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+INF_BOUND = 'le="+Inf"'
+
+# Opt-in profiler: requests slower than PROFILE_SLOW_MS get their samples dumped
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+# How often each worker refreshes its snapshot; at most this much of an exited worker's tail is lost
+METRICS_PUBLISH_SECONDS = float(os.environ.get("METRICS_PUBLISH_SECONDS", "5"))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {labels: list(values) for labels, values in self._series.items()}
+
+    def render(self, series: dict | None = None) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            series = self.snapshot()
+        bounds = [f'le="{bound:g}"' for bound in self.buckets]
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, bound)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, INF_BOUND)} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {values[-1]}")
+        return lines
+
+class Registry:
+    """Histograms updated as requests run plus gauge callbacks read at scrape time."""
+
+    def __init__(self):
+        self.histograms = []
+        self._gauges = []  # (name, help, labelname, fn returning {label: {field: value}})
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        histogram = Histogram(*args, **kwargs)
+        self.histograms.append(histogram)
+        return histogram
+
+    def gauge(self, name: str, help: str, label: str, collect):
+        """Registers ``collect() -> {label_value: {field: number}}``, exported as ``name_<field>``."""
+        self._gauges.append((name, help, label, collect))
+
+    def _gauge_samples(self) -> list:
+        """``[metric, help, label, label_value, value]`` for every numeric field the callbacks return."""
+        samples = []
+        for name, help, label, collect in self._gauges:
+            for label_value, stats in collect().items():
+                for field, value in stats.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        samples.append([f"{name}_{field}", help, label, str(label_value), value])
+        return samples
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        lines.extend(_render_gauges((sample, "") for sample in self._gauge_samples()))
+        return "\n".join(lines) + "\n"
+
+    # --- Cross-worker aggregation ---
+    def snapshot(self) -> bytes:
+        return json.dumps({
+            "histograms": {h.name: [[list(labels), values] for labels, values in h.snapshot().items()] for h in self.histograms},
+            "gauges": self._gauge_samples(),
+        }).encode()
+
+    def render_merged(self, snapshots: list) -> str:
+        """Renders ``shared_state.read_snapshots`` output as one service.
+
+        Histograms are summed over every worker that ever published, exited
+        ones included, so counters never go backwards when a scrape lands on
+        another worker. Gauges describe a live process (its cache, its pool)
+        and are reported per live worker under a ``worker`` label instead.
+        """
+        merged = {histogram.name: {} for histogram in self.histograms}
+        gauges = []
+        for pid, alive, data in snapshots:
+            try:
+                snapshot = json.loads(data)
+            except ValueError:
+                continue
+            for name, series in snapshot["histograms"].items():
+                if name not in merged:
+                    continue
+                for labels, values in series:
+                    total = merged[name].setdefault(tuple(labels), [0] * len(values))
+                    for i, value in enumerate(values):
+                        total[i] += value
+            if alive:
+                gauges.extend((sample, f'worker="{pid}"') for sample in snapshot["gauges"])
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render(merged[histogram.name]))
+        lines.extend(_render_gauges(gauges))
+        return "\n".join(lines) + "\n"
+
+def _render_gauges(samples) -> list:
+    by_metric = {}
+    for (metric, help, label, label_value, value), extra in samples:
+        by_metric.setdefault(metric, (help, []))[1].append((label, label_value, value, extra))
+    lines = []
+    for metric, (help, rows) in by_metric.items():
+        lines.append(f"# HELP {metric} {help}")
+        lines.append(f"# TYPE {metric} gauge")
+        for label, label_value, value, extra in rows:
+            lines.append(f"{metric}{_labels((label,), (label_value,), extra)} {value}")
+    return lines
+
+class ServiceMetrics:
+    """The histograms of one service; each app gets its own so in-process tests don't mix."""
+
+    def __init__(self):
+        self.registry = Registry()
+        histogram = self.registry.histogram
+        self.request_latency = histogram("http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"))
+        self.db_query_latency = histogram("db_query_duration_seconds", "SQL statement latency by route.", ("route",))
+        self.db_queries_per_request = histogram(
+            "db_queries_per_request", "SQL statements issued per request.", ("route",), buckets=COUNT_BUCKETS
+        )
+        self.db_time_per_request = histogram("db_time_per_request_seconds", "Total SQL time per request.", ("route",))
+        self.operation_latency = histogram("app_operation_duration_seconds", "Latency of instrumented hot paths.", ("operation",))
+        self._publisher = None
+
+    def publish(self):
+        shared_state.publish_snapshot("metrics", self.registry.snapshot())
+
+    def start_publishing(self):
+        """Starts refreshing this worker's snapshot; called on its first request, so the supervisor never publishes."""
+        if self._publisher is not None or shared_state.SHARED_STATE_DIR is None:
+            return
+        self._publisher = threading.Thread(target=self._publish_forever, name="metrics-publisher", daemon=True)
+        self._publisher.start()
+        atexit.register(self.publish)
+
+    def _publish_forever(self):
+        while True:
+            time.sleep(METRICS_PUBLISH_SECONDS)
+            self.publish()
+
+    def render(self) -> str:
+        if shared_state.SHARED_STATE_DIR is None:
+            return self.registry.render()
+        self.publish()
+        return self.registry.render_merged(shared_state.read_snapshots("metrics"))
+
+# --- Per-request state ---
+class RequestState:
+    __slots__ = ("metrics", "scope", "queries", "query_seconds")
+
+    def __init__(self, metrics: ServiceMetrics, scope):
+        self.metrics = metrics
+        self.scope = scope
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        return _route_of(self.scope)
+
+# Threadpool calls copy the context, so sync CRUD code sees (and mutates) the same object
+_request: ContextVar[RequestState | None] = ContextVar("metrics_request", default=None)
+
+@contextmanager
+def timed(operation: str):
+    """Records the duration of a hot-path operation (``jwt_decode``, ``bcrypt_verify``, ...)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        state = _request.get()
+        if state is not None:
+            state.metrics.operation_latency.observe(time.perf_counter() - start, operation)
+
+# --- SQLAlchemy instrumentation ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    state = _request.get()
+    if state is not None:
+        state.queries += 1
+        state.query_seconds += elapsed
+        state.metrics.db_query_latency.observe(elapsed, state.route)
+
+def instrument_engine(engine):
+    """Times every statement run through ``engine`` (sync, or the sync core of an async engine)."""
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def pool_stats(**engines) -> dict:
+    stats = {}
+    for name, engine in engines.items():
+        if engine is None:
+            continue
+        pool = getattr(engine, "sync_engine", engine).pool
+        stats[name] = {
+            field: getattr(pool, field)()
+            for field in ("size", "checkedin", "checkedout", "overflow")
+            if callable(getattr(pool, field, None))
+        }
+    return stats
+
+# --- Sampling profiler ---
+class SamplingProfiler:
+    """Samples every thread's stack while requests are in flight.
+
+    Samples are kept in a short ring buffer; when a request finishes slower
+    than the threshold, the samples taken during its lifetime are folded
+    (``frame;frame;frame count``) and appended to ``<route>.folded`` for
+    flamegraph.pl or speedscope. Concurrent requests share the event loop
+    thread, so attribution is by time window, not exact.
+    """
+
+    def __init__(self, interval: float, directory: Path, history: int = 20000):
+        self.interval = interval
+        self.directory = directory
+        self._samples = deque(maxlen=history)  # (timestamp, folded stack)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+
+    def start_request(self):
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def end_request(self, route: str, started: float, elapsed: float):
+        with self._lock:
+            self._active -= 1
+            samples = [stack for ts, stack in self._samples if ts >= started] if elapsed * 1000 >= PROFILE_SLOW_MS else None
+        if samples:
+            self._dump(route, samples)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                while self._active == 0:
+                    self._wake.wait()
+            now = time.perf_counter()
+            samples = []
+            for thread_id, frame in sys._current_frames().items():
+                # Skip ourselves and threads parked in a lock, queue or selector
+                leaf = Path(frame.f_code.co_filename).name
+                if thread_id == me or leaf in _IDLE_MODULES or (leaf, frame.f_code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                samples.append((now, ";".join(reversed(stack))))
+            with self._lock:
+                self._samples.extend(samples)
+            time.sleep(self.interval)
+
+    def _dump(self, route: str, samples: list):
+        folded = {}
+        for stack in samples:
+            folded[stack] = folded.get(stack, 0) + 1
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        with open(self.directory / f"{name}.folded", "a") as f:
+            for stack, count in folded.items():
+                f.write(f"{stack} {count}\n")
+
+_IDLE_MODULES = {"threading.py", "queue.py", "selectors.py"}
+# Worker loops whose blocking queue get happens in C, leaving them as the leaf frame
+_IDLE_FRAMES = {("thread.py", "_worker"), ("core.py", "_connection_worker_thread")}
+profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000, PROFILE_DIR) if PROFILE_SLOW_MS > 0 else None
+
+# --- ASGI middleware ---
+class MetricsMiddleware:
+    """Times each HTTP request and attributes its SQL statements to the matched route.
+
+    A plain ASGI middleware rather than ``BaseHTTPMiddleware`` so streaming
+    responses (SSE, NDJSON) pass through untouched.
+    """
+
+    def __init__(self, app, metrics: ServiceMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.metrics.start_publishing()
+        state = RequestState(self.metrics, scope)
+        token = _request.set(state)
+        status = ["500"]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.start_request()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = state.route
+            self.metrics.request_latency.observe(elapsed, scope["method"], route, status[0])
+            self.metrics.db_queries_per_request.observe(state.queries, route)
+            self.metrics.db_time_per_request.observe(state.query_seconds, route)
+            if profiler is not None:
+                profiler.end_request(route, start, elapsed)
+            _request.reset(token)
+
+def _route_of(scope) -> str:
+    # The router stores the matched route in the shared scope dict; unmatched
+    # paths share one label so scanners can't blow up cardinality
+    return getattr(scope.get("route"), "path", "unmatched")
+
+def install(app: FastAPI, *engines, gauges: dict | None = None) -> ServiceMetrics:
+    """Adds the middleware, instruments ``engines`` and serves ``GET /metrics``.
+
+    ``gauges`` maps a metric prefix to ``(label, collect)``; see ``Registry.gauge``.
+    """
+    metrics = ServiceMetrics()
+    for engine in engines:
+        if engine is not None:
+            instrument_engine(engine)
+    for name, (label, collect) in (gauges or {}).items():
+        metrics.registry.gauge(name, f"{name.replace('_', ' ').capitalize()} statistics.", label, collect)
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    return metrics
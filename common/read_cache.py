@@ -0,0 +1,108 @@
+# common/read_cache.py
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from fastapi import Request, Response
+from common import shared_state
+
+READ_CACHE_SIZE = int(os.environ.get("READ_CACHE_SIZE", "1024"))
+
+class ReadCache:
+    """Write-invalidated cache of serialized read responses.
+
+    Every write bumps ``generation``, which invalidates all entries at once.
+    ETags are derived from the generation rather than the body, so a
+    matching ``If-None-Match`` is answered before any query runs. The
+    ``epoch`` keeps ETags from an earlier process from matching after a
+    restart. Under SHARED_STATE_DIR the generation and epoch are shared by
+    all workers, so a write in one worker invalidates every worker's
+    entries and any worker can answer a conditional request.
+
+    With ``ttl`` the cache also turns over every ``ttl`` seconds, for reads
+    that depend on data whose writes don't call ``invalidate``.
+    """
+
+    def __init__(self, namespace: str, maxsize: int = READ_CACHE_SIZE, ttl: float | None = None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._generation = shared_state.counter(f"{namespace}.generation")
+        self.epoch = self._generation.epoch
+        self._entries = OrderedDict()  # key -> (version, body)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation.value
+
+    def version(self):
+        """What cached bodies and ETags are tied to: the generation, plus the TTL period if any."""
+        if self.ttl is None:
+            return self.generation
+        return f"{self.generation}.{int(time.time() // self.ttl)}"
+
+    def invalidate(self):
+        with self._lock:
+            self._generation.increment()
+            self._entries.clear()
+
+    def etag(self, key: str, version=None) -> str:
+        version = self.version() if version is None else version
+        return f'W/"{self.namespace}-{self.epoch}-{version}-{zlib.crc32(key.encode()):08x}"'
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != self.version():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, body: bytes, version):
+        with self._lock:
+            # A write landed (or the TTL ran out) while the body was being built; it may be stale
+            if version != self.version():
+                return
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "generation": self.generation, "hits": self.hits, "misses": self.misses}
+
+def request_cache_key(request: Request) -> str:
+    query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+    return f"{request.url.path}?{query}"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+async def cached_json_response(request: Request, cache: ReadCache, load) -> Response:
+    """Serves a JSON read through ``cache`` with ETag / If-None-Match support.
+
+    ``load`` is a coroutine function returning the serialized JSON body; it
+    only runs on a cache miss. A matching ``If-None-Match`` gets a 304 with
+    no query and no body.
+    """
+    key = request_cache_key(request)
+    version = cache.version()
+    etag = cache.etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = cache.get(key)
+    if body is None:
+        body = await load()
+        cache.put(key, body, version)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,104 @@
+# common/serialization.py
+# Fast path for large list responses: rows are selected as plain column
+# tuples and encoded straight to bytes (with orjson when it is installed),
+# skipping ORM objects and per-item Pydantic validation. Results can be
+# returned whole or streamed chunk by chunk as a JSON array, NDJSON or CSV.
+import csv
+import io
+import json
+from datetime import date, datetime
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder produces the same output, slower
+    orjson = None
+
+STREAM_CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value) -> bytes:
+    """Compact JSON bytes, matching what the Pydantic response models emit for these types."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+def response_format(request: Request, format: str | None) -> str:
+    """``json``, ``ndjson`` or ``csv`` from ``?format=`` or, failing that, the Accept header."""
+    if format is None:
+        accept = request.headers.get("accept", "")
+        format = next((name for name, media in MEDIA_TYPES.items() if media in accept and name != "json"), "json")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(MEDIA_TYPES)}")
+    return format
+
+def records(columns, rows) -> list:
+    """Column tuples to dicts keyed by the response field names."""
+    return [dict(zip(columns, row)) for row in rows]
+
+def encode_json(columns, rows) -> bytes:
+    return dumps(records(columns, rows))
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+def encode_chunk(format: str, columns, rows, first: bool) -> bytes:
+    """One chunk of a streamed body; ``first`` marks the chunk that opens the document."""
+    if format == "ndjson":
+        return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if first:
+            writer.writerow(columns)
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+    body = dumps(records(columns, rows))[1:-1]
+    if not body:
+        return b"[" if first else b""
+    return (b"[" if first else b",") + body
+
+def stream_rows(format: str, columns, chunks, headers: dict | None = None) -> StreamingResponse:
+    """Streams ``chunks`` (an iterable of row lists) as ``format``.
+
+    ``chunks`` may be a plain generator that runs blocking queries;
+    Starlette iterates it in the threadpool.
+    """
+    def body():
+        first = True
+        for rows in chunks:
+            chunk = encode_chunk(format, columns, rows, first)
+            if chunk:
+                yield chunk
+                first = False
+        if format == "json":
+            yield b"[]" if first else b"]"
+        elif format == "csv" and first:
+            yield encode_chunk(format, columns, [], True)
+
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[format], headers=headers)
+
+def iter_chunks(result, size: int = STREAM_CHUNK_ROWS):
+    """Row lists of at most ``size`` from a SQLAlchemy result, fetched lazily."""
+    while True:
+        rows = result.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+def rows_response(format: str, columns, rows, headers: dict | None = None) -> Response:
+    """A complete (non-streamed) response for rows already in memory."""
+    if format == "json":
+        return Response(encode_json(columns, rows), media_type=MEDIA_TYPES[format], headers=headers)
+    return Response(encode_chunk(format, columns, rows, True), media_type=MEDIA_TYPES[format], headers=headers)
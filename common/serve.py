@@ -0,0 +1,60 @@
+# common/serve.py
+# Production entrypoint shared by the FastAPI services:
+#
+#     python -m traffic_service --workers 4
+#     python -m incident_service --workers 4
+#
+# Creates the schema once, points every worker at one SHARED_STATE_DIR (see
+# common/shared_state.py) and hands off to uvicorn's process supervisor,
+# which restarts dead workers and scales on SIGTTIN (+1) / SIGTTOU (-1).
+import argparse
+import importlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# Everything common.shared_state creates, and nothing else
+STATE_FILES = ("*.counter", "*.leader", "*.events", "*.events.*", "*.array", "*.array.lock", "*.snapshot", "*.snapshot.tmp")
+
+def reset_state_dir(path: Path):
+    """Drops counters, arrays and event logs left by an earlier run, whose ETags and sequence numbers no longer apply."""
+    path.mkdir(parents=True, exist_ok=True)
+    for pattern in STATE_FILES:
+        for entry in path.glob(pattern):
+            entry.unlink()
+
+def serve(app_path: str, default_port: int, argv=None):
+    parser = argparse.ArgumentParser(description=f"Run {app_path} with several uvicorn workers sharing state.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--state-dir", type=Path, help="directory for shared counters and event logs (default: a new temp dir)")
+    parser.add_argument("--timeout-graceful-shutdown", type=float, default=30.0,
+                        help="seconds a stopping worker waits for in-flight requests")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", dest="access_log", action="store_false")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    state_dir = args.state_dir or Path(tempfile.mkdtemp(prefix=f"{app_path.split('.')[0]}-state-"))
+    reset_state_dir(state_dir)
+    # Read by common.shared_state at import, so set before the app module loads
+    os.environ["SHARED_STATE_DIR"] = str(state_dir)
+    try:
+        # Schema work happens here, once, instead of racing in every worker
+        importlib.import_module(app_path.partition(":")[0]).create_schema()
+        os.environ["SCHEMA_INITIALIZED"] = "1"
+        uvicorn.run(
+            app_path,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            timeout_graceful_shutdown=args.timeout_graceful_shutdown,
+            log_level=args.log_level,
+            access_log=args.access_log,
+        )
+    finally:
+        if args.state_dir is None:
+            shutil.rmtree(state_dir, ignore_errors=True)
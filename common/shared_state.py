@@ -0,0 +1,265 @@
+# common/shared_state.py
+# State that every uvicorn worker of a service must agree on. When
+# SHARED_STATE_DIR is set (python -m traffic_service / incident_service set
+# it for their workers), counters and arrays are memory-mapped files,
+# events go through an append-only log in that directory and each worker
+# publishes snapshots (its metrics) there. Without it everything stays
+# in-process, which is all a single worker needs.
+import fcntl
+import mmap
+import os
+import random
+import threading
+import uuid
+from contextlib import contextmanager
+
+SHARED_STATE_DIR = os.environ.get("SHARED_STATE_DIR") or None
+EVENT_LOG_MAX_BYTES = int(os.environ.get("EVENT_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive ``flock`` on ``path`` (created if missing), held across processes."""
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# --- Counters ---
+class LocalCounter:
+    shared = False
+
+    def __init__(self):
+        self.value = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+    def increment(self) -> int:
+        with self._lock:
+            self.value += 1
+            return self.value
+
+class SharedCounter:
+    """An int64 in a memory-mapped file; reads are a plain memory load.
+
+    The second word holds a random ``epoch`` written when the file is
+    created, so values from an earlier deployment's file are never confused
+    with this one's.
+    """
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+        with self._locked():
+            if os.fstat(self._fd).st_size == 0:
+                os.write(self._fd, (0).to_bytes(8, "little") + random.getrandbits(62).to_bytes(8, "little"))
+        self._map = mmap.mmap(self._fd, 16)
+        self._words = memoryview(self._map).cast("q")
+        self.epoch = f"{self._words[1]:016x}"[:8]
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def value(self) -> int:
+        return self._words[0]
+
+    def increment(self) -> int:
+        with self._locked():
+            self._words[0] += 1
+            return self._words[0]
+
+def counter(name: str):
+    """A counter shared by all workers when SHARED_STATE_DIR is set, else a process-local one."""
+    if SHARED_STATE_DIR is None:
+        return LocalCounter()
+    return SharedCounter(os.path.join(SHARED_STATE_DIR, f"{name}.counter"))
+
+# --- Arrays ---
+class ArrayLock:
+    """Guards a shared array: a thread lock, plus an ``flock`` when the array is shared between workers."""
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def __call__(self):
+        with self._lock:
+            if self.path is None:
+                yield
+            else:
+                with file_lock(self.path):
+                    yield
+
+def array(name: str, shape: tuple, dtype: str = "float64"):
+    """A zero-filled NumPy array and its lock; memory-mapped and shared by all workers when SHARED_STATE_DIR is set."""
+    import numpy as np
+
+    if SHARED_STATE_DIR is None:
+        return np.zeros(shape, dtype=dtype), ArrayLock(None)
+    path = os.path.join(SHARED_STATE_DIR, f"{name}.array")
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with file_lock(path + ".lock"):
+        with open(path, "ab") as f:
+            if f.tell() != size:
+                f.truncate(size)  # sparse; pages are only allocated once written
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape), ArrayLock(path + ".lock")
+
+# --- Leader election for periodic jobs ---
+class LeaderLock:
+    """Non-blocking ``flock`` that picks one worker to run a periodic job.
+
+    The worker that gets the lock keeps it until it exits; the others keep
+    trying on every tick, so the job moves on when its owner goes away.
+    """
+
+    def __init__(self, name: str):
+        self.path = None if SHARED_STATE_DIR is None else os.path.join(SHARED_STATE_DIR, f"{name}.leader")
+        self._file = None
+
+    def acquire(self) -> bool:
+        if self.path is None or self._file is not None:
+            return True
+        f = open(self.path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+# --- Event log ---
+class EventLog:
+    """Append-only log of serialized events shared by all workers of a service.
+
+    Each line is ``<seq> <payload>``. Sequence numbers come from a shared
+    counter taken under the same lock as the append, so file order is seq
+    order. The log rolls over to ``<path>.1`` past EVENT_LOG_MAX_BYTES;
+    readers finish the old file before moving to the new one.
+    """
+
+    def __init__(self, channel: str, directory: str, max_bytes: int = EVENT_LOG_MAX_BYTES):
+        self.path = os.path.join(directory, f"{channel}.events")
+        self.max_bytes = max_bytes
+        self._seq = SharedCounter(os.path.join(directory, f"{channel}.events.seq"))
+        self._lock_path = self.path + ".lock"
+        self._lock = threading.Lock()
+        open(self.path, "ab").close()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq.value
+
+    def append(self, serialize) -> int:
+        """Writes ``serialize(seq)`` under the next sequence number and returns it."""
+        with self._lock, file_lock(self._lock_path):
+            seq = self._seq.value + 1
+            line = f"{seq} {serialize(seq)}\n".encode()
+            with open(self.path, "ab") as f:
+                f.write(line)
+                size = f.tell()
+            self._seq.increment()
+            if size > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+                open(self.path, "ab").close()
+        return seq
+
+    def reader(self):
+        return EventLogReader(self.path)
+
+class EventLogReader:
+    """Follows an ``EventLog`` from the start of its current file, across rollovers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._buffer = b""
+
+    def read(self) -> list:
+        """``(seq, payload)`` pairs appended since the last call."""
+        events = self._drain()
+        try:
+            rolled = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            rolled = False
+        if rolled:
+            # Whatever was appended before the rename is still in the old file
+            events += self._drain()
+            self._file.close()
+            self._file = open(self.path, "rb")
+            self._buffer = b""
+            events += self._drain()
+        return events
+
+    def _drain(self) -> list:
+        data = self._file.read()
+        if not data:
+            return []
+        *lines, self._buffer = (self._buffer + data).split(b"\n")
+        events = []
+        for line in lines:
+            seq, _, payload = line.partition(b" ")
+            events.append((int(seq), payload.decode()))
+        return events
+
+    def close(self):
+        self._file.close()
+
+# --- Per-worker snapshots ---
+_worker = (None, None)
+
+def worker_id() -> str:
+    """``<pid>-<random>``, unique even when a pid is reused by a later worker."""
+    global _worker
+    if _worker[0] != os.getpid():
+        _worker = (os.getpid(), f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    return _worker[1]
+
+def publish_snapshot(name: str, data: bytes):
+    """Replaces this worker's ``name`` snapshot, which every worker can read with ``read_snapshots``."""
+    path = os.path.join(SHARED_STATE_DIR, f"{name}.{worker_id()}.snapshot")
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+def read_snapshots(name: str) -> list:
+    """``(pid, alive, data)`` for the latest ``name`` snapshot of every worker, including exited ones."""
+    snapshots = []
+    prefix = f"{name}."
+    for entry in os.scandir(SHARED_STATE_DIR):
+        if not (entry.name.startswith(prefix) and entry.name.endswith(".snapshot")):
+            continue
+        pid = int(entry.name[len(prefix):].split("-", 1)[0])
+        try:
+            with open(entry.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            continue
+        snapshots.append((pid, _alive(pid), data))
+    return snapshots
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def event_log(channel: str):
+    """The shared log for ``channel``, or None when running without SHARED_STATE_DIR."""
+    if SHARED_STATE_DIR is None:
+        return None
+    return EventLog(channel, SHARED_STATE_DIR)
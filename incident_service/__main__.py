@@ -0,0 +1,6 @@
+# incident_service/__main__.py
+# python -m incident_service [--workers N] [--port 8002]
+from common.serve import serve
+
+if __name__ == "__main__":
+    serve("incident_service.main:app", 8002)
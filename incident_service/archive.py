@@ -0,0 +1,305 @@
+# incident_service/archive.py
+# Moving incident history in and out of the hot table. Exports stream rows
+# oldest first in bounded chunks as gzip-compressed NDJSON or, when pyarrow
+# is installed, Parquet. The archival job writes everything older than a
+# cutoff to a file in INCIDENT_ARCHIVE_DIR, then deletes the rows that file
+# holds in small batches so list and lookup queries only ever scan recent
+# incidents.
+#
+#     python -m incident_service.archive --older-than-days 90
+import argparse
+import gzip
+import importlib.util
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from sqlalchemy import Column, MetaData, Table, delete, func, insert, select, tuple_
+from common import serialization
+from common.database import PROJECT_ROOT
+from common.shared_state import file_lock
+from .database import IncidentSessionLocal
+from .events import incident_changed
+from .models import Incident
+from .pagination import INCIDENT_COLUMNS, INCIDENT_FIELDS
+
+# Parquet is optional; NDJSON always works. pyarrow is only imported by the
+# Parquet code paths, since loading it would add to every service start
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+ARCHIVE_DIR = Path(os.environ.get("INCIDENT_ARCHIVE_DIR") or PROJECT_ROOT / "archive" / "incidents")
+ARCHIVE_FORMAT = os.environ.get("INCIDENT_ARCHIVE_FORMAT", "ndjson")
+# The periodic job is off unless INCIDENT_ARCHIVE_AFTER_DAYS is set
+ARCHIVE_AFTER_DAYS = float(os.environ.get("INCIDENT_ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get("INCIDENT_ARCHIVE_INTERVAL_SECONDS", "3600"))
+DELETE_BATCH_ROWS = 5000
+# Sits next to an archive from its rename until its rows are deleted
+PENDING_SUFFIX = ".pending"
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/gzip", "ndjson.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+PARQUET_CONTENT_TYPES = ("application/vnd.apache.parquet", "application/x-parquet")
+
+class ParquetUnavailable(Exception):
+    pass
+
+def require_pyarrow():
+    if not PARQUET_AVAILABLE:
+        raise ParquetUnavailable("Parquet support needs pyarrow (pip install pyarrow)")
+
+# --- Export ---
+def export_query(since: datetime | None = None, until: datetime | None = None, upto=None, max_id: int | None = None):
+    """Oldest-first incidents in ``[since, until)``; ``upto`` caps the (timestamp, id) key."""
+    stmt = select(*INCIDENT_COLUMNS)
+    if since is not None:
+        stmt = stmt.where(Incident.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(Incident.timestamp < until)
+    if upto is not None:
+        stmt = stmt.where(tuple_(Incident.timestamp, Incident.id) <= tuple(upto))
+    if max_id is not None:
+        stmt = stmt.where(Incident.id <= max_id)
+    return stmt.order_by(Incident.timestamp, Incident.id)
+
+def iter_export_chunks(**filters):
+    """Row chunks of ``export_query(**filters)`` from a session held for the whole export."""
+    with IncidentSessionLocal() as db:
+        yield from serialization.iter_chunks(db.execute(export_query(**filters)))
+
+def gzip_ndjson(chunks):
+    """Gzip-compressed NDJSON bytes, compressed incrementally chunk by chunk."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for rows in chunks:
+        data = compressor.compress(serialization.encode_chunk("ndjson", INCIDENT_FIELDS, rows, False))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _parquet_schema():
+    import pyarrow
+
+    return pyarrow.schema([
+        ("type", pyarrow.string()),
+        ("location", pyarrow.string()),
+        ("latitude", pyarrow.float64()),
+        ("longitude", pyarrow.float64()),
+        ("id", pyarrow.int64()),
+        ("timestamp", pyarrow.timestamp("us")),
+        ("report_count", pyarrow.int64()),
+        ("last_reported_at", pyarrow.timestamp("us")),
+    ])
+
+def write_parquet(chunks, sink):
+    """Writes each chunk as its own row group, so memory stays bounded by the chunk size."""
+    require_pyarrow()
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = _parquet_schema()
+    with pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            arrays = [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+def parquet_bytes(chunks):
+    """Parquet needs its footer written last, so spool to a temp file and stream that."""
+    with tempfile.TemporaryFile() as spool:
+        write_parquet(chunks, spool)
+        spool.seek(0)
+        while data := spool.read(1 << 20):
+            yield data
+
+def export_bytes(format: str, chunks):
+    return parquet_bytes(chunks) if format == "parquet" else gzip_ndjson(chunks)
+
+# --- Import ---
+def iter_parquet_records(path, batch_rows: int = serialization.STREAM_CHUNK_ROWS):
+    """Records of a Parquet file, read one batch of rows at a time."""
+    require_pyarrow()
+    import pyarrow
+    import pyarrow.parquet
+
+    try:
+        parquet = pyarrow.parquet.ParquetFile(path)
+    except pyarrow.ArrowException as exc:
+        raise ValueError(f"Not a valid Parquet file: {exc}")
+    for batch in parquet.iter_batches(batch_size=batch_rows):
+        yield from batch.to_pylist()
+
+def plan_import(incidents: list, existing: set):
+    """Splits ``(index, IncidentImport)`` pairs into rows to insert and per-item results.
+
+    Returns ``(results, rows_with_id, rows_without_id)``; the last are
+    ``(index, row)`` pairs whose ids the database assigns. Ids that already
+    exist, or repeat within the batch, are reported as skipped.
+    """
+    results, with_id, without_id = [], [], []
+    existing = set(existing)
+    for index, incident in incidents:
+        row = incident.dict()
+        row["timestamp"] = row["timestamp"] or datetime.utcnow()
+        row["report_count"] = row["report_count"] or 1
+        if incident.id is None:
+            del row["id"]
+            without_id.append((index, row))
+        elif incident.id in existing:
+            results.append({"index": index, "status": "skipped", "id": incident.id})
+        else:
+            existing.add(incident.id)
+            with_id.append(row)
+            results.append({"index": index, "status": "created", "id": incident.id})
+    return results, with_id, without_id
+
+# --- Archival ---
+def _counted(chunks, counter: list):
+    for rows in chunks:
+        counter[0] += len(rows)
+        yield rows
+
+# Archived rows are staged here, per connection, to delete only their exact copies
+_archived = Table(
+    "archived_incidents",
+    MetaData(),
+    *(Column(column.name, column.type) for column in Incident.__table__.columns if column.name in INCIDENT_FIELDS),
+    prefixes=["TEMPORARY"],
+)
+
+def iter_archive_records(path: Path):
+    """Records of an archive file written by ``archive_incidents``."""
+    if path.name.endswith(".parquet"):
+        yield from iter_parquet_records(path)
+        return
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            record = json.loads(line)
+            for name in ("timestamp", "last_reported_at"):
+                if record[name] is not None:
+                    record[name] = datetime.fromisoformat(record[name])
+            yield record
+
+def delete_archived(path: Path) -> int:
+    """Deletes the incidents ``path`` holds, batch by batch; returns how many.
+
+    A row is only deleted if it still matches its archived copy in every
+    column, checked by the DELETE itself, so a row updated after the export
+    stays in the table (and goes into the next archive). Deleting is
+    idempotent, so an interrupted run can simply be repeated.
+    """
+    table = Incident.__table__
+    # Driven from the staged batch, each row looked up by primary key
+    unchanged = (
+        select(_archived.c.id)
+        .join(table, table.c.id == _archived.c.id)
+        .where(*(table.c[name].is_not_distinct_from(_archived.c[name]) for name in INCIDENT_FIELDS if name != "id"))
+        .correlate(None)
+    )
+    records = iter_archive_records(path)
+    deleted = 0
+    with IncidentSessionLocal() as db:
+        _archived.create(db.connection(), checkfirst=True)
+        while batch := list(islice(records, DELETE_BATCH_ROWS)):
+            db.execute(insert(_archived), batch)
+            deleted += db.execute(delete(table).where(table.c.id.in_(unchanged))).rowcount
+            db.execute(delete(_archived))
+            db.commit()
+    return deleted
+
+def archive_incidents(older_than: timedelta, directory: Path = ARCHIVE_DIR, format: str = ARCHIVE_FORMAT,
+                      now: datetime | None = None) -> dict:
+    """Moves incidents older than ``older_than`` to a new archive file.
+
+    The file is written and fsynced under a temporary name and renamed
+    into place before any row is deleted, and only rows still identical to
+    their archived copy are deleted (see ``delete_archived``). A
+    ``.pending`` marker covers the time between the two, so a run that
+    crashed in between is finished by the next one. Runs hold a lock file
+    in ``directory``, so the endpoint, the periodic job in any worker and a
+    cron run never overlap, and an existing archive is never overwritten.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with file_lock(str(directory / ".archive.lock")):
+        return _archive(older_than, directory, format, now)
+
+def _finish_pending(directory: Path) -> int:
+    """Deletes the rows of archives whose run stopped before deleting them."""
+    deleted = 0
+    for marker in sorted(directory.glob("*" + PENDING_SUFFIX)):
+        path = marker.with_name(marker.name[:-len(PENDING_SUFFIX)])
+        if path.exists():
+            count = delete_archived(path)
+            incident_changed("archived", {"file": path.name, "count": count})
+            deleted += count
+        else:
+            # Stopped before the rename; nothing was deleted
+            path.with_name(path.name + ".tmp").unlink(missing_ok=True)
+        marker.unlink()
+    return deleted
+
+def _archive_path(directory: Path, stem: str, extension: str) -> Path:
+    path, n = directory / f"{stem}.{extension}", 0
+    while path.exists() or path.with_name(path.name + PENDING_SUFFIX).exists():
+        n += 1
+        path = directory / f"{stem}-{n}.{extension}"
+    return path
+
+def _archive(older_than: timedelta, directory: Path, format: str, now: datetime | None) -> dict:
+    resumed = _finish_pending(directory)
+    cutoff = (now or datetime.utcnow()) - older_than
+    with IncidentSessionLocal() as db:
+        max_id = db.scalar(select(func.max(Incident.id)))
+        window = select(Incident.timestamp, Incident.id).where(Incident.timestamp < cutoff)
+        oldest = db.execute(window.order_by(Incident.timestamp, Incident.id).limit(1)).first()
+        newest = db.execute(window.order_by(Incident.timestamp.desc(), Incident.id.desc()).limit(1)).first()
+    if oldest is None:
+        return {"archived": 0, "resumed": resumed, "file": None, "cutoff": cutoff}
+
+    stem = f"incidents-{oldest.timestamp:%Y%m%dT%H%M%S}-{newest.timestamp:%Y%m%dT%H%M%S}-{max_id}"
+    path = _archive_path(directory, stem, EXPORT_FORMATS[format][1])
+    temporary = path.with_name(path.name + ".tmp")
+    exported = [0]
+    chunks = _counted(iter_export_chunks(upto=newest, max_id=max_id), exported)
+    # Under the lock a leftover temporary file can only be from a crashed run;
+    # "x" still refuses to share one with a writer that skipped the lock
+    temporary.unlink(missing_ok=True)
+    f = open(temporary, "xb")
+    try:
+        with f:
+            if format == "parquet":
+                write_parquet(chunks, f)
+            else:
+                for data in gzip_ndjson(chunks):
+                    f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+    marker = path.with_name(path.name + PENDING_SUFFIX)
+    marker.touch()
+    os.replace(temporary, path)
+
+    deleted = delete_archived(path)
+    marker.unlink()
+    incident_changed("archived", {"file": path.name, "count": deleted, "until": newest.timestamp})
+    return {"archived": deleted, "exported": exported[0], "resumed": resumed, "file": str(path), "cutoff": cutoff}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old incidents out of the hot table into an archive file.")
+    parser.add_argument("--older-than-days", type=float, required=True)
+    parser.add_argument("--dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default=ARCHIVE_FORMAT)
+    args = parser.parse_args(argv)
+    result = archive_incidents(timedelta(days=args.older_than_days), args.dir, args.format)
+    print(f"Archived {result['archived']} incidents to {result['file']}" if result["file"] else "Nothing to archive")
+
+if __name__ == "__main__":
+    main()
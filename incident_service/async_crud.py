@@ -0,0 +1,115 @@
+# incident_service/async_crud.py
+# Coroutine twins of the CRUD functions in main.py, used when DB_ASYNC=1.
+# Each one has the same name and arguments as its sync counterpart.
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, select
+from .archive import plan_import
+from .events import incident_changed, incident_payload
+from .database import DB_ASYNC
+from .dedup import report_index
+from .models import Incident
+from .pagination import INCIDENT_COLUMNS, incidents_page_query, split_page
+from .schemas import IncidentCreate, IncidentUpdate
+
+async def run(fn, db, *args, **kwargs):
+    """Calls the sync CRUD function ``fn`` in the threadpool, or its coroutine twin in async mode."""
+    if DB_ASYNC:
+        return await globals()[fn.__name__](db, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def commit(db):
+    if DB_ASYNC:
+        await db.commit()
+    else:
+        await run_in_threadpool(db.commit)
+
+async def rollback(db):
+    if DB_ASYNC:
+        await db.rollback()
+    else:
+        await run_in_threadpool(db.rollback)
+
+async def create_incident(db, incident: IncidentCreate):
+    db_incident = Incident(**incident.dict())
+    db.add(db_incident)
+    await db.commit()
+    await db.refresh(db_incident)
+    incident_changed("created", incident_payload(db_incident))
+    return db_incident
+
+async def report_incident(db, incident: IncidentCreate):
+    if not report_index.enabled:
+        return await create_incident(db, incident)
+    async with report_index.async_locked(incident):
+        now = datetime.utcnow()
+        incident_id = report_index.find(incident, now)
+        db_incident = await db.get(Incident, incident_id) if incident_id is not None else None
+        if db_incident is None:
+            if incident_id is not None:
+                report_index.forget(incident_id)
+            db_incident = await create_incident(db, incident)
+            report_index.remember(db_incident, now)
+            return db_incident
+        db_incident.report_count = Incident.report_count + 1
+        db_incident.last_reported_at = now
+        await db.commit()
+        await db.refresh(db_incident)
+        report_index.remember(db_incident, now, coalesced=True)
+        incident_changed("updated", incident_payload(db_incident))
+        return db_incident
+
+async def create_incidents(db, incidents: list):
+    stmt = insert(Incident).returning(Incident.id, sort_by_parameter_order=True)
+    rows = [incident.dict() for _, incident in incidents]
+    ids = (await db.execute(stmt, rows)).scalars().all()
+    return [{"index": index, "status": "created", "id": incident_id}
+            for (index, _), incident_id in zip(incidents, ids)]
+
+async def import_incidents(db, incidents: list):
+    ids = [incident.id for _, incident in incidents if incident.id is not None]
+    existing = (await db.execute(select(Incident.id).where(Incident.id.in_(ids)))).scalars().all() if ids else []
+    results, with_id, without_id = plan_import(incidents, existing)
+    if with_id:
+        await db.execute(insert(Incident), with_id)
+    if without_id:
+        stmt = insert(Incident).returning(Incident.id, sort_by_parameter_order=True)
+        new_ids = (await db.execute(stmt, [row for _, row in without_id])).scalars().all()
+        results.extend({"index": index, "status": "created", "id": incident_id}
+                       for (index, _), incident_id in zip(without_id, new_ids))
+    return results
+
+async def get_incidents(db, limit: int = 50, **filters):
+    incidents = (await db.execute(incidents_page_query(limit=limit, **filters))).scalars().all()
+    return split_page(incidents, limit)
+
+async def get_incident_rows(db, limit: int = 50, **filters):
+    rows = (await db.execute(incidents_page_query(limit=limit, columns=INCIDENT_COLUMNS, **filters))).all()
+    return split_page(rows, limit)
+
+async def get_incident_by_id(db, incident_id: int):
+    db_incident = await db.get(Incident, incident_id)
+    if db_incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return db_incident
+
+async def update_incident(db, incident_id: int, incident_update: IncidentUpdate):
+    db_incident = await get_incident_by_id(db, incident_id)
+    update_data = incident_update.dict(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(db_incident, key, value)
+    db.add(db_incident)
+    await db.commit()
+    await db.refresh(db_incident)
+    report_index.forget(incident_id)
+    incident_changed("updated", incident_payload(db_incident))
+    return db_incident
+
+async def delete_incident(db, incident_id: int):
+    db_incident = await get_incident_by_id(db, incident_id)
+    await db.delete(db_incident)
+    await db.commit()
+    report_index.forget(incident_id)
+    incident_changed("deleted", {"id": incident_id})
+    return {"message": f"Incident with ID {incident_id} deleted"}
@@ -0,0 +1,5 @@
+# incident_service/caches.py
+from common.read_cache import ReadCache
+
+# Serialized /incidents/ reads; invalidated after every committed incident write
+incident_cache = ReadCache("incidents")
@@ -0,0 +1,25 @@
+# incident_service/database.py
+import os
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from common.database import create_async_sqlite_engine, create_sqlite_engine, sqlite_path, sqlite_url
+
+# Absolute path so the database does not depend on the working directory
+INCIDENT_DB_PATH = sqlite_path("INCIDENT_DB_PATH", "incidents.db")
+INCIDENT_DATABASE_URL = sqlite_url(INCIDENT_DB_PATH)
+incident_engine = create_sqlite_engine(INCIDENT_DB_PATH)
+IncidentBase = declarative_base()
+IncidentSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=incident_engine)
+
+# Optional asyncio mode (needs aiosqlite and greenlet); imported lazily so the
+# default sync mode does not depend on them
+DB_ASYNC = os.environ.get("DB_ASYNC", "0") == "1"
+ASYNC_INCIDENT_DATABASE_URL = sqlite_url(INCIDENT_DB_PATH, driver="aiosqlite")
+async_incident_engine = None
+AsyncIncidentSessionLocal = None
+
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_incident_engine = create_async_sqlite_engine(INCIDENT_DB_PATH)
+    AsyncIncidentSessionLocal = async_sessionmaker(async_incident_engine, autoflush=False, expire_on_commit=False)
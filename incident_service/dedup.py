@@ -0,0 +1,177 @@
+# incident_service/dedup.py
+# Burst coalescing for /report. When many drivers report the same crash,
+# reports of the same type at the same (or, with coordinates, a nearby)
+# location within a sliding window fold into one incident whose
+# report_count goes up. Recent incidents are kept in an in-memory index, so
+# checking a report is a few dict lookups, never a table scan.
+import asyncio
+import math
+import os
+import threading
+from collections import OrderedDict
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from datetime import datetime
+from common.geo import METERS_PER_DEGREE_LAT, bbox_around, haversine_m
+
+# A report joins an incident last reported at most this long ago; 0 turns coalescing off
+DEDUP_WINDOW_SECONDS = float(os.environ.get("INCIDENT_DEDUP_WINDOW_SECONDS", "120"))
+DEDUP_RADIUS_M = float(os.environ.get("INCIDENT_DEDUP_RADIUS_M", "150"))
+LOCK_STRIPES = 64
+
+def normalize_location(location: str) -> str:
+    return " ".join(location.casefold().split())
+
+class _Entry:
+    __slots__ = ("id", "type", "location", "cell", "latitude", "longitude", "last_seen")
+
+class ReportIndex:
+    """Incidents reported within the last ``window`` seconds, by type and place.
+
+    Entries are keyed by ``(type, normalized location)`` and, when the
+    incident has coordinates, by ``(type, grid cell)`` with cells
+    ``radius_m`` tall, so a radius lookup only visits neighbouring cells.
+    Entries sit in last-seen order and expire from the front, so upkeep is
+    amortized O(1) per report.
+
+    Reports are checked and recorded under a lock striped by type and
+    location (``locked`` / ``async_locked``). A report with coordinates can
+    also match by distance, so it first takes a second lock striped by type
+    alone; concurrent reports of the same incident within one worker
+    therefore cannot both create it, whichever way they would match. Each
+    worker has its own index.
+    """
+
+    def __init__(self, window: float = DEDUP_WINDOW_SECONDS, radius_m: float = DEDUP_RADIUS_M):
+        self.window = window
+        self.radius_m = radius_m
+        self.cell_degrees = radius_m / METERS_PER_DEGREE_LAT
+        self.columns = math.ceil(360 / self.cell_degrees)  # longitude cells wrap around at +-180
+        self._entries = OrderedDict()  # incident id -> _Entry, oldest last_seen first
+        self._by_location = {}  # (type, location) -> incident id
+        self._by_cell = {}  # (type, lat cell, lon cell) -> set of incident ids
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._type_stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._async_stripes = self._async_type_stripes = None
+        self.coalesced = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    # --- Locking ---
+    def _stripe(self, report) -> int:
+        return hash((report.type, normalize_location(report.location))) % LOCK_STRIPES
+
+    def _locks(self, report, stripes, type_stripes) -> list:
+        """The locks ``report`` takes, always type stripe first so no two reports deadlock."""
+        locks = [stripes[self._stripe(report)]]
+        if report.latitude is not None and report.longitude is not None:
+            locks.insert(0, type_stripes[hash(report.type) % LOCK_STRIPES])
+        return locks
+
+    @contextmanager
+    def locked(self, report):
+        with ExitStack() as stack:
+            for lock in self._locks(report, self._stripes, self._type_stripes):
+                stack.enter_context(lock)
+            yield
+
+    @asynccontextmanager
+    async def async_locked(self, report):
+        if self._async_stripes is None:
+            self._async_stripes = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+            self._async_type_stripes = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+        async with AsyncExitStack() as stack:
+            for lock in self._locks(report, self._async_stripes, self._async_type_stripes):
+                await stack.enter_async_context(lock)
+            yield
+
+    # --- Lookups ---
+    def _cell(self, latitude: float, longitude: float):
+        return math.floor(latitude / self.cell_degrees), math.floor((longitude + 180) / self.cell_degrees) % self.columns
+
+    def _expire(self, now: datetime):
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if (now - entry.last_seen).total_seconds() <= self.window:
+                return
+            self._remove(entry.id)
+
+    def find(self, report, now: datetime) -> int | None:
+        """Id of the incident ``report`` should be folded into, if any."""
+        with self._lock:
+            self._expire(now)
+            incident_id = self._by_location.get((report.type, normalize_location(report.location)))
+            if incident_id is not None or report.latitude is None or report.longitude is None:
+                return incident_id
+            return self._nearest(report.type, report.latitude, report.longitude)
+
+    def _nearby_cells(self, type: str, latitude: float, longitude: float):
+        """Keys of the populated cells that may hold incidents within ``radius_m`` of the point."""
+        min_lat, min_lon, max_lat, max_lon = bbox_around(latitude, longitude, self.radius_m)
+        first_row, first_col = self._cell(min_lat, min_lon)
+        last_row, last_col = self._cell(max_lat, max_lon)
+        # Cells are as wide as they are tall in degrees, so fewer meters wide
+        # away from the equator; near the poles the circle covers so many
+        # that walking the populated cells is cheaper
+        width = self.columns if (min_lon, max_lon) == (-180.0, 180.0) else (last_col - first_col) % self.columns + 1
+        if width * (last_row - first_row + 1) > len(self._by_cell):
+            return [key for key in self._by_cell if key[0] == type and first_row <= key[1] <= last_row]
+        return [
+            (type, row, (first_col + offset) % self.columns)
+            for row in range(first_row, last_row + 1)
+            for offset in range(width)
+        ]
+
+    def _nearest(self, type: str, latitude: float, longitude: float) -> int | None:
+        best, best_distance = None, self.radius_m
+        for cell in self._nearby_cells(type, latitude, longitude):
+            for incident_id in self._by_cell.get(cell, ()):
+                entry = self._entries[incident_id]
+                distance = haversine_m(latitude, longitude, entry.latitude, entry.longitude)
+                if distance <= best_distance:
+                    best, best_distance = incident_id, distance
+        return best
+
+    # --- Updates ---
+    def remember(self, incident, now: datetime, coalesced: bool = False):
+        """Records a new or just-coalesced incident as last seen at ``now``."""
+        with self._lock:
+            self.coalesced += coalesced
+            self._remove(incident.id)
+            entry = _Entry()
+            entry.id = incident.id
+            entry.type = incident.type
+            entry.location = normalize_location(incident.location)
+            entry.latitude, entry.longitude = incident.latitude, incident.longitude
+            entry.cell = None
+            entry.last_seen = now
+            self._entries[incident.id] = entry
+            self._by_location[(entry.type, entry.location)] = incident.id
+            if entry.latitude is not None and entry.longitude is not None:
+                entry.cell = (entry.type, *self._cell(entry.latitude, entry.longitude))
+                self._by_cell.setdefault(entry.cell, set()).add(incident.id)
+
+    def forget(self, incident_id: int):
+        """Drops an incident that was edited or deleted."""
+        with self._lock:
+            self._remove(incident_id)
+
+    def _remove(self, incident_id: int):
+        entry = self._entries.pop(incident_id, None)
+        if entry is None:
+            return
+        if self._by_location.get((entry.type, entry.location)) == incident_id:
+            del self._by_location[(entry.type, entry.location)]
+        if entry.cell is not None:
+            ids = self._by_cell[entry.cell]
+            ids.discard(incident_id)
+            if not ids:
+                del self._by_cell[entry.cell]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "window_seconds": self.window, "coalesced": self.coalesced}
+
+report_index = ReportIndex()
@@ -0,0 +1,22 @@
+# incident_service/events.py
+from common.events import EventBroker
+from .caches import incident_cache
+
+incident_events = EventBroker("incidents")
+
+def incident_changed(event_type: str, data: dict):
+    """Called after an incident write commits: drops cached reads and notifies subscribers."""
+    incident_cache.invalidate()
+    incident_events.publish(event_type, data)
+
+def incident_payload(db_incident) -> dict:
+    return {
+        "id": db_incident.id,
+        "type": db_incident.type,
+        "location": db_incident.location,
+        "timestamp": db_incident.timestamp,
+        "latitude": db_incident.latitude,
+        "longitude": db_incident.longitude,
+        "report_count": db_incident.report_count,
+        "last_reported_at": db_incident.last_reported_at,
+    }
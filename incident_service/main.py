@@ -1,53 +1,103 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel
-from datetime import datetime
-from typing import List, Optional
-
-app = FastAPI()
-
-# Database Setup for incidents
-INCIDENT_DATABASE_URL = "sqlite:///./incidents.db"
-incident_engine = create_engine(INCIDENT_DATABASE_URL)
-IncidentBase = declarative_base()
-IncidentSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=incident_engine)
-
-# Define the Incident model
-class Incident(IncidentBase):
-    __tablename__ = "incidents"
-
-    id = Column(Integer, primary_key=True, index=True)
-    type = Column(String)
-    location = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
-
-IncidentBase.metadata.create_all(bind=incident_engine)
-
-# Pydantic models
-class IncidentBaseModel(BaseModel):
-    type: str
-    location: str
-
-class IncidentCreate(IncidentBaseModel):
-    pass
-
-class IncidentUpdate(BaseModel):
-    type: Optional[str] = None
-    location: Optional[str] = None
-
-class IncidentResponse(IncidentBaseModel):
-    id: int
-    timestamp: datetime
-
-# Dependency to get the incident database session
-def get_incident_db():
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, WebSocket
+from pydantic import TypeAdapter
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Optional
+from common import geo, metrics, serialization, shared_state
+from common.database import init_schema
+from common.bulk import iter_ndjson_records, iter_validated_batches, summarize, validate_batches
+from common.events import sse_response, websocket_stream
+from common.read_cache import cached_json_response
+from . import archive, async_crud
+from .caches import incident_cache
+from .dedup import report_index
+from .events import incident_changed, incident_events, incident_payload
+from .database import (
+    INCIDENT_DATABASE_URL, INCIDENT_DB_PATH, IncidentBase, IncidentSessionLocal, AsyncIncidentSessionLocal, async_incident_engine,
+    incident_engine,
+)
+from .models import Incident
+from .pagination import (
+    INCIDENT_COLUMNS, INCIDENT_FIELDS, decode_cursor, encode_cursor, incidents_page_query, split_page,
+)
+from .schemas import (
+    BulkItemResult, BulkResult, IncidentBaseModel, IncidentCreate, IncidentImport, IncidentPage, IncidentResponse,
+    IncidentUpdate, NearbyIncident,
+)
+
+logger = logging.getLogger(__name__)
+
+def create_schema():
+    IncidentBase.metadata.create_all(bind=incident_engine)
+    geo.add_missing_columns(incident_engine, Incident.__table__)
+    # create_all skips indexes on tables that already exist, so add any new ones
+    for index in Incident.__table__.indexes:
+        index.create(bind=incident_engine, checkfirst=True)
+    geo.create_spatial_index(incident_engine, Incident.__tablename__)
+
+async def archive_periodically():
+    # With several workers only the one holding the leader lock archives
+    leader = shared_state.LeaderLock("archive_incidents")
+    while True:
+        await asyncio.sleep(archive.ARCHIVE_INTERVAL_SECONDS)
+        if leader.acquire():
+            try:
+                await run_in_threadpool(archive.archive_incidents, timedelta(days=archive.ARCHIVE_AFTER_DAYS))
+            except Exception:
+                # Keep the job alive; the next tick retries
+                logger.exception("Archiving incidents failed")
+
+def warm_report_index():
+    """Loads incidents reported within the dedup window, so a restart doesn't split a burst."""
+    now = datetime.utcnow()
+    since = now - timedelta(seconds=report_index.window)
+    last_seen = func.coalesce(Incident.last_reported_at, Incident.timestamp)
+    stmt = (
+        select(Incident.id, Incident.type, Incident.location, Incident.latitude, Incident.longitude, last_seen)
+        .where(or_(Incident.timestamp >= since, Incident.last_reported_at >= since))
+        .order_by(last_seen)
+    )
+    with IncidentSessionLocal() as db:
+        for row in db.execute(stmt):
+            report_index.remember(row, row[-1])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(init_schema, INCIDENT_DB_PATH, create_schema)
+    if report_index.enabled:
+        await run_in_threadpool(warm_report_index)
+    archiver = asyncio.create_task(archive_periodically()) if archive.ARCHIVE_AFTER_DAYS > 0 else None
+    yield
+    if archiver is not None:
+        archiver.cancel()
+
+app = FastAPI(lifespan=lifespan)
+metrics.install(app, incident_engine, async_incident_engine, gauges={
+    "read_cache": ("cache", lambda: {"incidents": incident_cache.stats()}),
+    "event_broker": ("channel", lambda: {"incidents": incident_events.stats()}),
+    "incident_dedup": ("index", lambda: {"reports": report_index.stats()}),
+    "db_pool": ("engine", lambda: metrics.pool_stats(sync=incident_engine, asyncio=async_incident_engine)),
+})
+
+# Dependency to get the incident database session (an AsyncSession when DB_ASYNC=1)
+async def get_incident_db():
+    if AsyncIncidentSessionLocal is not None:
+        async with AsyncIncidentSessionLocal() as db:
+            yield db
+        return
     db = IncidentSessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
 
 # CRUD Operations for Incidents
 def create_incident(db: Session, incident: IncidentCreate):
@@ -55,10 +105,80 @@ def create_incident(db: Session, incident: IncidentCreate):
     db.add(db_incident)
     db.commit()
     db.refresh(db_incident)
+    incident_changed("created", incident_payload(db_incident))
     return db_incident
 
-def get_incidents(db: Session):
-    return db.query(Incident).all()
+def report_incident(db: Session, incident: IncidentCreate):
+    """Creates an incident, or folds the report into a matching one from the dedup window.
+
+    A match gets ``report_count + 1`` and a new ``last_reported_at``; the
+    increment happens in SQL so concurrent workers never lose a report.
+    """
+    if not report_index.enabled:
+        return create_incident(db, incident)
+    with report_index.locked(incident):
+        now = datetime.utcnow()
+        incident_id = report_index.find(incident, now)
+        db_incident = db.get(Incident, incident_id) if incident_id is not None else None
+        if db_incident is None:
+            if incident_id is not None:
+                report_index.forget(incident_id)  # deleted meanwhile, e.g. by another worker
+            db_incident = create_incident(db, incident)
+            report_index.remember(db_incident, now)
+            return db_incident
+        db_incident.report_count = Incident.report_count + 1
+        db_incident.last_reported_at = now
+        db.commit()
+        db.refresh(db_incident)
+        report_index.remember(db_incident, now, coalesced=True)
+        incident_changed("updated", incident_payload(db_incident))
+        return db_incident
+
+def create_incidents(db: Session, incidents: list):
+    """Inserts a batch of ``(index, IncidentCreate)`` pairs with one executemany INSERT.
+
+    Committing is left to the caller so a whole upload lands in one transaction.
+    """
+    stmt = insert(Incident).returning(Incident.id, sort_by_parameter_order=True)
+    rows = [incident.dict() for _, incident in incidents]
+    ids = db.execute(stmt, rows).scalars().all()
+    return [{"index": index, "status": "created", "id": incident_id}
+            for (index, _), incident_id in zip(incidents, ids)]
+
+def import_incidents(db: Session, incidents: list):
+    """Inserts a batch of ``(index, IncidentImport)`` pairs, keeping their ids and timestamps.
+
+    Ids that already exist are skipped, so re-importing an export is harmless.
+    """
+    ids = [incident.id for _, incident in incidents if incident.id is not None]
+    existing = db.execute(select(Incident.id).where(Incident.id.in_(ids))).scalars().all() if ids else []
+    results, with_id, without_id = archive.plan_import(incidents, existing)
+    if with_id:
+        db.execute(insert(Incident), with_id)
+    if without_id:
+        stmt = insert(Incident).returning(Incident.id, sort_by_parameter_order=True)
+        new_ids = db.execute(stmt, [row for _, row in without_id]).scalars().all()
+        results.extend({"index": index, "status": "created", "id": incident_id}
+                       for (index, _), incident_id in zip(without_id, new_ids))
+    return results
+
+def get_incidents(db: Session, limit: int = 50, cursor: Optional[str] = None,
+                  type: Optional[str] = None, location: Optional[str] = None,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Returns one page of incidents, newest first, and the cursor of the next page."""
+    stmt = incidents_page_query(limit=limit, cursor=cursor, type=type, location=location, since=since, until=until)
+    return split_page(db.execute(stmt).scalars().all(), limit)
+
+def get_incident_rows(db: Session, limit: int = 50, **filters):
+    """Like get_incidents, but as column tuples for the fast serialization path."""
+    rows = db.execute(incidents_page_query(limit=limit, columns=INCIDENT_COLUMNS, **filters)).all()
+    return split_page(rows, limit)
+
+def stream_incident_rows(limit: int, **filters):
+    """Chunks of matching rows from a session that lives as long as the response body."""
+    stmt = incidents_page_query(limit=limit, columns=INCIDENT_COLUMNS, **filters).limit(limit)
+    with IncidentSessionLocal() as db:
+        yield from serialization.iter_chunks(db.execute(stmt))
 
 def get_incident_by_id(db: Session, incident_id: int):
     db_incident = db.query(Incident).filter(Incident.id == incident_id).first()
@@ -74,31 +194,215 @@ def update_incident(db: Session, incident_id: int, incident_update: IncidentUpda
     db.add(db_incident)
     db.commit()
     db.refresh(db_incident)
+    report_index.forget(incident_id)  # an edited incident stops absorbing reports
+    incident_changed("updated", incident_payload(db_incident))
     return db_incident
 
 def delete_incident(db: Session, incident_id: int):
     db_incident = get_incident_by_id(db, incident_id)
     db.delete(db_incident)
     db.commit()
+    report_index.forget(incident_id)
+    incident_changed("deleted", {"id": incident_id})
     return {"message": f"Incident with ID {incident_id} deleted"}
 
+# Geo queries go through the incidents_rtree R*Tree
+INCIDENT_GEO_COLUMNS = "t.id, t.type, t.location, t.timestamp, t.latitude, t.longitude, t.report_count, t.last_reported_at"
+
+def incidents_near(db: Session, lat: float, lon: float, radius_m: float, limit: int):
+    return geo.within_radius(db.connection(), Incident.__tablename__, INCIDENT_GEO_COLUMNS, lat, lon, radius_m, limit)
+
+def incidents_in_bbox(db: Session, bbox: tuple, limit: int):
+    return geo.bbox_rows(db.connection(), Incident.__tablename__, INCIDENT_GEO_COLUMNS, bbox, limit)
+
+def incidents_nearest(db: Session, lat: float, lon: float, k: int):
+    return geo.nearest(db.connection(), Incident.__tablename__, INCIDENT_GEO_COLUMNS, lat, lon, k)
+
+def read_with_session(fn, *args):
+    # Always a short-lived sync session so the spatial lookups work in both DB modes
+    with IncidentSessionLocal() as db:
+        return fn(db, *args)
+
 # API Endpoints
+# Handlers are coroutines; async_crud.run sends each CRUD call to the
+# threadpool (sync mode) or to its coroutine twin (DB_ASYNC=1).
 @app.post("/report", response_model=IncidentResponse)
-def report_incident_api(incident: IncidentCreate, db: Session = Depends(get_incident_db)):
-    return create_incident(db=db, incident=incident)
+async def report_incident_api(incident: IncidentCreate, db: Session = Depends(get_incident_db)):
+    return await async_crud.run(report_incident, db, incident=incident)
+
+@app.post("/incidents/bulk", response_model=BulkResult)
+async def bulk_report_incidents_api(request: Request, db: Session = Depends(get_incident_db)):
+    """Inserts incidents from a JSON array or an NDJSON stream in one transaction."""
+    items = []
+    try:
+        async for incidents, errors in iter_validated_batches(request, IncidentCreate):
+            items.extend(errors)
+            if incidents:
+                items.extend(await async_crud.run(create_incidents, db, incidents))
+        await async_crud.commit(db)
+    except Exception:
+        await async_crud.rollback(db)
+        raise
+    incident_changed("bulk", {"ids": [item["id"] for item in items if item["status"] != "error"]})
+    return summarize(items)
+
+incident_adapter = TypeAdapter(IncidentResponse)
+
+# Incident reads are served from incident_cache with ETags; an unchanged
+# If-None-Match gets a 304 without touching the database.
+# ?format=ndjson|csv or ?stream=true instead streams up to INCIDENT_STREAM_MAX_ROWS
+# matching incidents as bare rows (no page envelope, no next_cursor), uncached.
+INCIDENT_PAGE_MAX_LIMIT = 500
+INCIDENT_STREAM_MAX_ROWS = int(os.environ.get("INCIDENT_STREAM_MAX_ROWS", "1000000"))
+
+@app.get("/incidents/", response_model=IncidentPage)
+async def read_incidents_api(
+    request: Request,
+    limit: int = Query(50, ge=1),
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: Optional[str] = None,
+    stream: bool = False,
+    db: Session = Depends(get_incident_db),
+):
+    fmt = serialization.response_format(request, format)
+    filters = dict(cursor=cursor, type=type, location=location, since=since, until=until)
+    if stream or fmt != "json":
+        if limit > INCIDENT_STREAM_MAX_ROWS:
+            raise HTTPException(status_code=422, detail=f"limit must be at most {INCIDENT_STREAM_MAX_ROWS} when streaming")
+        return serialization.stream_rows(fmt, INCIDENT_FIELDS, stream_incident_rows(limit, **filters))
+    if limit > INCIDENT_PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=422, detail=f"limit must be at most {INCIDENT_PAGE_MAX_LIMIT}")
+    async def load():
+        rows, next_cursor = await async_crud.run(get_incident_rows, db, limit=limit, **filters)
+        with metrics.timed("serialize"):
+            return serialization.dumps({"items": serialization.records(INCIDENT_FIELDS, rows), "next_cursor": next_cursor})
+    return await cached_json_response(request, incident_cache, load)
+
+# Live change feed; declared before /incidents/{incident_id} so the paths don't collide
+@app.get("/incidents/stream")
+async def stream_incident_events(request: Request):
+    """Server-Sent Events of incident creates, updates and deletes as they commit."""
+    return sse_response(incident_events, request)
+
+@app.websocket("/incidents/ws")
+async def incident_events_websocket(websocket: WebSocket, last_event_id: Optional[int] = None):
+    await websocket.accept()
+    await websocket_stream(incident_events, websocket, last_event_id)
+
+# --- Export, import and archival ---
+@app.get("/incidents/export")
+async def export_incidents_api(since: Optional[datetime] = None, until: Optional[datetime] = None, format: str = "ndjson"):
+    """Streams incidents in ``[since, until)``, oldest first, as gzip NDJSON or Parquet."""
+    if format not in archive.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(archive.EXPORT_FORMATS)}")
+    if format == "parquet" and not archive.PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed")
+    media_type, extension = archive.EXPORT_FORMATS[format]
+    body = archive.export_bytes(format, archive.iter_export_chunks(since=since, until=until))
+    headers = {"Content-Disposition": f'attachment; filename="incidents.{extension}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+@app.post("/incidents/import", response_model=BulkResult)
+async def import_incidents_api(request: Request, db: Session = Depends(get_incident_db)):
+    """Loads an export back in: NDJSON (optionally gzipped) or a Parquet file.
+
+    Records are validated and inserted a batch at a time and each batch is
+    committed on its own, so memory stays bounded however large the file.
+    Only failed records are listed in ``items``.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    spool = None
+    created = skipped = 0
+    errors = []
+    try:
+        if content_type in archive.PARQUET_CONTENT_TYPES:
+            if not archive.PARQUET_AVAILABLE:
+                raise HTTPException(status_code=501, detail="Parquet import needs pyarrow installed")
+            # The Parquet footer comes last, so the file has to be on disk before reading
+            spool = tempfile.TemporaryFile()
+            async for chunk in request.stream():
+                await run_in_threadpool(spool.write, chunk)
+            spool.seek(0)
+            records = iterate_in_threadpool(archive.iter_parquet_records(spool))
+        else:
+            records = iter_ndjson_records(request)
+        async for incidents, batch_errors in validate_batches(records, IncidentImport):
+            errors.extend(batch_errors)
+            if incidents:
+                results = await async_crud.run(import_incidents, db, incidents)
+                await async_crud.commit(db)
+                created += sum(item["status"] == "created" for item in results)
+                skipped += sum(item["status"] == "skipped" for item in results)
+    except ValueError as exc:
+        await async_crud.rollback(db)
+        raise HTTPException(status_code=400, detail=str(exc))
+    finally:
+        if spool is not None:
+            spool.close()
+        # Batches already committed stay in, even when a later one fails
+        if created:
+            incident_changed("imported", {"count": created})
+    return {"created": created, "updated": 0, "skipped": skipped, "failed": len(errors), "items": errors}
+
+@app.post("/incidents/archive")
+async def archive_incidents_api(older_than_days: float = Query(gt=0), format: str = archive.ARCHIVE_FORMAT):
+    """Runs the archival job now: exports incidents older than the cutoff to a file, then deletes them."""
+    try:
+        return await run_in_threadpool(archive.archive_incidents, timedelta(days=older_than_days), format=format)
+    except archive.ParquetUnavailable as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except FileExistsError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+@app.get("/incidents/near", response_model=list[NearbyIncident])
+async def read_incidents_near_api(
+    lat: float = Query(ge=-90, le=90),
+    lon: float = Query(ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=geo.MAX_RADIUS_M),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Incidents within ``radius_m`` meters of a point, nearest first."""
+    return await run_in_threadpool(read_with_session, incidents_near, lat, lon, radius_m, limit)
+
+@app.get("/incidents/bbox", response_model=list[NearbyIncident])
+async def read_incidents_in_bbox_api(
+    min_lat: float = Query(ge=-90, le=90),
+    min_lon: float = Query(ge=-180, le=180),
+    max_lat: float = Query(ge=-90, le=90),
+    max_lon: float = Query(ge=-180, le=180),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    # min_lon > max_lon is a box crossing the antimeridian
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+    return await run_in_threadpool(read_with_session, incidents_in_bbox, (min_lat, min_lon, max_lat, max_lon), limit)
 
-@app.get("/incidents/", response_model=List[IncidentResponse])
-def read_incidents_api(db: Session = Depends(get_incident_db)):
-    return get_incidents(db=db)
+@app.get("/incidents/nearest", response_model=list[NearbyIncident])
+async def read_incidents_nearest_api(
+    lat: float = Query(ge=-90, le=90),
+    lon: float = Query(ge=-180, le=180),
+    k: int = Query(10, ge=1, le=1000),
+):
+    return await run_in_threadpool(read_with_session, incidents_nearest, lat, lon, k)
 
 @app.get("/incidents/{incident_id}", response_model=IncidentResponse)
-def read_incident_api(incident_id: int, db: Session = Depends(get_incident_db)):
-    return get_incident_by_id(db=db, incident_id=incident_id)
+async def read_incident_api(request: Request, incident_id: int, db: Session = Depends(get_incident_db)):
+    async def load():
+        db_incident = await async_crud.run(get_incident_by_id, db, incident_id=incident_id)
+        with metrics.timed("serialize"):
+            return incident_adapter.dump_json(incident_adapter.validate_python(db_incident, from_attributes=True))
+    return await cached_json_response(request, incident_cache, load)
 
 @app.put("/incidents/{incident_id}", response_model=IncidentResponse)
-def update_incident_api(incident_id: int, incident_update: IncidentUpdate, db: Session = Depends(get_incident_db)):
-    return update_incident(db=db, incident_id=incident_id, incident_update=incident_update)
+async def update_incident_api(incident_id: int, incident_update: IncidentUpdate, db: Session = Depends(get_incident_db)):
+    return await async_crud.run(update_incident, db, incident_id=incident_id, incident_update=incident_update)
 
 @app.delete("/incidents/{incident_id}")
-def delete_incident_api(incident_id: int, db: Session = Depends(get_incident_db)):
-    return delete_incident(db=db, incident_id=incident_id)
\ No newline at end of file
+async def delete_incident_api(incident_id: int, db: Session = Depends(get_incident_db)):
+    return await async_crud.run(delete_incident, db, incident_id=incident_id)
@@ -0,0 +1,29 @@
+# incident_service/models.py
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String
+from .database import IncidentBase
+
+# Define the Incident model
+class Incident(IncidentBase):
+    __tablename__ = "incidents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String)
+    location = Column(String)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Optional coordinates, indexed by the incidents_rtree R*Tree (see common/geo.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    # /report folds repeat reports of the same incident into this row (see dedup.py)
+    report_count = Column(Integer, nullable=False, default=1, server_default="1")
+    last_reported_at = Column(DateTime, nullable=True)
+
+    # Listing is newest-first with keyset pagination on (timestamp, id); the
+    # filtered variants lead with the equality column so each filter is an
+    # index range scan instead of a table scan.
+    __table_args__ = (
+        Index("ix_incidents_timestamp_id", "timestamp", "id"),
+        Index("ix_incidents_type_timestamp_id", "type", "timestamp", "id"),
+        Index("ix_incidents_location_timestamp_id", "location", "timestamp", "id"),
+        Index("ix_incidents_last_reported_at", "last_reported_at"),
+    )
@@ -0,0 +1,50 @@
+# incident_service/pagination.py
+import base64
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_
+from .models import Incident
+
+def encode_cursor(incident: Incident) -> str:
+    raw = f"{incident.timestamp.isoformat()}|{incident.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, incident_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(incident_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def incidents_page_query(limit: int = 50, cursor: Optional[str] = None,
+                         type: Optional[str] = None, location: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None, columns=None):
+    """Builds the newest-first page query; it selects ``limit + 1`` rows so callers can tell whether another page exists.
+
+    ``columns`` selects plain column tuples instead of ``Incident`` objects.
+    """
+    stmt = select(*columns) if columns is not None else select(Incident)
+    if type is not None:
+        stmt = stmt.where(Incident.type == type)
+    if location is not None:
+        stmt = stmt.where(Incident.location == location)
+    if since is not None:
+        stmt = stmt.where(Incident.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(Incident.timestamp < until)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(Incident.timestamp, Incident.id) < decode_cursor(cursor))
+    return stmt.order_by(Incident.timestamp.desc(), Incident.id.desc()).limit(limit + 1)
+
+# Fast list path: the response fields as plain tuples, in IncidentResponse order
+INCIDENT_FIELDS = ("type", "location", "latitude", "longitude", "id", "timestamp", "report_count", "last_reported_at")
+INCIDENT_COLUMNS = [getattr(Incident, field) for field in INCIDENT_FIELDS]
+
+def split_page(incidents: list, limit: int):
+    next_cursor = None
+    if len(incidents) > limit:
+        incidents = incidents[:limit]
+        next_cursor = encode_cursor(incidents[-1])
+    return incidents, next_cursor
@@ -0,0 +1,53 @@
+# incident_service/schemas.py
+from datetime import datetime
+from typing import Any, List, Optional
+from pydantic import BaseModel, Field
+
+class IncidentBaseModel(BaseModel):
+    type: str
+    location: str
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class IncidentCreate(IncidentBaseModel):
+    pass
+
+class IncidentImport(IncidentBaseModel):
+    # Exported rows keep their identity and time; both are assigned when missing
+    id: Optional[int] = None
+    timestamp: Optional[datetime] = None
+    report_count: Optional[int] = Field(None, ge=1)
+    last_reported_at: Optional[datetime] = None
+
+class IncidentUpdate(BaseModel):
+    type: Optional[str] = None
+    location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class IncidentResponse(IncidentBaseModel):
+    id: int
+    timestamp: datetime
+    # How many /report submissions were coalesced into this incident, and when the latest arrived
+    report_count: int = 1
+    last_reported_at: Optional[datetime] = None
+
+class NearbyIncident(IncidentResponse):
+    distance_m: Optional[float] = None  # set by radius and nearest queries
+
+class IncidentPage(BaseModel):
+    items: List[IncidentResponse]
+    next_cursor: Optional[str] = None
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: str  # "created", "skipped" (import of an id that already exists) or "error"
+    id: Optional[int] = None
+    detail: Optional[Any] = None
+
+class BulkResult(BaseModel):
+    created: int
+    updated: int
+    skipped: int = 0
+    failed: int
+    items: List[BulkItemResult]
@@ -0,0 +1,6 @@
+# traffic_service/__main__.py
+# python -m traffic_service [--workers N] [--port 8001]
+from common.serve import serve
+
+if __name__ == "__main__":
+    serve("traffic_service.main:app", 8001)
@@ -0,0 +1,261 @@
+# traffic_service/analytics.py
+# Online congestion statistics over the zone count stream. Every reading
+# committed through readings.record_readings updates, per zone, a time-decayed
+# EWMA level with its variance and trend, plus a time-of-day baseline in
+# 15-minute slots. State lives in NumPy arrays indexed by zone id (shared by
+# all workers under SHARED_STATE_DIR), each batch of readings is applied
+# with a few vectorized operations, and forecasts are computed for every
+# zone at once. A reading far above the recent level or the usual level for
+# that time of day flags the zone as anomalous; with ANALYTICS_INCIDENT_URL
+# set, new anomalies are reported to incident_service's /report.
+import math
+import os
+import time
+from functools import cached_property
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from common import shared_state
+from common.lazy import lazy_import
+from .models import TrafficZone
+
+np = lazy_import("numpy")
+
+ANALYTICS_ENABLED = os.environ.get("ANALYTICS_ENABLED", "1") == "1"
+ANALYTICS_MAX_ZONES = int(os.environ.get("ANALYTICS_MAX_ZONES", "65536"))  # zone ids at or above this are not tracked
+ANALYTICS_HALF_LIFE_SECONDS = float(os.environ.get("ANALYTICS_HALF_LIFE_SECONDS", "300"))
+ANALYTICS_SEASONAL_ALPHA = float(os.environ.get("ANALYTICS_SEASONAL_ALPHA", "0.05"))
+ANALYTICS_Z_THRESHOLD = float(os.environ.get("ANALYTICS_Z_THRESHOLD", "3"))
+ANALYTICS_MIN_SAMPLES = int(os.environ.get("ANALYTICS_MIN_SAMPLES", "10"))
+ANALYTICS_MIN_STD = float(os.environ.get("ANALYTICS_MIN_STD", "2"))  # vehicles; keeps flat series from flagging tiny changes
+ANALYTICS_WARM_DAYS = float(os.environ.get("ANALYTICS_WARM_DAYS", "14"))
+ANALYTICS_INCIDENT_URL = os.environ.get("ANALYTICS_INCIDENT_URL") or None
+ANALYTICS_INCIDENT_TYPE = os.environ.get("ANALYTICS_INCIDENT_TYPE", "congestion")
+ANALYTICS_REPORT_INTERVAL_SECONDS = float(os.environ.get("ANALYTICS_REPORT_INTERVAL_SECONDS", "30"))
+
+DAY = 86400
+SLOT_SECONDS = 900  # matches the 15m rollups the baseline is warmed from
+SLOTS = DAY // SLOT_SECONDS
+
+# Per-zone state columns
+LAST_TS, COUNT, LEVEL, VAR, TREND, SAMPLES, SCORE, ANOMALY_SINCE, REPORTED_SINCE = range(9)
+STATE_FIELDS = 9
+# Per-(zone, slot) baseline columns
+S_SAMPLES, S_MEAN, S_VAR = range(3)
+
+WARM_BASELINE = text(
+    "SELECT r.zone_id, (r.bucket % 86400) / 900 AS slot, count(*), "
+    "avg(r.total * 1.0 / r.samples), avg((r.total * 1.0 / r.samples) * (r.total * 1.0 / r.samples)) "
+    "FROM traffic_zones AS z JOIN zone_rollups AS r ON r.zone_id = z.id AND r.resolution = 900 AND r.bucket >= :since "
+    "GROUP BY r.zone_id, slot"
+)
+
+def _slot(t):
+    return (np.asarray(t) % DAY // SLOT_SECONDS).astype(np.int64)
+
+def _occurrence_rank(zones: "np.ndarray") -> "np.ndarray":
+    """For each element, how many earlier elements have the same zone id."""
+    order = np.argsort(zones, kind="stable")
+    sorted_zones = zones[order]
+    starts = np.flatnonzero(np.r_[True, sorted_zones[1:] != sorted_zones[:-1]])
+    lengths = np.diff(np.r_[starts, len(zones)])
+    rank = np.empty(len(zones), dtype=np.int64)
+    rank[order] = np.arange(len(zones)) - np.repeat(starts, lengths)
+    return rank
+
+class ZoneAnalytics:
+    def __init__(self, capacity: int = ANALYTICS_MAX_ZONES, half_life: float = ANALYTICS_HALF_LIFE_SECONDS,
+                 enabled: bool = ANALYTICS_ENABLED):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.tau = half_life / math.log(2)
+        self._warmed = shared_state.counter("zone_analytics_warmed")
+
+    # Mapped on first use rather than at import, which would load NumPy
+    @cached_property
+    def _arrays(self):
+        state, lock = shared_state.array("zone_analytics", (self.capacity, STATE_FIELDS))
+        season, _ = shared_state.array("zone_baseline", (self.capacity, SLOTS, 3))
+        return state, season, lock
+
+    @property
+    def state(self):
+        return self._arrays[0]
+
+    @property
+    def season(self):
+        return self._arrays[1]
+
+    @property
+    def _lock(self):
+        return self._arrays[2]
+
+    # --- Updates ---
+    def observe(self, readings: list):
+        """Folds ``(zone_id, ts_ms, count)`` readings into the per-zone statistics."""
+        if not self.enabled:
+            return
+        readings = [reading for reading in readings if reading[2] is not None and 0 <= reading[0] < self.capacity]
+        if not readings:
+            return
+        data = np.array(readings, dtype=np.float64)
+        zones = data[:, 0].astype(np.int64)
+        if len(readings) == 1:
+            with self._lock():
+                self._update(zones, data[:, 1] / 1000, data[:, 2])
+            return
+        # A zone's readings have to be applied in time order, so a batch is
+        # applied in rounds holding at most one reading per zone
+        order = np.argsort(data[:, 1], kind="stable")
+        data, zones = data[order], zones[order]
+        rank = _occurrence_rank(zones)
+        with self._lock():
+            for round_ in range(int(rank.max()) + 1):
+                selected = rank == round_
+                self._update(zones[selected], data[selected, 1] / 1000, data[selected, 2])
+
+    def _update(self, zones: "np.ndarray", t: "np.ndarray", counts: "np.ndarray"):
+        state = self.state[zones]
+        first = state[:, SAMPLES] == 0
+        dt = np.maximum(t - state[:, LAST_TS], 0.0)
+        # Time-decayed smoothing, so irregular readings weigh by the time they cover
+        alpha = np.where(first, 1.0, -np.expm1(-dt / self.tau))
+        level, var, trend = state[:, LEVEL], state[:, VAR], state[:, TREND]
+        diff = counts - level
+        warm = state[:, SAMPLES] >= ANALYTICS_MIN_SAMPLES
+        z_recent = np.where(warm, diff / np.maximum(np.sqrt(var), ANALYTICS_MIN_STD), 0.0)
+        new_level = level + alpha * diff
+        slope = np.divide(new_level - level, dt, out=np.zeros_like(dt), where=dt > 0)
+        state[:, VAR] = np.where(first, 0.0, (1 - alpha) * (var + alpha * diff * diff))
+        state[:, TREND] = np.where(first, 0.0, trend + alpha * (slope - trend))
+        state[:, LEVEL] = new_level
+
+        # Time-of-day baseline: a running mean until it has 1/alpha samples, then an EWMA
+        slots = _slot(t)
+        baseline = self.season[zones, slots]
+        samples, mean, svar = baseline[:, S_SAMPLES], baseline[:, S_MEAN], baseline[:, S_VAR]
+        z_season = np.where(samples >= ANALYTICS_MIN_SAMPLES, (counts - mean) / np.maximum(np.sqrt(svar), ANALYTICS_MIN_STD), 0.0)
+        season_alpha = np.maximum(1.0 / (samples + 1), ANALYTICS_SEASONAL_ALPHA)
+        season_diff = counts - mean
+        baseline[:, S_MEAN] = mean + season_alpha * season_diff
+        baseline[:, S_VAR] = (1 - season_alpha) * (svar + season_alpha * season_diff * season_diff)
+        baseline[:, S_SAMPLES] = samples + 1
+        self.season[zones, slots] = baseline
+
+        score = np.maximum(z_recent, z_season)
+        anomalous = score >= ANALYTICS_Z_THRESHOLD
+        state[:, ANOMALY_SINCE] = np.where(anomalous, np.where(state[:, ANOMALY_SINCE] > 0, state[:, ANOMALY_SINCE], t), 0.0)
+        state[:, SCORE] = score
+        state[:, COUNT] = counts
+        state[:, LAST_TS] = t
+        state[:, SAMPLES] += 1
+        self.state[zones] = state
+
+    def forget(self, zone_id: int):
+        if 0 <= zone_id < self.capacity:
+            with self._lock():
+                self.state[zone_id] = 0
+                self.season[zone_id] = 0
+
+    def warm(self, db: Session, days: float = ANALYTICS_WARM_DAYS, now: float | None = None):
+        """Seeds the time-of-day baseline from the last ``days`` of 15m rollups, once per deployment."""
+        if not self.enabled or days <= 0 or self._warmed.value:
+            return
+        now = time.time() if now is None else now
+        rows = np.array(db.execute(WARM_BASELINE, {"since": int(now - days * DAY)}).all(), dtype=np.float64).reshape(-1, 5)
+        rows = rows[rows[:, 0] < self.capacity]
+        zones, slots = rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64)
+        with self._lock():
+            if self._warmed.value:
+                return
+            self.season[zones, slots, S_SAMPLES] = rows[:, 2]
+            self.season[zones, slots, S_MEAN] = rows[:, 3]
+            self.season[zones, slots, S_VAR] = np.maximum(rows[:, 4] - rows[:, 3] ** 2, 0.0)
+            self._warmed.increment()
+
+    # --- Reads ---
+    def summaries(self, horizon: float, zone_id: int | None = None, anomalous_only: bool = False,
+                  now: float | None = None) -> list:
+        """Current statistics and a ``horizon``-second forecast for every tracked zone (or one)."""
+        now = time.time() if now is None else now
+        with self._lock():
+            if zone_id is not None:
+                zones = np.array([zone_id] if 0 <= zone_id < self.capacity else [], dtype=np.int64)
+            else:
+                zones = np.flatnonzero(self.state[:, SAMPLES] > 0)
+            state = self.state[zones]
+            zones, state = zones[state[:, SAMPLES] > 0], state[state[:, SAMPLES] > 0]
+            if anomalous_only:
+                zones, state = zones[state[:, ANOMALY_SINCE] > 0], state[state[:, ANOMALY_SINCE] > 0]
+            last_base = self.season[zones, _slot(state[:, LAST_TS])]
+            now_base = self.season[zones, _slot(now)]
+            future_base = self.season[zones, _slot(now + horizon)]
+        # Level plus trend over the horizon, shifted by how the baseline moves
+        # from the last reading's slot to the target slot when both are known
+        forecast = state[:, LEVEL] + state[:, TREND] * horizon
+        known = (last_base[:, S_SAMPLES] >= ANALYTICS_MIN_SAMPLES) & (future_base[:, S_SAMPLES] >= ANALYTICS_MIN_SAMPLES)
+        forecast = np.maximum(forecast + np.where(known, future_base[:, S_MEAN] - last_base[:, S_MEAN], 0.0), 0.0)
+        baseline = np.where(now_base[:, S_SAMPLES] > 0, now_base[:, S_MEAN], np.nan)
+        return [
+            {
+                "zone_id": int(zones[i]),
+                "samples": int(state[i, SAMPLES]),
+                "last_reading_at": float(state[i, LAST_TS]),
+                "vehicle_count": int(state[i, COUNT]),
+                "level": float(state[i, LEVEL]),
+                "std": float(math.sqrt(state[i, VAR])),
+                "trend_per_minute": float(state[i, TREND] * 60),
+                "baseline": None if math.isnan(baseline[i]) else float(baseline[i]),
+                "score": float(state[i, SCORE]),
+                "anomaly": bool(state[i, ANOMALY_SINCE] > 0),
+                "anomaly_since": float(state[i, ANOMALY_SINCE]) or None,
+                "forecast": float(forecast[i]),
+                "horizon_seconds": horizon,
+            }
+            for i in range(len(zones))
+        ]
+
+    def stats(self) -> dict:
+        with self._lock():
+            return {
+                "zones": int(np.count_nonzero(self.state[:, SAMPLES])),
+                "anomalies": int(np.count_nonzero(self.state[:, ANOMALY_SINCE])),
+            }
+
+    # --- Incident reporting ---
+    def unreported(self) -> list:
+        """``(zone_id, anomaly_since)`` of anomalies not yet reported as incidents."""
+        with self._lock():
+            since = self.state[:, ANOMALY_SINCE]
+            zones = np.flatnonzero((since > 0) & (since != self.state[:, REPORTED_SINCE]))
+            return [(int(zone), float(since[zone])) for zone in zones]
+
+    def mark_reported(self, zone_id: int, since: float):
+        with self._lock():
+            self.state[zone_id, REPORTED_SINCE] = since
+
+zone_analytics = ZoneAnalytics()
+
+def report_anomalies(db: Session, url: str = ANALYTICS_INCIDENT_URL) -> int:
+    """POSTs each new anomaly to the incident service's /report; failures are retried on the next call."""
+    import requests
+
+    pending = zone_analytics.unreported()
+    if not pending:
+        return 0
+    ids = [zone_id for zone_id, _ in pending]
+    zones = {row.id: row for row in db.execute(
+        select(TrafficZone.id, TrafficZone.name, TrafficZone.latitude, TrafficZone.longitude).where(TrafficZone.id.in_(ids))
+    )}
+    reported = 0
+    with requests.Session() as session:
+        for zone_id, since in pending:
+            zone = zones.get(zone_id)
+            if zone is not None:
+                incident = {"type": ANALYTICS_INCIDENT_TYPE, "location": zone.name, "latitude": zone.latitude, "longitude": zone.longitude}
+                try:
+                    session.post(f"{url.rstrip('/')}/report", json=incident, timeout=5).raise_for_status()
+                except requests.RequestException:
+                    continue
+                reported += 1
+            zone_analytics.mark_reported(zone_id, since)
+    return reported
@@ -0,0 +1,139 @@
+# traffic_service/async_crud.py
+# Coroutine twins of the CRUD functions in main.py, used when DB_ASYNC=1.
+# Each one has the same name and arguments as its sync counterpart.
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import analytics, models, passwords, readings, schemas
+from .events import zone_changed, zone_payload
+from .database import DB_ASYNC
+from .listing import user_rows_query, zone_rows_query
+from .write_behind import zone_buffer
+
+async def run(fn, db, *args, **kwargs):
+    """Calls the sync CRUD function ``fn`` in the threadpool, or its coroutine twin in async mode."""
+    if DB_ASYNC:
+        return await globals()[fn.__name__](db, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def commit(db):
+    if DB_ASYNC:
+        await db.commit()
+    else:
+        await run_in_threadpool(db.commit)
+
+async def rollback(db):
+    if DB_ASYNC:
+        await db.rollback()
+    else:
+        await run_in_threadpool(db.rollback)
+
+# --- User-related database functions ---
+async def get_user(db, user_id: int):
+    return await db.get(models.User, user_id)
+
+async def get_user_by_username(db, username: str):
+    return await db.scalar(select(models.User).where(models.User.username == username))
+
+async def get_users(db, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(models.User).offset(skip).limit(limit))).all()
+
+async def get_user_rows(db, skip: int = 0, limit: int = 100):
+    return (await db.execute(user_rows_query(skip, limit))).all()
+
+async def create_user(db, user: schemas.UserCreate, hashed_password: str | None = None):
+    if hashed_password is None:
+        hashed_password = await passwords.hash_password(user.password)
+    db_user = models.User(username=user.username, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def update_password_hash(db, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    await db.commit()
+
+async def deactivate_user(db, user_id: int):
+    db_user = await get_user(db, user_id=user_id)
+    if db_user:
+        db_user.is_active = False
+        await db.commit()
+        await db.refresh(db_user)
+    return db_user
+
+# --- Traffic Zone database functions ---
+async def create_zone(db, zone: schemas.TrafficZoneCreate):
+    db_zone = models.TrafficZone(**zone.dict())
+    db.add(db_zone)
+    await db.flush()
+    await readings.record_readings_async(db, [(db_zone.id, readings.now_ms(), db_zone.vehicle_count)])
+    await db.commit()
+    await db.refresh(db_zone)
+    zone_changed("created", zone_payload(db_zone))
+    return db_zone
+
+async def upsert_zones(db, zones: list):
+    names = {zone.name for _, zone in zones}
+    seen = set((await db.scalars(select(models.TrafficZone.name).where(models.TrafficZone.name.in_(names)))).all())
+    stmt = sqlite_insert(models.TrafficZone)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.TrafficZone.name],
+        set_={
+            "vehicle_count": stmt.excluded.vehicle_count,
+            "latitude": func.coalesce(stmt.excluded.latitude, models.TrafficZone.latitude),
+            "longitude": func.coalesce(stmt.excluded.longitude, models.TrafficZone.longitude),
+        },
+    )
+    await db.execute(stmt, [zone.dict() for _, zone in zones])
+    rows = await db.execute(select(models.TrafficZone.name, models.TrafficZone.id).where(models.TrafficZone.name.in_(names)))
+    ids = dict(rows.all())
+    ts = readings.now_ms()
+    await readings.record_readings_async(db, [(ids[zone.name], ts, zone.vehicle_count) for _, zone in zones])
+    results = []
+    for index, zone in zones:
+        results.append({"index": index, "status": "updated" if zone.name in seen else "created", "id": ids[zone.name]})
+        seen.add(zone.name)
+    return results
+
+async def get_zones(db, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(models.TrafficZone).offset(skip).limit(limit))).all()
+
+async def get_zone_rows(db, skip: int = 0, limit: int = 100):
+    return (await db.execute(zone_rows_query(skip, limit))).all()
+
+async def get_zone(db, zone_id: int):
+    return await db.get(models.TrafficZone, zone_id)
+
+async def update_zone(db, zone_id: int, zone: schemas.TrafficZoneUpdate):
+    db_zone = await db.get(models.TrafficZone, zone_id)
+    if db_zone:
+        changes = zone.dict(exclude_unset=True)
+        for key, value in changes.items():
+            setattr(db_zone, key, value)
+        if "vehicle_count" in changes:
+            await readings.record_readings_async(db, [(zone_id, readings.now_ms(), changes["vehicle_count"])])
+        await db.commit()
+        await db.refresh(db_zone)
+        zone_changed("updated", zone_payload(db_zone))
+    return db_zone
+
+async def buffer_zone_count(db, zone_id: int, vehicle_count: int):
+    db_zone = await db.get(models.TrafficZone, zone_id)
+    if db_zone is None:
+        return None
+    zone_buffer.put(zone_id, vehicle_count)
+    payload = {**zone_payload(db_zone), "vehicle_count": vehicle_count}
+    zone_changed("updated", payload)
+    return payload
+
+async def delete_zone(db, zone_id: int):
+    db_zone = await db.get(models.TrafficZone, zone_id)
+    if db_zone:
+        await db.delete(db_zone)
+        for statement, params in readings.delete_statements(zone_id):
+            await db.execute(statement, params)
+        await db.commit()
+        analytics.zone_analytics.forget(zone_id)
+        zone_changed("deleted", {"id": zone_id})
+    return db_zone is not None
@@ -0,0 +1,109 @@
+# traffic_service/auth_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from common import shared_state
+
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_CACHE_TTL_SECONDS", "300"))
+
+class TokenCache:
+    """Bounded LRU cache of validated bearer tokens -> user principal.
+
+    An entry lives until the earlier of the token's ``exp`` claim and the
+    cache TTL, so a cached token is never accepted past its expiry, and the
+    TTL bounds how stale a cached principal can get.
+
+    Invalidating a user also bumps an auth epoch shared by all workers
+    (under SHARED_STATE_DIR); the other workers see the new epoch on their
+    next lookup and drop every cached token.
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user = {}  # username -> set of cached tokens
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._epoch = shared_state.counter("auth.epoch")
+        self._seen_epoch = self._epoch.value
+
+    def get(self, token: str):
+        now = time.time()
+        with self._lock:
+            epoch = self._epoch.value
+            if epoch != self._seen_epoch:
+                self._entries.clear()
+                self._tokens_by_user.clear()
+                self._seen_epoch = epoch
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= now:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def generation(self) -> int:
+        """Taken before looking a user up, and passed to ``put``."""
+        return self._epoch.value
+
+    def put(self, token: str, principal, exp: float | None = None, generation: int | None = None):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            if generation is not None and generation != self._epoch.value:
+                return  # a user was invalidated since the lookup, which may have read the old row
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_user.setdefault(principal.username, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(username, ())):
+                self._remove(token)
+            # Tokens here are already dropped; only another worker's bump should clear the rest
+            if self._epoch.increment() == self._seen_epoch + 1:
+                self._seen_epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, token: str):
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(principal.username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[principal.username]
+
+token_cache = TokenCache()
@@ -0,0 +1,9 @@
+# traffic_service/caches.py
+from common.read_cache import ReadCache
+from .dashboard import DASHBOARD_CACHE_TTL_SECONDS
+
+# Serialized /zones/ reads; invalidated after every committed zone write
+zone_cache = ReadCache("zones")
+# /dashboard also shows incidents, whose writes happen in the other service,
+# so besides zone writes it turns over every DASHBOARD_CACHE_TTL_SECONDS
+dashboard_cache = ReadCache("dashboard", ttl=DASHBOARD_CACHE_TTL_SECONDS)
@@ -0,0 +1,105 @@
+# traffic_service/dashboard.py
+# Backend-for-frontend read behind GET /dashboard: one page of zones with
+# their congestion level and recent incident counts, the newest incidents and a
+# few totals. The incident database is ATTACHed to the traffic connection,
+# so per-zone incident counts are one grouped join rather than a call to
+# the incident service per zone.
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, case, func, literal, select
+from sqlalchemy.orm import Session
+from common.database import sqlite_path
+from .models import TrafficZone
+
+DASHBOARD_CACHE_TTL_SECONDS = float(os.environ.get("DASHBOARD_CACHE_TTL_SECONDS", "2"))
+INCIDENT_DB_PATH = sqlite_path("INCIDENT_DB_PATH", "incidents.db")
+INCIDENTS_SCHEMA = "incidents_db"
+
+# Zones above this many vehicles show as congested. Signal timings come from
+# the standalone service's Webster planner, which knows the intersection groups.
+CONGESTION_THRESHOLD = int(os.environ.get("DASHBOARD_CONGESTION_THRESHOLD", "70"))
+
+# The columns of incident_service's incidents table that the dashboard reads
+incidents = Table(
+    "incidents",
+    MetaData(schema=INCIDENTS_SCHEMA),
+    Column("id", Integer, primary_key=True),
+    Column("type", String),
+    Column("location", String),
+    Column("timestamp", DateTime),
+    Column("latitude", Float),
+    Column("longitude", Float),
+)
+
+def attach_incidents(db: Session) -> bool:
+    """ATTACHes the incident database to this session's connection, once per pooled connection.
+
+    Returns False (and the dashboard shows no incidents) while that
+    database doesn't exist yet.
+    """
+    conn = db.connection()
+    if conn.info.get("incidents_attached"):
+        return True
+    if not INCIDENT_DB_PATH.exists():
+        return False
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {INCIDENTS_SCHEMA}", (str(INCIDENT_DB_PATH),))
+    has_table = conn.exec_driver_sql(
+        f"SELECT 1 FROM {INCIDENTS_SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'incidents'"
+    ).first()
+    if not has_table:
+        conn.exec_driver_sql(f"DETACH DATABASE {INCIDENTS_SCHEMA}")
+        return False
+    conn.info["incidents_attached"] = True
+    return True
+
+def zone_rows_query(skip: int, limit: int, since: datetime, with_incidents: bool):
+    page = (
+        select(TrafficZone.id, TrafficZone.name, TrafficZone.vehicle_count, TrafficZone.latitude, TrafficZone.longitude)
+        .order_by(TrafficZone.id).offset(skip).limit(limit)
+        .cte("page")
+    )
+    columns = [
+        page.c.id, page.c.name, page.c.vehicle_count, page.c.latitude, page.c.longitude,
+        case((page.c.vehicle_count > CONGESTION_THRESHOLD, "High"), else_="Normal"),
+    ]
+    if not with_incidents:
+        return select(*columns, literal(0), literal(None)).order_by(page.c.id)
+    # Only the page's zones are counted, each through the (location, timestamp) index
+    counts = (
+        select(incidents.c.location, func.count().label("count"), func.max(incidents.c.timestamp).label("last"))
+        .where(incidents.c.location.in_(select(page.c.name)), incidents.c.timestamp >= since)
+        .group_by(incidents.c.location)
+        .subquery()
+    )
+    return (
+        select(*columns, func.coalesce(counts.c.count, 0), counts.c.last)
+        .select_from(page.outerjoin(counts, counts.c.location == page.c.name))
+        .order_by(page.c.id)
+    )
+
+ZONE_FIELDS = (
+    "id", "name", "vehicle_count", "latitude", "longitude",
+    "congestion", "incident_count", "last_incident_at",
+)
+INCIDENT_FIELDS = ("id", "type", "location", "timestamp", "latitude", "longitude")
+
+def dashboard(db: Session, skip: int, limit: int, window_seconds: float, recent: int) -> dict:
+    since = datetime.utcnow() - timedelta(seconds=window_seconds)
+    with_incidents = attach_incidents(db)
+    zones = db.execute(zone_rows_query(skip, limit, since, with_incidents)).all()
+    zone_totals = select(func.count(), func.coalesce(func.sum(TrafficZone.vehicle_count), 0))
+    total_zones, total_vehicles = db.execute(zone_totals).one()
+    recent_incidents, incident_count = [], 0
+    if with_incidents:
+        recent_incidents = db.execute(
+            select(*(incidents.c[name] for name in INCIDENT_FIELDS))
+            .order_by(incidents.c.timestamp.desc(), incidents.c.id.desc()).limit(recent)
+        ).all()
+        incident_count = db.scalar(select(func.count()).select_from(incidents).where(incidents.c.timestamp >= since))
+    return {
+        "zones": [dict(zip(ZONE_FIELDS, row)) for row in zones],
+        "recent_incidents": [dict(zip(INCIDENT_FIELDS, row)) for row in recent_incidents],
+        "totals": {"zones": total_zones, "vehicles": total_vehicles, "incidents": incident_count},
+        "window_seconds": window_seconds,
+        "generated_at": datetime.utcnow(),
+    }
@@ -1,14 +1,28 @@
 # traffic_service/database.py
-from sqlalchemy import create_engine
+import os
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from common.database import create_async_sqlite_engine, create_sqlite_engine, sqlite_path, sqlite_url
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./traffic.db"
+# Absolute path so the database does not depend on the working directory
+TRAFFIC_DB_PATH = sqlite_path("TRAFFIC_DB_PATH", "traffic.db")
+SQLALCHEMY_DATABASE_URL = sqlite_url(TRAFFIC_DB_PATH)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_sqlite_engine(TRAFFIC_DB_PATH)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Optional asyncio mode (needs aiosqlite and greenlet); imported lazily so the
+# default sync mode does not depend on them
+DB_ASYNC = os.environ.get("DB_ASYNC", "0") == "1"
+ASYNC_SQLALCHEMY_DATABASE_URL = sqlite_url(TRAFFIC_DB_PATH, driver="aiosqlite")
+async_engine = None
+AsyncSessionLocal = None
+
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_async_sqlite_engine(TRAFFIC_DB_PATH)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
@@ -0,0 +1,20 @@
+# traffic_service/events.py
+from common.events import EventBroker
+from .caches import dashboard_cache, zone_cache
+
+zone_events = EventBroker("zones")
+
+def zone_changed(event_type: str, data: dict):
+    """Called after a zone write commits: drops cached reads and notifies subscribers."""
+    zone_cache.invalidate()
+    dashboard_cache.invalidate()
+    zone_events.publish(event_type, data)
+
+def zone_payload(db_zone) -> dict:
+    return {
+        "id": db_zone.id,
+        "name": db_zone.name,
+        "vehicle_count": db_zone.vehicle_count,
+        "latitude": db_zone.latitude,
+        "longitude": db_zone.longitude,
+    }
@@ -0,0 +1,17 @@
+# traffic_service/listing.py
+# Column-tuple queries behind the fast list endpoints. Each selects exactly
+# the response fields, in the order of the matching Pydantic schema, so rows
+# can be encoded without building ORM objects or validating models.
+from sqlalchemy import select
+from . import models
+
+USER_FIELDS = ("username", "id", "is_active")
+ZONE_FIELDS = ("name", "vehicle_count", "latitude", "longitude", "id")
+
+def user_rows_query(skip: int = 0, limit: int = 100):
+    columns = [getattr(models.User, field) for field in USER_FIELDS]
+    return select(*columns).order_by(models.User.id).offset(skip).limit(limit)
+
+def zone_rows_query(skip: int = 0, limit: int = 100):
+    columns = [getattr(models.TrafficZone, field) for field in ZONE_FIELDS]
+    return select(*columns).order_by(models.TrafficZone.id).offset(skip).limit(limit)
@@ -1,39 +1,120 @@
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import event, func, inspect
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from . import models, schemas
-from .database import SessionLocal, engine
-from passlib.context import CryptContext
+from .database import TRAFFIC_DB_PATH, SessionLocal, AsyncSessionLocal, async_engine, engine
+from . import async_crud
+from .auth_cache import token_cache
+from .caches import dashboard_cache, zone_cache
+from .events import zone_changed, zone_events, zone_payload
+from . import passwords
+from . import analytics, dashboard, readings
+from .listing import USER_FIELDS, ZONE_FIELDS, user_rows_query, zone_rows_query
+from .write_behind import zone_buffer
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Annotated
+import asyncio
+import time
+from pydantic import TypeAdapter
 import os
-from jose import JWTError, jwt
+from jose import JWTError
+from common import geo, metrics, serialization, shared_state
+from common.bulk import iter_validated_batches, summarize
+from common.events import sse_response, websocket_stream
+from common.database import init_schema
+from common.lazy import lazy_import, load
+from common.read_cache import cached_json_response
 
-models.Base.metadata.create_all(bind=engine)
+jwt = lazy_import("jose.jwt")
 
-app = FastAPI()
+def create_schema():
+    readings.upgrade_schema(engine)
+    models.Base.metadata.create_all(bind=engine)
+    geo.add_missing_columns(engine, models.TrafficZone.__table__)
+    geo.create_spatial_index(engine, models.TrafficZone.__tablename__)
+
+def prune_readings():
+    with SessionLocal() as db:
+        readings.prune(db)
+
+async def prune_readings_periodically():
+    # With several workers only the one holding the leader lock prunes
+    leader = shared_state.LeaderLock("prune_readings")
+    while True:
+        await asyncio.sleep(readings.PRUNE_INTERVAL_SECONDS)
+        if leader.acquire():
+            await run_in_threadpool(prune_readings)
+
+def report_anomalies():
+    with SessionLocal() as db:
+        analytics.report_anomalies(db)
+
+async def report_anomalies_periodically():
+    leader = shared_state.LeaderLock("report_anomalies")
+    while True:
+        await asyncio.sleep(analytics.ANALYTICS_REPORT_INTERVAL_SECONDS)
+        if leader.acquire():
+            await run_in_threadpool(report_anomalies)
+
+def warm_up():
+    """Loads what importing the app deferred, so the first requests don't pay for it."""
+    load(jwt, readings.np)
+    passwords.get_context()
+    analytics.zone_analytics.state  # maps the shared arrays
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(init_schema, TRAFFIC_DB_PATH, create_schema)
+    await run_in_threadpool(warm_up)
+    await run_in_threadpool(read_with_session, analytics.zone_analytics.warm)
+    pruner = asyncio.create_task(prune_readings_periodically())
+    reporter = asyncio.create_task(report_anomalies_periodically()) if analytics.ANALYTICS_INCIDENT_URL else None
+    zone_buffer.start()
+    yield
+    pruner.cancel()
+    if reporter is not None:
+        reporter.cancel()
+    await run_in_threadpool(zone_buffer.stop)
+    passwords.shutdown_executor()
+
+app = FastAPI(lifespan=lifespan)
+metrics.install(app, engine, async_engine, gauges={
+    "auth_cache": ("cache", lambda: {"tokens": token_cache.stats()}),
+    "read_cache": ("cache", lambda: {"zones": zone_cache.stats(), "dashboard": dashboard_cache.stats()}),
+    "event_broker": ("channel", lambda: {"zones": zone_events.stats()}),
+    "write_behind": ("buffer", lambda: {"zone_counts": zone_buffer.stats()}),
+    "zone_analytics": ("state", lambda: {"zones": analytics.zone_analytics.stats()}),
+    "db_pool": ("engine", lambda: metrics.pool_stats(sync=engine, asyncio=async_engine)),
+})
 
 # Security settings
 SECRET_KEY = os.environ.get("SECRET_KEY", "YOUR_SECRET_KEY") # Use a strong, environment-based secret in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Dependency to get the database session
-def get_db():
+# Dependency to get the database session (an AsyncSession when DB_ASYNC=1)
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return passwords.get_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return passwords.get_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -42,33 +123,79 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with metrics.timed("jwt_encode"):
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+db_session = asynccontextmanager(get_db)
+
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+    return await authenticate_token(token, db)
+
+async def authenticate_token(token: str, db: Session):
+    # Validated tokens are cached with the user they resolve to, so repeat
+    # requests skip both the JWT decode and the user lookup
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with metrics.timed("jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_data = schemas.UserBase(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user_by_username(db, username=token_data.username)
+    generation = token_cache.generation()
+    user = await async_crud.run(get_user_by_username, db, username=token_data.username)
     if user is None:
         raise credentials_exception
-    return user
+    principal = schemas.User.model_validate(user)
+    token_cache.put(token, principal, exp=payload.get("exp"), generation=generation)
+    return principal
+
+# Cached tokens of a (de)activated user are dropped once the change commits;
+# dropping them earlier would let a concurrent request re-cache the old row
+@event.listens_for(Session, "before_flush")
+def collect_reactivated_users(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, models.User) and inspect(obj).attrs.is_active.history.has_changes():
+            session.info.setdefault("users_to_invalidate", set()).add(obj.username)
+
+@event.listens_for(Session, "after_commit")
+def invalidate_cached_tokens(session):
+    for username in session.info.pop("users_to_invalidate", ()):
+        token_cache.invalidate_user(username)
+
+@event.listens_for(Session, "after_rollback")
+def forget_reactivated_users(session):
+    session.info.pop("users_to_invalidate", None)
 
-async def get_current_active_user(current_user: Annotated[models.User, Depends(get_current_user)]):
+async def get_current_active_user(current_user: Annotated[schemas.User, Depends(get_current_user)]):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def authenticate_stream(token: str | None):
+    """Authenticates a long-lived stream without holding a DB session for its lifetime.
+
+    Browsers can't set headers on EventSource or WebSocket connections, so the
+    token may also arrive as a ``?token=`` query parameter.
+    """
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    user = token_cache.get(token)
+    if user is None:
+        async with db_session() as db:
+            user = await authenticate_token(token, db)
+    return await get_current_active_user(user)
+
 # --- User-related database functions ---
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
@@ -79,78 +206,279 @@ def get_user_by_username(db: Session, username: str):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def get_user_rows(db: Session, skip: int = 0, limit: int = 100):
+    return db.execute(user_rows_query(skip, limit)).all()
+
+def stream_rows(stmt):
+    """Chunks of ``stmt``'s rows from a session that lives as long as the response body."""
+    with SessionLocal() as db:
+        yield from serialization.iter_chunks(db.execute(stmt))
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str | None = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
+def update_password_hash(db: Session, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    db.commit()
+
+def deactivate_user(db: Session, user_id: int):
+    db_user = get_user(db, user_id=user_id)
+    if db_user:
+        db_user.is_active = False  # the commit drops the user's cached tokens, see invalidate_cached_tokens
+        db.commit()
+        db.refresh(db_user)
+    return db_user
+
 # --- Authentication Endpoints ---
+# Handlers are coroutines: bcrypt runs in the passwords worker pool, and
+# async_crud.run sends each CRUD call to the threadpool (sync mode) or to its
+# coroutine twin (DB_ASYNC=1), so nothing blocks the event loop
 @app.post("/auth/signup", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user_by_username(db, username=user.username)
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await async_crud.run(get_user_by_username, db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return create_user(db=db, user=user)
+    hashed_password = await passwords.hash_password(user.password)
+    return await async_crud.run(create_user, db, user=user, hashed_password=hashed_password)
 
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Session = Depends(get_db)):
-    user = get_user_by_username(db, username=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await async_crud.run(get_user_by_username, db, username=form_data.username)
+    valid, new_hash = await passwords.verify_and_update(form_data.password, user.hashed_password if user else None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await async_crud.run(update_password_hash, db, user, new_hash)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/users/me/", response_model=schemas.User)
-async def read_users_me(current_user: Annotated[models.User, Depends(get_current_active_user)]):
+async def read_users_me(current_user: Annotated[schemas.User, Depends(get_current_active_user)]):
     return current_user
 
+@app.post("/users/me/deactivate", response_model=schemas.User)
+async def deactivate_users_me(current_user: Annotated[schemas.User, Depends(get_current_active_user)], db: Session = Depends(get_db)):
+    """Deactivates the caller's account; its tokens stop working on every worker once this commits."""
+    return await async_crud.run(deactivate_user, db, user_id=current_user.id)
+
 @app.get("/users/", response_model=list[schemas.User])
-async def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = get_users(db, skip=skip, limit=limit)
-    return users
+async def read_users(request: Request, skip: int = 0, limit: int = 100, format: str | None = None, stream: bool = False, db: Session = Depends(get_db)):
+    fmt = serialization.response_format(request, format)
+    if stream or fmt != "json":
+        return serialization.stream_rows(fmt, USER_FIELDS, stream_rows(user_rows_query(skip, limit)))
+    rows = await async_crud.run(get_user_rows, db, skip=skip, limit=limit)
+    with metrics.timed("serialize"):
+        return serialization.rows_response(fmt, USER_FIELDS, rows)
 
 @app.get("/users/{user_id}", response_model=schemas.User)
 async def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = get_user(db, user_id=user_id)
+    db_user = await async_crud.run(get_user, db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 # --- Existing Traffic Zone Endpoints (Now Protected) ---
 @app.post("/zones/", response_model=schemas.TrafficZone)
-def create_zone_api(zone: schemas.TrafficZoneCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    return create_zone(db=db, zone=zone)
+async def create_zone_api(zone: schemas.TrafficZoneCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_active_user)):
+    return await async_crud.run(create_zone, db, zone=zone)
 
+@app.post("/zones/bulk", response_model=schemas.BulkResult)
+async def bulk_upsert_zones_api(request: Request, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_active_user)):
+    """Upserts zones by name from a JSON array or an NDJSON stream in one transaction."""
+    await run_in_threadpool(zone_buffer.flush)  # so buffered counts can't overwrite the upload later
+    items = []
+    try:
+        async for zones, errors in iter_validated_batches(request, schemas.TrafficZoneCreate):
+            items.extend(errors)
+            if zones:
+                items.extend(await async_crud.run(upsert_zones, db, zones))
+        await async_crud.commit(db)
+    except Exception:
+        await async_crud.rollback(db)
+        raise
+    zone_changed("bulk", {"ids": sorted({item["id"] for item in items if item["status"] != "error"})})
+    return summarize(items)
+
+zone_adapter = TypeAdapter(schemas.TrafficZone)
+
+# Zone reads are served from zone_cache with ETags; an unchanged
+# If-None-Match gets a 304 without touching the database. ?format=ndjson|csv
+# or ?stream=true streams the rows instead, uncached.
 @app.get("/zones/", response_model=list[schemas.TrafficZone])
-def read_zones_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    zones = get_zones(db, skip=skip, limit=limit)
-    return zones
+async def read_zones_api(request: Request, skip: int = 0, limit: int = 100, format: str | None = None, stream: bool = False, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_active_user)):
+    fmt = serialization.response_format(request, format)
+    if stream or fmt != "json":
+        chunks = zone_buffer.overlay_chunks(stream_rows(zone_rows_query(skip, limit)), ZONE_FIELDS)
+        return serialization.stream_rows(fmt, ZONE_FIELDS, chunks)
+    async def load():
+        rows = zone_buffer.overlay_rows(await async_crud.run(get_zone_rows, db, skip=skip, limit=limit), ZONE_FIELDS)
+        with metrics.timed("serialize"):
+            return serialization.encode_json(ZONE_FIELDS, rows)
+    return await cached_json_response(request, zone_cache, load)
+
+# Live change feed; declared before /zones/{zone_id} so the paths don't collide
+@app.get("/zones/stream")
+async def stream_zone_events(request: Request, token: str | None = None):
+    """Server-Sent Events of zone creates, updates and deletes as they commit."""
+    scheme, _, header_token = request.headers.get("authorization", "").partition(" ")
+    await authenticate_stream(token or (header_token if scheme.lower() == "bearer" else None))
+    return sse_response(zone_events, request)
+
+@app.websocket("/zones/ws")
+async def zone_events_websocket(websocket: WebSocket, token: str | None = None, last_event_id: int | None = None):
+    try:
+        await authenticate_stream(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    await websocket_stream(zone_events, websocket, last_event_id)
+
+# --- Zone Reading History ---
+# Stats endpoints read with their own short-lived sync session in the
+# threadpool so the NumPy work never runs on the event loop.
+def parse_window(window: str) -> float:
+    try:
+        return readings.parse_duration(window)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+def parse_percentiles(percentiles: str) -> list:
+    try:
+        values = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        values = [-1.0]
+    if any(not 0 <= p <= 100 for p in values):
+        raise HTTPException(status_code=400, detail="Percentiles must be numbers between 0 and 100")
+    return values
+
+def read_with_session(fn, *args):
+    with SessionLocal() as db:
+        return fn(db, *args)
+
+@app.get("/zones/readings/stats", response_model=list[schemas.ReadingStats])
+async def read_all_zone_stats_api(window: str = "15m", percentiles: str = "50,95,99", current_user: schemas.User = Depends(get_current_active_user)):
+    return await run_in_threadpool(read_with_session, readings.all_zone_window_stats, parse_window(window), parse_percentiles(percentiles))
+
+@app.get("/zones/{zone_id}/readings/stats", response_model=schemas.ReadingStats)
+async def read_zone_stats_api(zone_id: int, window: str = "15m", percentiles: str = "50,95,99", current_user: schemas.User = Depends(get_current_active_user)):
+    return await run_in_threadpool(read_with_session, readings.window_stats, zone_id, parse_window(window), parse_percentiles(percentiles))
+
+@app.get("/zones/{zone_id}/readings/rollups", response_model=list[schemas.ReadingRollup])
+async def read_zone_rollups_api(zone_id: int, resolution: str = "1m", start: float | None = None, end: float | None = None, current_user: schemas.User = Depends(get_current_active_user)):
+    if resolution not in readings.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Resolution must be one of {', '.join(readings.RESOLUTIONS)}")
+    end = time.time() if end is None else end
+    start = end - 86400 if start is None else start
+    return await run_in_threadpool(read_with_session, readings.rollups, zone_id, readings.RESOLUTIONS[resolution], start, end)
+
+# --- Congestion analytics ---
+# Online per-zone statistics and forecasts (see analytics.py); a zone is
+# anomalous while its latest reading scores ANALYTICS_Z_THRESHOLD or more
+@app.get("/zones/analytics", response_model=list[schemas.ZoneAnalytics])
+async def read_zone_analytics_api(anomalous: bool = False, horizon: str = "15m", current_user: schemas.User = Depends(get_current_active_user)):
+    return await run_in_threadpool(analytics.zone_analytics.summaries, parse_window(horizon), anomalous_only=anomalous)
+
+@app.get("/zones/{zone_id}/analytics", response_model=schemas.ZoneAnalytics)
+async def read_one_zone_analytics_api(zone_id: int, horizon: str = "15m", current_user: schemas.User = Depends(get_current_active_user)):
+    summaries = await run_in_threadpool(analytics.zone_analytics.summaries, parse_window(horizon), zone_id=zone_id)
+    if not summaries:
+        raise HTTPException(status_code=404, detail="No readings for this zone")
+    return summaries[0]
+
+# --- Operator dashboard ---
+# Everything the UI's dashboard shows in one call (see dashboard.py), cached
+# until the next zone write or for DASHBOARD_CACHE_TTL_SECONDS at most
+@app.get("/dashboard", response_model=schemas.Dashboard)
+async def read_dashboard_api(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    window: str = "1h",
+    recent: int = Query(10, ge=0, le=100),
+    current_user: schemas.User = Depends(get_current_active_user),
+):
+    window_seconds = parse_window(window)
+    async def load():
+        data = await run_in_threadpool(read_with_session, dashboard.dashboard, skip, limit, window_seconds, recent)
+        with metrics.timed("serialize"):
+            return serialization.dumps(data)
+    return await cached_json_response(request, dashboard_cache, load)
+
+# --- Zone Geo Queries ---
+ZONE_GEO_COLUMNS = "t.id, t.name, t.vehicle_count, t.latitude, t.longitude"
+
+def zones_near(db: Session, lat: float, lon: float, radius_m: float, limit: int):
+    return zone_buffer.overlay_records(geo.within_radius(db.connection(), models.TrafficZone.__tablename__, ZONE_GEO_COLUMNS, lat, lon, radius_m, limit))
+
+def zones_in_bbox(db: Session, bbox: tuple, limit: int):
+    return zone_buffer.overlay_records(geo.bbox_rows(db.connection(), models.TrafficZone.__tablename__, ZONE_GEO_COLUMNS, bbox, limit))
+
+def zones_nearest(db: Session, lat: float, lon: float, k: int):
+    return zone_buffer.overlay_records(geo.nearest(db.connection(), models.TrafficZone.__tablename__, ZONE_GEO_COLUMNS, lat, lon, k))
+
+@app.get("/zones/near", response_model=list[schemas.NearbyZone])
+async def read_zones_near_api(lat: float = Query(ge=-90, le=90), lon: float = Query(ge=-180, le=180), radius_m: float = Query(1000, gt=0, le=geo.MAX_RADIUS_M), limit: int = Query(100, ge=1, le=1000), current_user: schemas.User = Depends(get_current_active_user)):
+    return await run_in_threadpool(read_with_session, zones_near, lat, lon, radius_m, limit)
+
+@app.get("/zones/bbox", response_model=list[schemas.NearbyZone])
+async def read_zones_in_bbox_api(min_lat: float = Query(ge=-90, le=90), min_lon: float = Query(ge=-180, le=180), max_lat: float = Query(ge=-90, le=90), max_lon: float = Query(ge=-180, le=180), limit: int = Query(100, ge=1, le=1000), current_user: schemas.User = Depends(get_current_active_user)):
+    # min_lon > max_lon is a box crossing the antimeridian
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+    return await run_in_threadpool(read_with_session, zones_in_bbox, (min_lat, min_lon, max_lat, max_lon), limit)
+
+@app.get("/zones/nearest", response_model=list[schemas.NearbyZone])
+async def read_zones_nearest_api(lat: float = Query(ge=-90, le=90), lon: float = Query(ge=-180, le=180), k: int = Query(10, ge=1, le=1000), current_user: schemas.User = Depends(get_current_active_user)):
+    return await run_in_threadpool(read_with_session, zones_nearest, lat, lon, k)
 
 @app.get("/zones/{zone_id}", response_model=schemas.TrafficZone)
-def read_zone_api(zone_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    db_zone = get_zone(db, zone_id=zone_id)
-    if db_zone is None:
-        raise HTTPException(status_code=404, detail="Traffic Zone not found")
-    return db_zone
+async def read_zone_api(request: Request, zone_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_active_user)):
+    async def load():
+        db_zone = await async_crud.run(get_zone, db, zone_id=zone_id)
+        if db_zone is None:
+            raise HTTPException(status_code=404, detail="Traffic Zone not found")
+        with metrics.timed("serialize"):
+            zone = zone_adapter.validate_python(db_zone, from_attributes=True)
+            count = zone_buffer.count(zone_id)
+            if count is not None:
+                zone = zone.model_copy(update={"vehicle_count": count})
+            return zone_adapter.dump_json(zone)
+    return await cached_json_response(request, zone_cache, load)
 
 @app.put("/zones/{zone_id}", response_model=schemas.TrafficZone)
-def update_zone_api(zone_id: int, zone: schemas.TrafficZoneUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    db_zone = update_zone(db=db, zone_id=zone_id, zone=zone)
+async def update_zone_api(zone_id: int, zone: schemas.TrafficZoneUpdate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_active_user)):
+    if zone_buffer.enabled:
+        changes = zone.dict(exclude_unset=True)
+        if changes.keys() == {"vehicle_count"} and changes["vehicle_count"] is not None:
+            db_zone = await async_crud.run(buffer_zone_count, db, zone_id=zone_id, vehicle_count=changes["vehicle_count"])
+            if db_zone is None:
+                raise HTTPException(status_code=404, detail="Traffic Zone not found")
+            return db_zone
+        # Other edits are written directly, after the counts buffered before them
+        await run_in_threadpool(zone_buffer.flush)
+    db_zone = await async_crud.run(update_zone, db, zone_id=zone_id, zone=zone)
     if db_zone is None:
         raise HTTPException(status_code=404, detail="Traffic Zone not found")
     return db_zone
 
 @app.delete("/zones/{zone_id}")
-def delete_zone_api(zone_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    db_zone = delete_zone(db=db, zone_id=zone_id)
+async def delete_zone_api(zone_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_active_user)):
+    if zone_buffer.enabled:
+        zone_buffer.discard(zone_id)
+        await run_in_threadpool(zone_buffer.flush)  # waits out a batch already being written
+    db_zone = await async_crud.run(delete_zone, db, zone_id=zone_id)
     if db_zone is None:
         raise HTTPException(status_code=404, detail="Traffic Zone not found")
     return {"message": f"Traffic Zone with id {zone_id} deleted"}
@@ -159,28 +487,80 @@ def delete_zone_api(zone_id: int, db: Session = Depends(get_db), current_user: m
 def create_zone(db: Session, zone: schemas.TrafficZoneCreate):
     db_zone = models.TrafficZone(**zone.dict())
     db.add(db_zone)
+    db.flush()
+    readings.record_readings(db, [(db_zone.id, readings.now_ms(), db_zone.vehicle_count)])
     db.commit()
     db.refresh(db_zone)
+    zone_changed("created", zone_payload(db_zone))
     return db_zone
 
+def upsert_zones(db: Session, zones: list):
+    """Inserts or updates a batch of ``(index, TrafficZoneCreate)`` pairs keyed by name.
+
+    Runs as one executemany INSERT ... ON CONFLICT statement plus two
+    lookups for the whole batch; committing is left to the caller.
+    """
+    names = {zone.name for _, zone in zones}
+    seen = {name for (name,) in db.query(models.TrafficZone.name).filter(models.TrafficZone.name.in_(names))}
+    stmt = sqlite_insert(models.TrafficZone)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.TrafficZone.name],
+        set_={
+            "vehicle_count": stmt.excluded.vehicle_count,
+            # Rows without coordinates keep the ones already stored
+            "latitude": func.coalesce(stmt.excluded.latitude, models.TrafficZone.latitude),
+            "longitude": func.coalesce(stmt.excluded.longitude, models.TrafficZone.longitude),
+        },
+    )
+    db.execute(stmt, [zone.dict() for _, zone in zones])
+    ids = dict(db.query(models.TrafficZone.name, models.TrafficZone.id).filter(models.TrafficZone.name.in_(names)))
+    ts = readings.now_ms()
+    readings.record_readings(db, [(ids[zone.name], ts, zone.vehicle_count) for _, zone in zones])
+    results = []
+    for index, zone in zones:
+        results.append({"index": index, "status": "updated" if zone.name in seen else "created", "id": ids[zone.name]})
+        seen.add(zone.name)
+    return results
+
 def get_zones(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.TrafficZone).offset(skip).limit(limit).all()
 
+def get_zone_rows(db: Session, skip: int = 0, limit: int = 100):
+    return db.execute(zone_rows_query(skip, limit)).all()
+
 def get_zone(db: Session, zone_id: int):
     return db.query(models.TrafficZone).filter(models.TrafficZone.id == zone_id).first()
 
 def update_zone(db: Session, zone_id: int, zone: schemas.TrafficZoneUpdate):
     db_zone = db.query(models.TrafficZone).filter(models.TrafficZone.id == zone_id).first()
     if db_zone:
-        for key, value in zone.dict(exclude_unset=True).items():
+        changes = zone.dict(exclude_unset=True)
+        for key, value in changes.items():
             setattr(db_zone, key, value)
+        if "vehicle_count" in changes:
+            readings.record_readings(db, [(zone_id, readings.now_ms(), changes["vehicle_count"])])
         db.commit()
         db.refresh(db_zone)
+        zone_changed("updated", zone_payload(db_zone))
     return db_zone
 
+def buffer_zone_count(db: Session, zone_id: int, vehicle_count: int):
+    """Write-behind count update: checks the zone exists, then buffers the count instead of committing."""
+    db_zone = get_zone(db, zone_id)
+    if db_zone is None:
+        return None
+    zone_buffer.put(zone_id, vehicle_count)
+    payload = {**zone_payload(db_zone), "vehicle_count": vehicle_count}
+    zone_changed("updated", payload)
+    return payload
+
 def delete_zone(db: Session, zone_id: int):
     db_zone = db.query(models.TrafficZone).filter(models.TrafficZone.id == zone_id).first()
     if db_zone:
         db.delete(db_zone)
+        for statement, params in readings.delete_statements(zone_id):
+            db.execute(statement, params)
         db.commit()
+        analytics.zone_analytics.forget(zone_id)
+        zone_changed("deleted", {"id": zone_id})
     return db_zone is not None
\ No newline at end of file
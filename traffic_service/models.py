@@ -1,5 +1,5 @@
 # traffic_service/models.py
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Float, Integer, String
 from sqlalchemy.orm import relationship
 from traffic_service.database import Base
 
@@ -16,4 +16,31 @@ class TrafficZone(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
-    vehicle_count = Column(Integer)
\ No newline at end of file
+    vehicle_count = Column(Integer)
+    # Optional coordinates, indexed by the traffic_zones_rtree R*Tree (see common/geo.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+
+# Append-only history of vehicle counts. Both tables are WITHOUT ROWID and
+# clustered on their primary key, so a zone's readings for a time range are
+# one contiguous range scan.
+class ZoneReading(Base):
+    __tablename__ = "zone_readings"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    zone_id = Column(Integer, primary_key=True)
+    ts = Column(Integer, primary_key=True)  # epoch milliseconds
+    seq = Column(Integer, primary_key=True, default=0, server_default="0")  # tells apart readings in the same millisecond
+    vehicle_count = Column(Integer, nullable=False)
+
+class ZoneRollup(Base):
+    __tablename__ = "zone_rollups"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    zone_id = Column(Integer, primary_key=True)
+    resolution = Column(Integer, primary_key=True)  # bucket width in seconds
+    bucket = Column(Integer, primary_key=True)  # bucket start, epoch seconds
+    samples = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)
+    min_count = Column(Integer, nullable=False)
+    max_count = Column(Integer, nullable=False)
@@ -0,0 +1,66 @@
+# traffic_service/passwords.py
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from common.metrics import timed
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# "thread" keeps hashing in-process (bcrypt releases the GIL); "process" gives
+# true parallelism at the cost of a worker process per slot
+PASSWORD_HASH_POOL = os.environ.get("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+_context = None
+_executor: Executor | None = None
+
+def get_context():
+    """The CryptContext, built on first use since importing passlib and bcrypt slows startup."""
+    global _context
+    if _context is None:
+        from passlib.context import CryptContext
+
+        # Hashes below the configured cost are flagged by needs_update and upgraded on login
+        _context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=BCRYPT_ROUNDS,
+            bcrypt__min_rounds=BCRYPT_ROUNDS,
+        )
+    return _context
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_POOL == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+# Module-level so they can be pickled into a process pool worker
+def hash_password_sync(password: str) -> str:
+    return get_context().hash(password)
+
+def verify_and_update_sync(password: str, hashed_password: str | None):
+    if hashed_password is None:
+        # Burn the same time as a real check so unknown usernames can't be told apart
+        get_context().dummy_verify()
+        return False, None
+    return get_context().verify_and_update(password, hashed_password)
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    with timed("bcrypt_hash"):
+        return await loop.run_in_executor(get_executor(), hash_password_sync, password)
+
+async def verify_and_update(password: str, hashed_password: str | None):
+    """Returns ``(valid, new_hash)``; ``new_hash`` is set when the stored hash should be replaced."""
+    loop = asyncio.get_running_loop()
+    with timed("bcrypt_verify"):
+        return await loop.run_in_executor(get_executor(), verify_and_update_sync, password, hashed_password)
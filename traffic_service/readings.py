@@ -0,0 +1,224 @@
+# traffic_service/readings.py
+# Time series of zone vehicle counts: every count written through the zone
+# CRUD functions is appended to zone_readings and folded into 1m/15m/1h
+# rollups in the same transaction, and fed to the online statistics in
+# analytics.py once that transaction commits. Window statistics are computed with NumPy over arrays
+# fetched straight from the DB-API cursor.
+import os
+import re
+import time
+from itertools import chain
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from common.lazy import lazy_import
+from .analytics import zone_analytics
+from .models import ZoneReading
+
+np = lazy_import("numpy")
+
+# Rollup resolution (seconds) -> how long its buckets are kept (seconds)
+DAY = 86400
+ROLLUP_RETENTION = {
+    60: int(os.environ.get("READINGS_1M_RETENTION_DAYS", "30")) * DAY,
+    900: int(os.environ.get("READINGS_15M_RETENTION_DAYS", "180")) * DAY,
+    3600: int(os.environ.get("READINGS_1H_RETENTION_DAYS", "1825")) * DAY,
+}
+RAW_RETENTION = int(os.environ.get("READINGS_RAW_RETENTION_DAYS", "7")) * DAY
+PRUNE_INTERVAL_SECONDS = float(os.environ.get("READINGS_PRUNE_INTERVAL_SECONDS", "600"))
+
+RESOLUTIONS = {"1m": 60, "15m": 900, "1h": 3600}
+
+# Readings of a zone in the same millisecond all count, so each gets the next seq
+INSERT_READING = text(
+    "INSERT INTO zone_readings (zone_id, ts, seq, vehicle_count) "
+    "SELECT :zone_id, :ts, coalesce(max(seq) + 1, 0), :vehicle_count FROM zone_readings WHERE zone_id = :zone_id AND ts = :ts"
+)
+UPSERT_ROLLUP = text(
+    "INSERT INTO zone_rollups (zone_id, resolution, bucket, samples, total, min_count, max_count) "
+    "VALUES (:zone_id, :resolution, :bucket, 1, :vehicle_count, :vehicle_count, :vehicle_count) "
+    "ON CONFLICT (zone_id, resolution, bucket) DO UPDATE SET "
+    "samples = samples + 1, total = total + excluded.total, "
+    "min_count = min(min_count, excluded.min_count), max_count = max(max_count, excluded.max_count)"
+)
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+def reading_statements(readings: list):
+    """Statements and executemany parameters that append ``(zone_id, ts_ms, count)`` readings."""
+    rows = [{"zone_id": zone_id, "ts": ts, "vehicle_count": count} for zone_id, ts, count in readings if count is not None]
+    if not rows:
+        return []
+    rollups = [
+        {**row, "resolution": resolution, "bucket": row["ts"] // 1000 // resolution * resolution}
+        for resolution in ROLLUP_RETENTION
+        for row in rows
+    ]
+    return [(INSERT_READING, rows), (UPSERT_ROLLUP, rollups)]
+
+def record_readings(db: Session, readings: list):
+    for statement, params in reading_statements(readings):
+        db.execute(statement, params)
+    db.info.setdefault("readings_to_observe", []).extend(readings)
+
+async def record_readings_async(db, readings: list):
+    for statement, params in reading_statements(readings):
+        await db.execute(statement, params)
+    db.info.setdefault("readings_to_observe", []).extend(readings)
+
+# Analytics only sees readings that were committed; a rolled back write (or a
+# write-behind batch that gets retried) must not count
+@event.listens_for(Session, "after_commit")
+def observe_committed_readings(session):
+    committed = session.info.pop("readings_to_observe", None)
+    if committed:
+        zone_analytics.observe(committed)
+
+@event.listens_for(Session, "after_rollback")
+def forget_rolled_back_readings(session):
+    session.info.pop("readings_to_observe", None)
+
+def upgrade_schema(engine: Engine):
+    """Rebuilds a zone_readings table keyed on (zone_id, ts) only, from before readings had a seq."""
+    tables = inspect(engine)
+    if not tables.has_table("zone_readings"):
+        return
+    if "seq" in {column["name"] for column in tables.get_columns("zone_readings")}:
+        return
+    # SQLite can't change a primary key in place
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE zone_readings RENAME TO zone_readings_old")
+        ZoneReading.__table__.create(conn)
+        conn.exec_driver_sql(
+            "INSERT INTO zone_readings (zone_id, ts, seq, vehicle_count) "
+            "SELECT zone_id, ts, 0, vehicle_count FROM zone_readings_old"
+        )
+        conn.exec_driver_sql("DROP TABLE zone_readings_old")
+
+def delete_statements(zone_id: int):
+    return [
+        (text("DELETE FROM zone_readings WHERE zone_id = :zone_id"), {"zone_id": zone_id}),
+        (text("DELETE FROM zone_rollups WHERE zone_id = :zone_id"), {"zone_id": zone_id}),
+    ]
+
+def prune(db: Session, now: float | None = None):
+    """Drops raw readings and rollup buckets that are past their retention."""
+    now = time.time() if now is None else now
+    db.execute(text("DELETE FROM zone_readings WHERE ts < :cutoff"), {"cutoff": int((now - RAW_RETENTION) * 1000)})
+    for resolution, retention in ROLLUP_RETENTION.items():
+        db.execute(
+            text("DELETE FROM zone_rollups WHERE resolution = :resolution AND bucket < :cutoff"),
+            {"resolution": resolution, "cutoff": int(now - retention)},
+        )
+    db.commit()
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhd]?)$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": DAY}
+
+def parse_duration(value: str) -> float:
+    """Parses ``"900"``, ``"15m"``, ``"1h"`` or ``"7d"`` into seconds."""
+    match = _DURATION.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration {value!r}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+def _fetch_array(db: Session, sql: str, params: tuple, columns: int) -> "np.ndarray":
+    """Runs ``sql`` on the raw DB-API cursor and packs the integer rows into an (n, columns) array.
+
+    Bypasses ORM and Row construction entirely; the flattened values are
+    streamed into one contiguous buffer by ``np.fromiter``.
+    """
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        values = np.fromiter(chain.from_iterable(cursor), dtype=np.int64)
+    finally:
+        cursor.close()
+    return values.reshape(-1, columns)
+
+def _summary(counts: "np.ndarray", percentiles: list) -> dict:
+    if counts.size == 0:
+        return {"samples": 0, "min": None, "max": None, "avg": None, "std": None, "percentiles": {}}
+    values = np.percentile(counts, percentiles) if percentiles else []
+    return {
+        "samples": int(counts.size),
+        "min": int(counts.min()),
+        "max": int(counts.max()),
+        "avg": float(counts.mean()),
+        "std": float(counts.std()),
+        "percentiles": {f"p{p:g}": float(v) for p, v in zip(percentiles, values)},
+    }
+
+def window_stats(db: Session, zone_id: int, window: float, percentiles: list, now: float | None = None) -> dict:
+    """min/max/avg/std/percentiles of one zone's raw readings over the last ``window`` seconds."""
+    now = time.time() if now is None else now
+    counts = _fetch_array(
+        db,
+        "SELECT vehicle_count FROM zone_readings WHERE zone_id = ? AND ts >= ?",
+        (zone_id, int((now - window) * 1000)),
+        1,
+    )[:, 0]
+    return {"zone_id": zone_id, "window_seconds": window, **_summary(counts, percentiles)}
+
+def all_zone_window_stats(db: Session, window: float, percentiles: list, now: float | None = None) -> list:
+    """Per-zone window statistics for every zone from one scan and one sort.
+
+    Rows are sorted by (zone, count) so each zone's readings form a
+    contiguous sorted run; min/max/sum come from ``reduceat`` over the run
+    boundaries and percentiles are read by index, with no per-row Python.
+    """
+    now = time.time() if now is None else now
+    rows = _fetch_array(
+        db,
+        "SELECT zone_id, vehicle_count FROM zone_readings WHERE ts >= ?",
+        (int((now - window) * 1000),),
+        2,
+    )
+    if rows.size == 0:
+        return []
+    rows = rows[np.lexsort((rows[:, 1], rows[:, 0]))]
+    zone_ids, starts, samples = np.unique(rows[:, 0], return_index=True, return_counts=True)
+    counts = rows[:, 1].astype(np.float64)
+    sums = np.add.reduceat(counts, starts)
+    squares = np.add.reduceat(counts * counts, starts)
+    avg = sums / samples
+    std = np.sqrt(np.maximum(squares / samples - avg * avg, 0.0))
+    mins = counts[starts]
+    maxs = counts[starts + samples - 1]
+    # Linear interpolation between closest ranks, as np.percentile does
+    quantiles = {}
+    for p in percentiles:
+        position = (samples - 1) * (p / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, samples - 1)
+        fraction = position - lower
+        quantiles[f"p{p:g}"] = counts[starts + lower] * (1 - fraction) + counts[starts + upper] * fraction
+    return [
+        {
+            "zone_id": int(zone_ids[i]),
+            "window_seconds": window,
+            "samples": int(samples[i]),
+            "min": int(mins[i]),
+            "max": int(maxs[i]),
+            "avg": float(avg[i]),
+            "std": float(std[i]),
+            "percentiles": {name: float(values[i]) for name, values in quantiles.items()},
+        }
+        for i in range(len(zone_ids))
+    ]
+
+def rollups(db: Session, zone_id: int, resolution: int, start: float, end: float) -> list:
+    """Downsampled buckets of one zone between ``start`` and ``end`` (epoch seconds)."""
+    rows = _fetch_array(
+        db,
+        "SELECT bucket, samples, total, min_count, max_count FROM zone_rollups "
+        "WHERE zone_id = ? AND resolution = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+        (zone_id, resolution, int(start) // resolution * resolution, int(end)),
+        5,
+    )
+    avg = rows[:, 2] / np.maximum(rows[:, 1], 1)
+    return [
+        {"bucket": int(b), "samples": int(n), "avg": float(a), "min": int(lo), "max": int(hi)}
+        for b, n, a, lo, hi in zip(rows[:, 0], rows[:, 1], avg, rows[:, 3], rows[:, 4])
+    ]
@@ -1,5 +1,6 @@
-from typing import Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
 
 class UserBase(BaseModel):
     username: str
@@ -21,6 +22,8 @@ class Token(BaseModel):
 class TrafficZoneBase(BaseModel):
     name: str
     vehicle_count: int
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class TrafficZoneCreate(TrafficZoneBase):
     pass
@@ -28,8 +31,83 @@ class TrafficZoneCreate(TrafficZoneBase):
 class TrafficZoneUpdate(BaseModel):
     name: Optional[str] = None
     vehicle_count: Optional[int] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class TrafficZone(TrafficZoneBase):
     id: int
     class Config:
-        from_attributes = True  # Changed from orm_mode in Pydantic V2
\ No newline at end of file
+        from_attributes = True  # Changed from orm_mode in Pydantic V2
+
+class NearbyZone(TrafficZone):
+    distance_m: Optional[float] = None  # set by radius and nearest queries
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: str  # "created", "updated" or "error"
+    id: Optional[int] = None
+    detail: Optional[Any] = None
+
+class BulkResult(BaseModel):
+    created: int
+    updated: int
+    skipped: int = 0
+    failed: int
+    items: List[BulkItemResult]
+
+class ReadingStats(BaseModel):
+    zone_id: int
+    window_seconds: float
+    samples: int
+    min: Optional[int] = None
+    max: Optional[int] = None
+    avg: Optional[float] = None
+    std: Optional[float] = None
+    percentiles: Dict[str, float]
+
+class ReadingRollup(BaseModel):
+    bucket: int  # bucket start, epoch seconds
+    samples: int
+    avg: float
+    min: int
+    max: int
+
+class ZoneAnalytics(BaseModel):
+    zone_id: int
+    samples: int
+    last_reading_at: float  # epoch seconds
+    vehicle_count: int  # latest reading
+    level: float  # time-decayed average
+    std: float
+    trend_per_minute: float
+    baseline: Optional[float] = None  # usual count at this time of day
+    score: float  # how unusual the latest reading is, in standard deviations
+    anomaly: bool
+    anomaly_since: Optional[float] = None  # epoch seconds
+    forecast: float  # expected count horizon_seconds from now
+    horizon_seconds: float
+
+class DashboardZone(TrafficZone):
+    congestion: str  # "High" or "Normal"
+    incident_count: int  # incidents reported at this zone within the window
+    last_incident_at: Optional[datetime] = None
+
+class DashboardIncident(BaseModel):
+    id: int
+    type: str
+    location: str
+    timestamp: datetime
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class DashboardTotals(BaseModel):
+    zones: int
+    vehicles: int
+    incidents: int  # within the window
+
+class Dashboard(BaseModel):
+    zones: List[DashboardZone]
+    recent_incidents: List[DashboardIncident]
+    totals: DashboardTotals
+    window_seconds: float
+    generated_at: datetime
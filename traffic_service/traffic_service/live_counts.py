@@ -0,0 +1,264 @@
+# live_counts.py
+# Live vehicle counts kept in a memory-mapped file so every uvicorn worker
+# shares one copy and a restart just maps the existing file. Counts live in
+# a flat int64 array indexed by zone slot, after a small header and one
+# write counter per shard. Zone names (in slot order) and intersection group
+# assignments are append-only sidecar logs whose lengths are published in
+# the header, so a worker only reads the entries added since it last looked.
+# Writers take a per-shard thread lock plus an fcntl byte-range lock, so
+# increments are safe across threads and processes.
+import fcntl
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+
+LIVE_COUNTS_PATH = os.environ.get(
+    "LIVE_COUNTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "live_counts.bin")
+)
+LIVE_COUNTS_CAPACITY = int(os.environ.get("LIVE_COUNTS_CAPACITY", "65536"))
+LIVE_COUNTS_SHARDS = int(os.environ.get("LIVE_COUNTS_SHARDS", "64"))
+LIVE_COUNTS_FLUSH_SECONDS = float(os.environ.get("LIVE_COUNTS_FLUSH_SECONDS", "5"))
+
+MAGIC = 0x31544E43564C  # "LVCNT1"
+HEADER_WORDS = 8
+_MAGIC, _CAPACITY, _SHARDS, _ZONES, _GROUPS = range(5)
+# fcntl locks are taken on bytes past the data so they never alias a slot
+_LOCK_BASE = 1 << 40
+_ALLOC_LOCK = _LOCK_BASE - 1
+
+class StoreFull(Exception):
+    pass
+
+class GroupFull(Exception):
+    pass
+
+class _AppendLog:
+    """A file of JSON lines that is only ever appended to, read incrementally.
+
+    Callers serialize appends (the store's allocation lock); readers only
+    take complete lines, so they never see half of an entry being written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offset = 0
+
+    def repair(self):
+        """Cuts off a partial last line left by a writer that died mid-append."""
+        try:
+            with open(self.path, "rb+") as f:
+                data = f.read()
+                f.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def read_new(self) -> list:
+        """Entries appended since the last call."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        return [json.loads(line) for line in data[:end].splitlines()]
+
+    def append(self, entry):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, json.dumps(entry).encode() + b"\n")
+        finally:
+            os.close(fd)
+
+class LiveCountStore:
+    def __init__(self, path: str = LIVE_COUNTS_PATH, capacity: int = LIVE_COUNTS_CAPACITY, shards: int = LIVE_COUNTS_SHARDS):
+        self.path = path
+        self.sidecar = path + ".zones.log"
+        self.groups_sidecar = path + ".groups.log"
+        self._zone_log = _AppendLog(self.sidecar)
+        self._group_log = _AppendLog(self.groups_sidecar)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._alloc_thread_lock = threading.Lock()
+        with self._alloc_locked():
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, (HEADER_WORDS + shards + capacity) * 8)
+                data = np.memmap(path, dtype=np.int64, mode="r+")
+                data[_MAGIC], data[_CAPACITY], data[_SHARDS] = MAGIC, capacity, shards
+                data.flush()
+            else:
+                data = np.memmap(path, dtype=np.int64, mode="r+")
+                if data[_MAGIC] != MAGIC:
+                    raise ValueError(f"{path} is not a live count store")
+        # Capacity and shard count come from the file, so every worker agrees
+        self.shards = int(data[_SHARDS])
+        self._thread_locks = [threading.Lock() for _ in range(self.shards)]
+        self._data = data
+        self._header = data[:HEADER_WORDS]
+        self._versions = data[HEADER_WORDS:HEADER_WORDS + self.shards]
+        self._counts = data[HEADER_WORDS + self.shards:HEADER_WORDS + self.shards + int(data[_CAPACITY])]
+        self._slots = {}
+        self._names = []
+        self._groups = {}
+        self._group_sizes = Counter()
+        self._group_entries = 0
+        with self._alloc_locked():
+            self._import_json_sidecars()
+            self._zone_log.repair()
+            self._group_log.repair()
+            self._load_zones()
+            self._load_groups()
+            # The logs are authoritative, e.g. after a writer died between
+            # appending and updating the header
+            self._header[_ZONES] = len(self._slots)
+            self._header[_GROUPS] = self._group_entries
+
+    # --- Locking ---
+    @contextmanager
+    def _locked(self, thread_lock, offset: int):
+        with thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+
+    def _shard_locked(self, slot: int):
+        shard = slot % self.shards
+        return self._locked(self._thread_locks[shard], _LOCK_BASE + shard)
+
+    def _alloc_locked(self):
+        return self._locked(self._alloc_thread_lock, _ALLOC_LOCK)
+
+    def _import_json_sidecars(self):
+        """Converts the JSON sidecars older stores were written with into logs."""
+        for old, log, entries in (
+            (self.path + ".zones.json", self._zone_log, lambda slots: sorted(slots, key=slots.get)),
+            (self.path + ".groups.json", self._group_log, lambda groups: [list(item) for item in groups.items()]),
+        ):
+            if os.path.exists(old) and not os.path.exists(log.path):
+                with open(old) as f:
+                    lines = [json.dumps(entry) + "\n" for entry in entries(json.load(f))]
+                with open(log.path + ".tmp", "w") as f:
+                    f.writelines(lines)
+                os.replace(log.path + ".tmp", log.path)
+                os.remove(old)
+
+    # --- Zone slots ---
+    def _load_zones(self):
+        """Reads zone names other workers appended; a zone's slot is its line number."""
+        for name in self._zone_log.read_new():
+            self._slots[name] = len(self._names)
+            self._names.append(name)
+
+    def _refresh(self):
+        """Picks up zones that other workers added since we last looked."""
+        if int(self._header[_ZONES]) != len(self._slots):
+            with self._alloc_locked():
+                self._load_zones()
+
+    def slot(self, zone: str, create: bool = False) -> int | None:
+        self._refresh()
+        slot = self._slots.get(zone)
+        if slot is not None or not create:
+            return slot
+        with self._alloc_locked():
+            self._load_zones()
+            if zone in self._slots:
+                return self._slots[zone]
+            slot = len(self._slots)
+            if slot >= len(self._counts):
+                raise StoreFull(f"Live count store is full ({len(self._counts)} zones)")
+            self._zone_log.append(zone)
+            self._load_zones()
+            # Published only after the sidecar names it
+            self._header[_ZONES] = slot + 1
+        return slot
+
+    def __contains__(self, zone: str) -> bool:
+        return self.slot(zone) is not None
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._slots)
+
+    # --- Intersection groups ---
+    def _load_groups(self):
+        """Applies group assignments other workers appended; the latest one per zone wins."""
+        for zone, group in self._group_log.read_new():
+            if zone in self._groups:
+                self._group_sizes[self._groups[zone]] -= 1
+            self._groups[zone] = group
+            self._group_sizes[group] += 1
+            self._group_entries += 1
+
+    def assign_group(self, zone: str, group: str, max_members: int | None = None):
+        """Saves ``zone``'s intersection group for every worker and across restarts.
+
+        Raises GroupFull when ``group`` already has ``max_members`` other zones.
+        """
+        with self._alloc_locked():
+            self._load_groups()
+            if self._groups.get(zone) == group:
+                return
+            if max_members is not None and self._group_sizes[group] >= max_members:
+                raise GroupFull(f"Group {group!r} already has {max_members} zones")
+            self._group_log.append([zone, group])
+            self._load_groups()
+            self._header[_GROUPS] = self._group_entries
+
+    def groups_version(self) -> int:
+        """Bumped by every group assignment, by any worker."""
+        return int(self._header[_GROUPS])
+
+    def groups(self) -> dict:
+        """Zone -> intersection group, for zones that were assigned one."""
+        if self.groups_version() != self._group_entries:
+            with self._alloc_locked():
+                self._load_groups()
+        return dict(self._groups)
+
+    # --- Counts ---
+    def get(self, zone: str) -> int | None:
+        slot = self.slot(zone)
+        return None if slot is None else int(self._counts[slot])
+
+    def set(self, zone: str, value: int) -> int:
+        slot = self.slot(zone, create=True)
+        with self._shard_locked(slot):
+            self._counts[slot] = value
+            self._versions[slot % self.shards] += 1
+        return value
+
+    def increment(self, zone: str, by: int = 1) -> int:
+        slot = self.slot(zone, create=True)
+        with self._shard_locked(slot):
+            self._counts[slot] += by
+            value = int(self._counts[slot])
+            self._versions[slot % self.shards] += 1
+        return value
+
+    def version(self) -> int:
+        """Total writes so far; lets readers skip work when nothing changed."""
+        return int(self._versions.sum())
+
+    def snapshot(self):
+        """Zone names and a copy of their counts, read without locking."""
+        self._refresh()
+        names = list(self._names)
+        return names, np.array(self._counts[:len(names)])
+
+    def items(self) -> list:
+        names, counts = self.snapshot()
+        return list(zip(names, counts.tolist()))
+
+    def flush(self):
+        """Writes dirty pages of the shared mapping back to disk."""
+        self._data.flush()
+
+    def close(self):
+        self.flush()
+        os.close(self._fd)
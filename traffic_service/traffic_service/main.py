@@ -1,11 +1,60 @@
 from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
 from typing import List
 from pydantic import BaseModel
+import asyncio
+import numpy as np
+from live_counts import LIVE_COUNTS_FLUSH_SECONDS, GroupFull, LiveCountStore
+from signal_plan import MAX_PHASES, SignalPlanner
 
-app = FastAPI()
+# Live counts are shared by every worker through a memory-mapped file;
+# the defaults below only seed a brand new store
+DEFAULT_TRAFFIC = {"A": 75, "B": 60, "C": 80}
+traffic_data = LiveCountStore()
+if len(traffic_data) == 0:
+    for zone, count in DEFAULT_TRAFFIC.items():
+        traffic_data.set(zone, count)
 
-# In-memory data (replace with database later)
-traffic_data = {"A": 75, "B": 60, "C": 80}
+async def flush_periodically():
+    while True:
+        await asyncio.sleep(LIVE_COUNTS_FLUSH_SECONDS)
+        await asyncio.to_thread(traffic_data.flush)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flusher = asyncio.create_task(flush_periodically())
+    yield
+    flusher.cancel()
+    traffic_data.flush()
+
+app = FastAPI(lifespan=lifespan)
+
+# Signal timings are planned for all zones together and cached until a count
+# or group changes; counts and groups written by other workers are picked up
+# before each read
+planner = SignalPlanner()
+_planned = {"version": -1, "names": [], "counts": np.zeros(0, dtype=np.int64), "groups_version": -1, "groups": {}}
+
+def sync_planner():
+    version = traffic_data.version()
+    groups_version = traffic_data.groups_version()
+    if version == _planned["version"] and groups_version == _planned["groups_version"]:
+        return
+    names, counts = traffic_data.snapshot()
+    seen = _planned["counts"]
+    changed = np.ones(len(counts), dtype=bool)
+    changed[:len(seen)] = counts[:len(seen)] != seen
+    changed = np.flatnonzero(changed)
+    if len(changed):
+        planner.observe_many([names[index] for index in changed.tolist()], counts[changed])
+    # Counts first, so a zone enters the planner with its flow rather than none
+    groups = traffic_data.groups() if groups_version != _planned["groups_version"] else _planned["groups"]
+    known = set(names)
+    for zone, group in groups.items():
+        if zone in known and _planned["groups"].get(zone) != group:
+            planner.assign(zone, group)
+    _planned.update(version=version, names=names, counts=counts, groups_version=groups_version,
+                    groups={zone: group for zone, group in groups.items() if zone in known})
 
 class TrafficData(BaseModel):
     zone: str
@@ -14,33 +63,50 @@ class TrafficData(BaseModel):
 @app.get("/traffic/", response_model=List[TrafficData])
 async def get_all_traffic():
     """Gets traffic data for all zones."""
-    return [TrafficData(zone=k, vehicle_count=v) for k, v in traffic_data.items()]
+    return [{"zone": k, "vehicle_count": v} for k, v in traffic_data.items()]
 
 @app.get("/traffic/{zone}", response_model=TrafficData)
 async def get_traffic(zone: str):
     """Gets traffic data for a specific zone."""
-    if zone not in traffic_data:
+    count = traffic_data.get(zone)
+    if count is None:
         raise HTTPException(status_code=404, detail="Zone not found")
-    return TrafficData(zone=zone, vehicle_count=traffic_data[zone])
+    return TrafficData(zone=zone, vehicle_count=count)
 
 @app.put("/traffic/{zone}", response_model=TrafficData)
-async def update_traffic(zone: str, vehicle_count: int):
-    """Updates traffic data for a specific zone."""
+async def update_traffic(zone: str, vehicle_count: int, group: str | None = None):
+    """Updates traffic data for a specific zone, optionally assigning its intersection group."""
     if zone not in traffic_data:
         raise HTTPException(status_code=404, detail="Zone not found")
-    traffic_data[zone] = vehicle_count
-    return TrafficData(zone=zone, vehicle_count=traffic_data[zone])
+    if group is not None:
+        try:
+            traffic_data.assign_group(zone, group, max_members=MAX_PHASES)
+        except GroupFull as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+    traffic_data.set(zone, vehicle_count)
+    return TrafficData(zone=zone, vehicle_count=vehicle_count)
+
+@app.post("/traffic/{zone}/increment", response_model=TrafficData)
+async def increment_traffic(zone: str, by: int = 1):
+    """Atomically adds to a zone's count (negative values subtract)."""
+    if zone not in traffic_data:
+        raise HTTPException(status_code=404, detail="Zone not found")
+    return TrafficData(zone=zone, vehicle_count=traffic_data.increment(zone, by))
 
 @app.get("/signal/{zone}")
 async def get_signal_status(zone: str):
     """Gets the signal status for a zone."""
-    if zone not in traffic_data:
+    sync_planner()
+    status = planner.status(zone)
+    if status is None:
         raise HTTPException(status_code=404, detail="Zone not found")
-    count = traffic_data[zone]
-    if count > 70:
-        return {"zone": zone, "signal": "Red", "duration": 45}
-    else:
-        return {"zone": zone, "signal": "Green", "duration": 30}
+    return status
+
+@app.get("/signals")
+async def get_signal_plan(group: str | None = None):
+    """Gets the cycle length and green splits of every intersection group (or one)."""
+    sync_planner()
+    return planner.groups(group)
 
 @app.get("/status")
 async def get_service_status():
@@ -0,0 +1,206 @@
+# signal_plan.py
+# Webster-style signal timing for every intersection group at once. Each
+# zone is one phase (approach) of its group; the plan for the whole city is
+# a handful of NumPy array operations, so re-planning thousands of zones
+# takes milliseconds and per-zone lookups just index into the cached plan.
+import os
+import threading
+import time
+import numpy as np
+
+# Counts are vehicles observed per COUNT_INTERVAL_SECONDS; flows are veh/hour
+COUNT_INTERVAL_SECONDS = float(os.environ.get("SIGNAL_COUNT_INTERVAL_SECONDS", "900"))
+SATURATION_FLOW = float(os.environ.get("SIGNAL_SATURATION_FLOW", "1800"))  # veh/hour of green
+LOST_TIME_PER_PHASE = float(os.environ.get("SIGNAL_LOST_TIME_SECONDS", "4"))
+MIN_GREEN = float(os.environ.get("SIGNAL_MIN_GREEN_SECONDS", "7"))
+MIN_CYCLE = float(os.environ.get("SIGNAL_MIN_CYCLE_SECONDS", "30"))
+MAX_CYCLE = float(os.environ.get("SIGNAL_MAX_CYCLE_SECONDS", "180"))
+# Weight of the newest count in the smoothed "recent flow" of a zone
+FLOW_SMOOTHING = float(os.environ.get("SIGNAL_FLOW_SMOOTHING", "0.5"))
+# Most phases one group can have while each still gets MIN_GREEN within MAX_CYCLE
+MAX_PHASES = max(1, int(MAX_CYCLE // (MIN_GREEN + LOST_TIME_PER_PHASE)))
+
+def webster_plan(group_index: np.ndarray, flow: np.ndarray, n_groups: int,
+                 saturation_flow=SATURATION_FLOW, lost_time=LOST_TIME_PER_PHASE,
+                 min_green=MIN_GREEN, min_cycle=MIN_CYCLE, max_cycle=MAX_CYCLE):
+    """Cycle length per group and green time and start offset per phase.
+
+    ``group_index[i]`` is the group of phase ``i`` and ``flow[i]`` its demand
+    in veh/hour. Webster's optimum cycle is ``(1.5 L + 5) / (1 - Y)`` where
+    ``L`` is the group's lost time and ``Y`` the sum of its flow ratios;
+    effective green is split in proportion to each phase's flow ratio.
+    Near-saturated groups (``Y >= 0.95``) run at ``max_cycle``, and no
+    cycle is ever longer; a group with too many phases to give each
+    ``min_green`` within it splits its green evenly instead.
+    """
+    ratio = np.minimum(flow / saturation_flow, 1.0)
+    phases = np.bincount(group_index, minlength=n_groups)
+    total_ratio = np.bincount(group_index, weights=ratio, minlength=n_groups)
+    lost = phases * lost_time
+    cycle = np.where(total_ratio < 0.95, (1.5 * lost + 5) / (1 - np.minimum(total_ratio, 0.95)), max_cycle)
+    # Every phase must fit at least its minimum green plus its lost time
+    shortest = np.maximum(min_cycle, phases * (min_green + lost_time))
+    cycle = np.minimum(np.maximum(cycle, shortest), max_cycle)
+
+    # Minimum green for every phase, the rest split by flow ratio (evenly when idle)
+    effective = np.maximum(cycle - lost, 0.0)
+    phase_min = np.minimum(min_green, effective / np.maximum(phases, 1))
+    spare = (effective - phases * phase_min)[group_index]
+    group_ratio = total_ratio[group_index]
+    share = np.divide(ratio, group_ratio, out=1.0 / phases[group_index], where=group_ratio > 0)
+    green = phase_min[group_index] + spare * share
+
+    # Phases of a group run back to back in index order: a phase starts
+    # after the green + lost time of the group's earlier phases
+    order = np.argsort(group_index, kind="stable")
+    sorted_groups = group_index[order]
+    slot = (green + lost_time)[order]
+    running = np.cumsum(slot) - slot
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    offset = np.empty_like(green)
+    offset[order] = running - np.maximum.accumulate(np.where(first, running, 0.0))
+    return cycle, green, offset, total_ratio
+
+class SignalPlanner:
+    """Holds smoothed zone flows and a plan recomputed lazily after changes.
+
+    A zone that was never assigned a group is planned as an intersection of
+    its own, reported with group None.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zones = {}  # zone -> index into the arrays below
+        self._names = []
+        self._groups = {}  # group name, or (None, zone) for an ungrouped zone -> group index
+        self._group_names = []
+        # Grown by doubling; only the first len(self._names) entries are zones
+        self._group_index = np.zeros(0, dtype=np.int64)
+        self._flow = np.zeros(0)
+        self._plan = None
+
+    def observe(self, zone: str, vehicle_count: int, group: str | None = None):
+        """Records a new count for ``zone``, optionally moving it to ``group``."""
+        with self._lock:
+            if group is not None and zone in self._zones:
+                self._group_index[self._zones[zone]] = self._group_id(group)
+            self._observe([zone], np.array([vehicle_count]), group)
+
+    def observe_many(self, zones: list, vehicle_counts: np.ndarray):
+        """Records new counts for many zones at once; ``vehicle_counts[i]`` belongs to ``zones[i]``."""
+        with self._lock:
+            self._observe(zones, np.asarray(vehicle_counts))
+
+    def _observe(self, zones: list, vehicle_counts: np.ndarray, group: str | None = None):
+        flow = vehicle_counts * 3600.0 / COUNT_INTERVAL_SECONDS
+        indexes = np.empty(len(zones), dtype=np.int64)
+        new = np.zeros(len(zones), dtype=bool)
+        for i, zone in enumerate(zones):
+            index = self._zones.get(zone)
+            if index is None:
+                index, new[i] = self._add_zone(zone, group), True
+            indexes[i] = index
+        # A new zone starts at its first count rather than smoothing up from zero
+        self._flow[indexes] = np.where(new, flow, FLOW_SMOOTHING * flow + (1 - FLOW_SMOOTHING) * self._flow[indexes])
+        self._plan = None
+
+    def assign(self, zone: str, group: str):
+        """Moves ``zone`` to intersection ``group``, adding it with no flow if it is new."""
+        with self._lock:
+            index = self._zones.get(zone)
+            if index is None:
+                self._add_zone(zone, group)
+            else:
+                self._group_index[index] = self._group_id(group)
+            self._plan = None
+
+    def _group_id(self, group) -> int:
+        if group not in self._groups:
+            self._groups[group] = len(self._group_names)
+            self._group_names.append(group)
+        return self._groups[group]
+
+    def _add_zone(self, zone: str, group: str | None) -> int:
+        index = len(self._names)
+        if index == len(self._flow):
+            capacity = max(16, 2 * index)
+            self._group_index = np.concatenate([self._group_index, np.zeros(capacity - index, dtype=np.int64)])
+            self._flow = np.concatenate([self._flow, np.zeros(capacity - index)])
+        self._zones[zone] = index
+        self._names.append(zone)
+        self._group_index[index] = self._group_id((None, zone) if group is None else group)
+        self._flow[index] = 0.0
+        return index
+
+    def _group_name(self, g: int) -> str | None:
+        group = self._group_names[g]
+        return group if isinstance(group, str) else None
+
+    def plan(self):
+        """The current plan, recomputed only if a count changed since the last call."""
+        with self._lock:
+            if self._plan is None:
+                n = len(self._names)
+                cycle, green, offset, ratio = webster_plan(self._group_index[:n], self._flow[:n], len(self._group_names))
+                self._plan = {
+                    "group_index": self._group_index[:n].copy(),
+                    "flow": self._flow[:n].copy(),
+                    "cycle": cycle,
+                    "green": green,
+                    "offset": offset,
+                    "ratio": ratio,
+                }
+            return self._plan
+
+    def groups(self, group: str | None = None) -> list:
+        """Every group's cycle and phase timings, or just ``group``'s."""
+        plan = self.plan()
+        wanted = range(len(self._group_names)) if group is None else [self._groups[group]] if group in self._groups else []
+        by_group = {g: [] for g in wanted}
+        for index, g in enumerate(plan["group_index"].tolist()):
+            if g in by_group:
+                by_group[g].append(self._phase(plan, index))
+        # Groups whose zones all moved elsewhere are left out
+        return [
+            {
+                "group": self._group_name(g),
+                "cycle": round(float(plan["cycle"][g]), 1),
+                "flow_ratio": round(float(plan["ratio"][g]), 3),
+                "phases": phases,
+            }
+            for g, phases in by_group.items()
+            if phases
+        ]
+
+    def _phase(self, plan, index: int) -> dict:
+        return {
+            "zone": self._names[index],
+            "flow": round(float(plan["flow"][index]), 1),
+            "green": round(float(plan["green"][index]), 1),
+            "offset": round(float(plan["offset"][index]), 1),
+        }
+
+    def status(self, zone: str, now: float | None = None) -> dict | None:
+        """Current light and seconds until it changes, read from the cached plan."""
+        index = self._zones.get(zone)
+        if index is None:
+            return None
+        plan = self.plan()
+        g = int(plan["group_index"][index])
+        cycle = float(plan["cycle"][g])
+        green = float(plan["green"][index])
+        start = float(plan["offset"][index])
+        position = ((time.time() if now is None else now) - start) % cycle
+        if position < green:
+            signal, duration = "Green", green - position
+        else:
+            signal, duration = "Red", cycle - position
+        return {
+            "zone": zone,
+            "group": self._group_name(g),
+            "signal": signal,
+            "duration": int(round(duration)),
+            "green": round(green, 1),
+            "cycle": round(cycle, 1),
+        }
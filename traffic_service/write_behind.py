@@ -0,0 +1,170 @@
+# traffic_service/write_behind.py
+# Opt-in write-behind for vehicle counts (ZONE_WRITE_BEHIND=1). A PUT that
+# only changes vehicle_count lands in an in-memory buffer keyed by zone,
+# last write wins, and a background thread writes the buffer out every
+# ZONE_FLUSH_INTERVAL_MS, or as soon as ZONE_FLUSH_MAX_PENDING readings are
+# waiting, in one transaction. Zone reads overlay the buffered counts, so
+# they never go back in time; shutdown flushes whatever is left.
+import logging
+import os
+import threading
+from sqlalchemy import text
+from . import readings
+from .caches import dashboard_cache, zone_cache
+from .database import SessionLocal
+
+ZONE_WRITE_BEHIND = os.environ.get("ZONE_WRITE_BEHIND", "0") == "1"
+ZONE_FLUSH_INTERVAL_MS = float(os.environ.get("ZONE_FLUSH_INTERVAL_MS", "50"))
+ZONE_FLUSH_MAX_PENDING = int(os.environ.get("ZONE_FLUSH_MAX_PENDING", "1000"))
+
+UPDATE_COUNT = text("UPDATE traffic_zones SET vehicle_count = :vehicle_count WHERE id = :zone_id")
+
+logger = logging.getLogger(__name__)
+
+class ZoneCountBuffer:
+    """Buffered vehicle counts waiting to be written, plus the readings that produced them.
+
+    Every accepted count is kept as a reading for the history tables, but
+    only the latest count per zone is written to traffic_zones. A batch
+    being flushed stays visible to ``count`` until it has committed.
+    """
+
+    def __init__(self, enabled: bool = ZONE_WRITE_BEHIND, interval_ms: float = ZONE_FLUSH_INTERVAL_MS,
+                 max_pending: int = ZONE_FLUSH_MAX_PENDING, session_factory=SessionLocal):
+        self.enabled = enabled
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time, so batches commit in order
+        self._pending = {}  # zone id -> latest count
+        self._readings = []  # (zone id, ts ms, count) in arrival order
+        self._flushing = {}  # the batch being written, still served to readers
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.accepted = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+
+    # --- Writes ---
+    def put(self, zone_id: int, vehicle_count: int):
+        with self._lock:
+            self._pending[zone_id] = vehicle_count
+            self._readings.append((zone_id, readings.now_ms(), vehicle_count))
+            self.accepted += 1
+            full = len(self._readings) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def discard(self, zone_id: int):
+        """Drops buffered counts of a deleted zone."""
+        with self._lock:
+            self._pending.pop(zone_id, None)
+            self._readings = [reading for reading in self._readings if reading[0] != zone_id]
+
+    # --- Reads ---
+    def count(self, zone_id: int) -> int | None:
+        """The buffered count of ``zone_id``, or None when the database is current."""
+        with self._lock:
+            count = self._pending.get(zone_id)
+            return self._flushing.get(zone_id) if count is None else count
+
+    def overlay_rows(self, rows, fields: tuple) -> list:
+        """``rows`` (tuples in ``fields`` order) with buffered counts swapped in."""
+        with self._lock:
+            if not self._pending and not self._flushing:
+                return rows
+            buffered = {**self._flushing, **self._pending}
+        id_at, count_at = fields.index("id"), fields.index("vehicle_count")
+        overlaid = []
+        for row in rows:
+            count = buffered.get(row[id_at])
+            if count is not None:
+                row = list(row)
+                row[count_at] = count
+            overlaid.append(row)
+        return overlaid
+
+    def overlay_chunks(self, chunks, fields: tuple):
+        for rows in chunks:
+            yield self.overlay_rows(rows, fields)
+
+    def overlay_records(self, records: list) -> list:
+        """Dict rows (geo query results) with buffered counts swapped in."""
+        with self._lock:
+            if not self._pending and not self._flushing:
+                return records
+            buffered = {**self._flushing, **self._pending}
+        return [
+            {**record, "vehicle_count": buffered[record["id"]]} if record["id"] in buffered else record
+            for record in records
+        ]
+
+    # --- Flushing ---
+    def flush(self) -> int:
+        """Writes the buffer out in one transaction; returns the number of zones written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._readings:
+                    return 0
+                batch, batch_readings = self._pending, self._readings
+                self._pending, self._readings, self._flushing = {}, [], batch
+            try:
+                with self.session_factory() as db:
+                    db.execute(UPDATE_COUNT, [{"zone_id": zone_id, "vehicle_count": count} for zone_id, count in batch.items()])
+                    readings.record_readings(db, batch_readings)
+                    db.commit()
+            except Exception:
+                # Put the batch back behind anything newer and retry on the next tick
+                with self._lock:
+                    self._pending = {**batch, **self._pending}
+                    self._readings = batch_readings + self._readings
+                    self._flushing = {}
+                    self.failed_flushes += 1
+                logger.exception("Flushing %d buffered zone counts failed", len(batch))
+                return 0
+            with self._lock:
+                self._flushing = {}
+                self.flushes += 1
+                self.flushed_rows += len(batch)
+        # This worker's reads already showed these counts, but other workers
+        # may have cached the rows as they were before the flush
+        zone_cache.invalidate()
+        dashboard_cache.invalidate()
+        return len(batch)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="zone-write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the flusher and writes out everything still buffered."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending_zones": len(self._pending),
+                "pending_readings": len(self._readings),
+                "accepted": self.accepted,
+                "flushes": self.flushes,
+                "flushed_rows": self.flushed_rows,
+                "failed_flushes": self.failed_flushes,
+            }
+
+zone_buffer = ZoneCountBuffer()
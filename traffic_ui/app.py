@@ -1,10 +1,28 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, session, stream_with_context
+import os
 import requests
+from urllib.parse import urlencode
+from backend_client import BACKEND_CONNECT_TIMEOUT, client_for, etag_cache, fan_out, register_backend
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # Important for session management
-FASTAPI_URL = 'http://127.0.0.1:8001'
-INCIDENT_SERVICE_URL = "http://127.0.0.1:8002"
+FASTAPI_URL = os.environ.get('TRAFFIC_SERVICE_URL', 'http://127.0.0.1:8001')
+INCIDENT_SERVICE_URL = os.environ.get('INCIDENT_SERVICE_URL', "http://127.0.0.1:8002")
+
+# One keep-alive connection pool per backend service
+traffic_backend = register_backend(FASTAPI_URL)
+incident_backend = register_backend(INCIDENT_SERVICE_URL)
+
+# Pages subscribe to the services' change streams instead of needing a reload
+LIVE_UPDATES = os.environ.get('UI_LIVE_UPDATES', '0') == '1'
+LIVE_STREAM_URLS = {
+    'zones': f'{FASTAPI_URL}/zones/stream',
+    'incidents': f'{INCIDENT_SERVICE_URL}/incidents/stream',
+}
+
+@app.context_processor
+def inject_live_updates():
+    return {'live_updates': LIVE_UPDATES}
 
 def get_access_token():
     return session.get('access_token')
@@ -22,8 +40,9 @@ def signup():
         username = request.form['username']
         password = request.form['password']
         signup_url = f'{FASTAPI_URL}/auth/signup'
+        response = None
         try:
-            response = requests.post(signup_url, json={'username': username, 'password': password})
+            response = traffic_backend.request('POST', signup_url, json={'username': username, 'password': password})
             response.raise_for_status()
             return redirect(url_for('login'))
         except requests.exceptions.RequestException as e:
@@ -39,8 +58,9 @@ def login():
         username = request.form['username']
         password = request.form['password']
         token_url = f'{FASTAPI_URL}/token'
+        response = None
         try:
-            response = requests.post(token_url, data={'username': username, 'password': password})
+            response = traffic_backend.request('POST', token_url, data={'username': username, 'password': password})
             response.raise_for_status()
             token_data = response.json()
             set_access_token(token_data['access_token'])
@@ -61,28 +81,80 @@ def make_api_request(url, method='GET', json=None):
     access_token = get_access_token()
     if access_token:
         headers['Authorization'] = f'Bearer {access_token}'
+    # GETs are conditional: a 304 means our cached copy is still current
+    cache_key = (url, access_token)
+    cached = etag_cache.lookup(cache_key) if method == 'GET' else None
+    if cached is not None:
+        headers['If-None-Match'] = cached[0]
+    response = None
     try:
-        if method == 'GET':
-            response = requests.get(url, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, headers=headers, json=json)
-        elif method == 'PUT':
-            response = requests.put(url, headers=headers, json=json)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=headers)
+        response = client_for(url).request(method, url, headers=headers, json=json)
+        if cached is not None and response.status_code == 304:
+            return cached[1]
         response.raise_for_status()
-        return response.json()
+        data = response.json()
+        if method == 'GET' and 'ETag' in response.headers:
+            etag_cache.store(cache_key, response.headers['ETag'], data)
+        return data
     except requests.exceptions.RequestException as e:
         if response is not None and response.status_code == 401:
             return {'detail': 'Not authenticated'}
         raise
 
+def fetch_recent_incidents(limit=5):
+    try:
+        return make_api_request(f"{INCIDENT_SERVICE_URL}/incidents/?limit={limit}")['items']
+    except requests.exceptions.RequestException:
+        return []  # the zones page still renders if the incident service is down
+
+@app.route('/live/<channel>')
+def live_events(channel):
+    """Relays a backend Server-Sent Events stream so the browser stays same-origin and the token stays server-side."""
+    if not LIVE_UPDATES or channel not in LIVE_STREAM_URLS:
+        abort(404)
+    url = LIVE_STREAM_URLS[channel]
+    headers = {}
+    access_token = get_access_token()
+    if access_token:
+        headers['Authorization'] = f'Bearer {access_token}'
+    if request.headers.get('Last-Event-ID'):
+        headers['Last-Event-ID'] = request.headers['Last-Event-ID']
+    try:
+        upstream = client_for(url).request('GET', url, headers=headers, stream=True, timeout=(BACKEND_CONNECT_TIMEOUT, None))
+    except requests.exceptions.RequestException:
+        abort(502)
+    if upstream.status_code != 200:
+        upstream.close()
+        abort(upstream.status_code)
+
+    def relay():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(relay()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 @app.route('/zones')
 def list_zones():
-    result = make_api_request(f'{FASTAPI_URL}/zones/')
+    # Both backends are queried at the same time
+    result, recent_incidents = fan_out(
+        lambda: make_api_request(f'{FASTAPI_URL}/zones/'),
+        fetch_recent_incidents,
+    )
     if isinstance(result, dict) and 'detail' in result and result['detail'] == 'Not authenticated':
         return redirect(url_for('login'))
-    return render_template('zones/list.html', zones=result)
+    return render_template('zones/list.html', zones=result, recent_incidents=recent_incidents)
+
+@app.route('/dashboard')
+def dashboard():
+    # Zones, their congestion, per-zone incident counts and the newest incidents in one backend call
+    params = {key: request.args[key] for key in ('skip', 'limit', 'window') if request.args.get(key)}
+    data = make_api_request(f'{FASTAPI_URL}/dashboard?{urlencode(params)}')
+    if data.get('detail') == 'Not authenticated':
+        return redirect(url_for('login'))
+    return render_template('dashboard.html', dashboard=data, window=params.get('window', '1h'))
 
 @app.route('/zones/create', methods=['GET', 'POST'])
 def create_zone():
@@ -131,8 +203,12 @@ def delete_zone(zone_id):
 
 @app.route('/incidents')
 def incidents():
-    incidents_data = make_api_request(f"{INCIDENT_SERVICE_URL}/incidents/")
-    return render_template('incidents.html', incident_data=incidents_data)
+    # One page at a time; the service hands back the cursor for the next page
+    params = {key: request.args[key] for key in ('cursor', 'type', 'location') if request.args.get(key)}
+    page = make_api_request(f"{INCIDENT_SERVICE_URL}/incidents/?{urlencode(params)}")
+    filters = {key: value for key, value in params.items() if key != 'cursor'}
+    return render_template('incidents.html', incident_data=page['items'],
+                           next_cursor=page.get('next_cursor'), filters=filters)
 
 @app.route('/incidents/edit/<int:incident_id>', methods=['GET'])
 def edit_incident(incident_id):
@@ -0,0 +1,104 @@
+# traffic_ui/backend_client.py
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from flask import copy_current_request_context
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BACKEND_CONNECT_TIMEOUT = float(os.environ.get("UI_BACKEND_CONNECT_TIMEOUT", "3.05"))
+BACKEND_READ_TIMEOUT = float(os.environ.get("UI_BACKEND_READ_TIMEOUT", "10"))
+BACKEND_RETRIES = int(os.environ.get("UI_BACKEND_RETRIES", "2"))
+BACKEND_POOL_SIZE = int(os.environ.get("UI_BACKEND_POOL_SIZE", "20"))
+FAN_OUT_WORKERS = int(os.environ.get("UI_FAN_OUT_WORKERS", "8"))
+ETAG_CACHE_SIZE = int(os.environ.get("UI_ETAG_CACHE_SIZE", "256"))
+
+class BackendClient:
+    """Keep-alive HTTP client for one backend service.
+
+    A persistent ``requests.Session`` reuses pooled connections instead of a
+    new TCP handshake per call. Idempotent requests are retried on connection
+    errors and 502/503/504. Every request gets a timeout.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = BACKEND_POOL_SIZE, retries: int = BACKEND_RETRIES,
+                 timeout=(BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT)):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.1,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if not url.startswith(('http://', 'https://')):
+            url = f"{self.base_url}/{url.lstrip('/')}"
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+class ETagCache:
+    """Last ETag and decoded body per (url, access token), for conditional GETs.
+
+    When a backend answers ``304 Not Modified`` the cached body is reused,
+    so an unchanged page costs neither a query nor a body transfer.
+    """
+
+    def __init__(self, maxsize: int = ETAG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key, etag: str, data):
+        with self._lock:
+            self._entries[key] = (etag, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+etag_cache = ETagCache()
+_clients = {}
+_fan_out_executor = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix='ui-fan-out')
+
+def register_backend(base_url: str) -> BackendClient:
+    client = BackendClient(base_url)
+    _clients[client.base_url] = client
+    return client
+
+def client_for(url: str) -> BackendClient:
+    """Returns the pooled client of the backend ``url`` points at."""
+    for base_url, client in _clients.items():
+        if url.startswith(base_url):
+            return client
+    # Unknown backends still get a pooled client, created on first use
+    scheme, _, rest = url.partition('://')
+    return register_backend(f"{scheme}://{rest.split('/', 1)[0]}")
+
+def fan_out(*calls):
+    """Runs zero-argument callables concurrently and returns their results in order.
+
+    Each call runs with a copy of the current Flask request context, so it
+    can still read the session (and with it the access token). Page latency
+    becomes that of the slowest backend rather than the sum of all of them.
+    The first exception raised by any call is re-raised.
+    """
+    futures = [_fan_out_executor.submit(copy_current_request_context(call)) for call in calls]
+    return [future.result() for future in futures]